@@ -0,0 +1,128 @@
+// Search box of the generated collection pages.
+//
+// generate_website.py writes <username>-search.js next to the pages: every
+// title in collection order, the position each page starts at and a map
+// from each 3-character substring of the lowercased titles to the
+// positions holding it (as gaps). A query
+// takes the rarest of its substrings' lists as candidates and checks each
+// candidate title, so thousands of movies filter as you type with no
+// server. Cards on the current page are filtered directly; matches on the
+// other pages are listed with links.
+(function () {
+    'use strict';
+
+    const MAX_RESULTS = 50;
+    const section = document.querySelector('.movie-search');
+    if (!section || !section.dataset.index) {
+        return;
+    }
+    const input = document.getElementById('movie-search-input');
+    const summary = document.getElementById('movie-search-summary');
+    const list = document.getElementById('movie-search-results');
+    const cards = Array.from(document.querySelectorAll('.movie-card')).map(function (card) {
+        return {element: card, key: searchKey(card.querySelector('.movie-title').textContent)};
+    });
+    const currentPage = decodeURIComponent(location.pathname.split('/').pop());
+    let index = null;
+    let keys = null;
+
+    function searchKey(text) {
+        // same as search_key() in generate_website.py
+        return text.toLowerCase().split(/\s+/).filter(Boolean).join(' ');
+    }
+
+    function loadIndex(callback) {
+        if (index) {
+            callback();
+            return;
+        }
+        const script = document.createElement('script');
+        script.src = section.dataset.index;
+        script.onload = function () {
+            index = window.MOVIE_SEARCH_INDEX;
+            keys = index.titles.map(searchKey);
+            callback();
+        };
+        document.head.appendChild(script);
+    }
+
+    function positions(gram) {
+        const gaps = index.trigrams[gram];
+        if (!gaps) {
+            return [];
+        }
+        const result = new Array(gaps.length);
+        let position = 0;
+        for (let i = 0; i < gaps.length; i++) {
+            position += gaps[i];
+            result[i] = position;
+        }
+        return result;
+    }
+
+    function pageOf(position) {
+        // the last page starting at or before the position
+        let low = 0;
+        let high = index.page_starts.length - 1;
+        while (low < high) {
+            const middle = Math.ceil((low + high) / 2);
+            if (index.page_starts[middle] <= position) {
+                low = middle;
+            } else {
+                high = middle - 1;
+            }
+        }
+        return low;
+    }
+
+    function candidates(query) {
+        if (query.length < 3) {
+            return keys.map(function (_, position) { return position; });
+        }
+        let rarest = null;
+        for (let i = 0; i + 3 <= query.length; i++) {
+            const gaps = index.trigrams[query.slice(i, i + 3)];
+            if (!gaps) {
+                return [];
+            }
+            if (rarest === null || gaps.length < index.trigrams[rarest].length) {
+                rarest = query.slice(i, i + 3);
+            }
+        }
+        return positions(rarest);
+    }
+
+    function search() {
+        const query = searchKey(input.value);
+        cards.forEach(function (card) {
+            card.element.hidden = query !== '' && !card.key.includes(query);
+        });
+        list.textContent = '';
+        if (query === '') {
+            summary.textContent = '';
+            return;
+        }
+        const matches = candidates(query).filter(function (position) { return keys[position].includes(query); });
+        summary.textContent = matches.length + (matches.length === 1 ? ' movie matches' : ' movies match');
+        matches.slice(0, MAX_RESULTS).forEach(function (position) {
+            const page = index.pages[pageOf(position)];
+            const item = document.createElement('li');
+            const year = index.years[position];
+            const label = year === '' ? index.titles[position] : index.titles[position] + ' (' + year + ')';
+            if (page === currentPage) {
+                item.textContent = label;
+            } else {
+                const link = document.createElement('a');
+                link.href = page;
+                link.textContent = label;
+                item.appendChild(link);
+            }
+            list.appendChild(item);
+        });
+    }
+
+    section.hidden = false;
+    input.addEventListener('input', function () {
+        loadIndex(search);
+    });
+})();
@@ -0,0 +1,347 @@
+"""JSON HTTP API over the SQL movie store.
+
+Usage:
+    python api_server.py [--host 127.0.0.1] [--port 8000] [--workers 5]
+
+Endpoints:
+    GET    /users                                      list users
+    POST   /users                  {"username"}        create a user
+    GET    /users/NAME/movies?order=title|rating&limit=100&after_title=..&after_rating=..
+    POST   /users/NAME/movies      {"title", ["year", "rating", "poster"]}
+                                                       add a movie (looked up in the catalog / OMDb when
+                                                       year and rating are not given)
+    PATCH  /users/NAME/movies/TITLE {"rating"}         change a rating
+    DELETE /users/NAME/movies/TITLE                    delete a movie
+    GET    /users/NAME/movies/search?q=..&limit=50     search, with suggestions when nothing matches
+    GET    /users/NAME/movies/random                   a random movie
+    GET    /users/NAME/stats                           rating statistics
+
+The server runs on one asyncio event loop; each request's blocking
+storage calls run on a thread pool no larger than the database connection
+pool. Responses about a collection carry an ETag built from the user's
+collection version (user_stats.version), which every change to the
+collection and every newly mirrored poster in it bumps, so a request
+with a matching If-None-Match gets 304 Not Modified after a single primary-key lookup.
+"""
+import argparse
+import asyncio
+import json
+import re
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from movie_storage import movie_storage_sql as storage
+from movie_storage.movie_storage_sql import RATING_MAX, RATING_MIN
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BODY_BYTES = 64 * 1024
+
+Request = namedtuple('Request', 'method params query headers body')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_body(request):
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        raise HTTPError(400, 'Request body is not valid JSON')
+    if not isinstance(body, dict):
+        raise HTTPError(400, 'Request body must be a JSON object')
+    return body
+
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.query.get(name, default))
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+    return max(1, min(value, maximum))
+
+
+def _rating(value):
+    """Return a rating as a float, or raise 400 outside the range the CLI accepts."""
+    if isinstance(value, bool):
+        value = None
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, 'rating must be a number')
+    if not RATING_MIN <= rating <= RATING_MAX:
+        raise HTTPError(400, f"rating must be between {RATING_MIN} and {RATING_MAX}")
+    return rating
+
+
+def _user_id(username):
+    user_id = storage.get_user_id(username)
+    if user_id is None:
+        raise HTTPError(404, f"No user named {username}")
+    return user_id
+
+
+def _movie_json(title, info):
+    return {'title': title, **info}
+
+
+def _versioned(request, user_id, target, build):
+    """Answer 304 if the client's ETag matches the collection version, else build the payload."""
+    version = storage.get_version(user_id)
+    etag = f'"{user_id}.{version}.{zlib.crc32(target.encode("utf-8")):08x}"'
+    matches = [tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')]
+    if etag in matches or '*' in matches:
+        return 304, None, {'ETag': etag}
+    return 200, build(), {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+
+def list_users(request, target):
+    return 200, [{'id': user.id, 'username': user.username} for user in storage.list_users()], {}
+
+
+def create_user(request, target):
+    username = str(_json_body(request).get('username', '')).strip()
+    if not username:
+        raise HTTPError(400, 'username is required')
+    if not storage.add_user(username):
+        raise HTTPError(409, f"User {username} already exists")
+    return 201, {'id': storage.get_user_id(username), 'username': username}, {}
+
+
+def get_movies(request, target):
+    user_id = _user_id(request.params['username'])
+    order = request.query.get('order', 'title')
+    if order not in ('title', 'rating'):
+        raise HTTPError(400, 'order must be title or rating')
+    limit = _int_param(request, 'limit', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    after = None
+    if 'after_title' in request.query:
+        try:
+            after = (float(request.query.get('after_rating', 0)), request.query['after_title'])
+        except ValueError:
+            raise HTTPError(400, 'after_rating must be a number')
+
+    def build():
+        page = storage.movie_page(user_id, order, limit, after)
+        next_page = None
+        if len(page) == limit:
+            title, info = page[-1]
+            next_page = {'after_title': title, 'after_rating': info['rating']}
+        return {'movies': [_movie_json(title, info) for title, info in page], 'next': next_page}
+    return _versioned(request, user_id, target, build)
+
+
+def add_movie(request, target):
+    user_id = _user_id(request.params['username'])
+    body = _json_body(request)
+    title = str(body.get('title', '')).strip()
+    if not title:
+        raise HTTPError(400, 'title is required')
+    if 'year' in body and 'rating' in body:
+        movie = {'title': title, 'year': body['year'], 'rating': body['rating'],
+                 'poster': body.get('poster'), 'imdb_id': body.get('imdb_id')}
+    else:
+        from services.omdb_api import fetch_movie
+        movie = storage.find_catalog_movie(title) or fetch_movie(title)
+        if movie is None:
+            raise HTTPError(404, f"Movie {title} not found")
+        movie = dict(movie, imdb_rating=movie['rating'])
+        if 'rating' in body:
+            movie['rating'] = body['rating']
+    # a year of the wrong type would otherwise fail in the database and read as a duplicate
+    if movie['year'] is not None and (isinstance(movie['year'], bool) or not isinstance(movie['year'], int)):
+        raise HTTPError(400, 'year must be an integer or null')
+    rating = _rating(movie['rating'])
+    if not storage.add_movie(movie['title'], movie['year'], rating, movie['poster'], user_id, movie.get('imdb_id'),
+                             movie.get('imdb_rating')):
+        raise HTTPError(409, f"Movie {movie['title']} is already in the collection")
+    return 201, {'title': storage.clean_title(movie['title']), 'year': movie['year'], 'rating': rating}, {}
+
+
+def update_movie(request, target):
+    user_id = _user_id(request.params['username'])
+    body = _json_body(request)
+    if 'rating' not in body:
+        raise HTTPError(400, 'rating is required')
+    rating = _rating(body['rating'])
+    if not storage.update_movie(request.params['title'], rating, user_id):
+        raise HTTPError(404, f"Movie {request.params['title']} not found")
+    return 200, {'title': request.params['title'], 'rating': rating}, {}
+
+
+def delete_movie(request, target):
+    user_id = _user_id(request.params['username'])
+    if not storage.delete_movie(request.params['title'], user_id):
+        raise HTTPError(404, f"Movie {request.params['title']} not found")
+    return 204, None, {}
+
+
+def search_movies(request, target):
+    user_id = _user_id(request.params['username'])
+    query = request.query.get('q', '').strip()
+    if not query:
+        raise HTTPError(400, 'q is required')
+    limit = _int_param(request, 'limit', 50, MAX_PAGE_SIZE)
+
+    def build():
+        results = storage.search_movies(user_id, query, limit)
+        suggestions = [] if results else storage.suggest_titles(user_id, query)
+        return {'movies': [_movie_json(title, info) for title, info in results.items()], 'suggestions': suggestions}
+    return _versioned(request, user_id, target, build)
+
+
+def random_movie(request, target):
+    movie = storage.random_movie(_user_id(request.params['username']))
+    if movie is None:
+        raise HTTPError(404, 'The collection is empty')
+    return 200, _movie_json(*movie), {'Cache-Control': 'no-store'}
+
+
+EMPTY_STATS = {'count': 0, 'average': None, 'median': None, 'min': None, 'max': None, 'best': [], 'worst': []}
+
+
+def get_stats(request, target):
+    user_id = _user_id(request.params['username'])
+    # storage has no statistics for an empty collection
+    return _versioned(request, user_id, target, lambda: storage.get_stats(user_id) or EMPTY_STATS)
+
+
+_USER = r'/users/(?P<username>[^/]+)'
+# Checked in order: the fixed /movies/search and /movies/random paths come before /movies/TITLE,
+# whose PATCH and DELETE still reach films titled "Search" or "Random"
+ROUTES = [(re.compile(pattern + r'/?\Z'), methods) for pattern, methods in [
+    (r'/users', {'GET': list_users, 'POST': create_user}),
+    (_USER + r'/movies', {'GET': get_movies, 'POST': add_movie}),
+    (_USER + r'/movies/search', {'GET': search_movies}),
+    (_USER + r'/movies/random', {'GET': random_movie}),
+    (_USER + r'/movies/(?P<title>[^/]+)', {'PATCH': update_movie, 'DELETE': delete_movie}),
+    (_USER + r'/stats', {'GET': get_stats}),
+]]
+
+
+def dispatch(method, target, headers, body):
+    """Route one request and return (status, payload, headers); runs on the thread pool."""
+    url = urlsplit(target)
+    allowed = []
+    for pattern, methods in ROUTES:
+        match = pattern.match(url.path)
+        if match is None:
+            continue
+        if method not in methods:
+            allowed.extend(name for name in methods if name not in allowed)
+            continue
+        params = {name: unquote(value) for name, value in match.groupdict().items()}
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        try:
+            return methods[method](Request(method, params, query, headers, body), target)
+        except HTTPError as e:
+            return e.status, {'error': e.message}, {}
+        except Exception as e:
+            print(f"Error handling {method} {target}: {e}")
+            return 500, {'error': 'Internal server error'}, {}
+    if allowed:
+        return 405, {'error': f"{method} is not allowed here"}, {'Allow': ', '.join(allowed)}
+    return 404, {'error': f"No route for {url.path}"}, {}
+
+
+def _response(status, payload, headers, keep_alive):
+    body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    if payload is not None:
+        lines.append('Content-Type: application/json; charset=utf-8')
+    if status != 304:
+        lines.append(f"Content-Length: {len(body)}")
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+async def _read_request(reader):
+    """Return (method, target, version, headers, body), or None when the client closed the connection."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, 'Malformed request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HTTPError(400, 'Invalid Content-Length')
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, 'Request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, version, headers, body
+
+
+def make_handler(executor):
+    """Return the asyncio connection handler; it serves keep-alive requests one after another."""
+    async def handle_connection(reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as e:
+                    writer.write(_response(e.status, {'error': e.message}, {}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                status, payload, extra_headers = await loop.run_in_executor(
+                    executor, dispatch, method, target, headers, body)
+                writer.write(_response(status, payload, extra_headers, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle_connection
+
+
+async def serve(host, port, workers):
+    # one thread per pooled connection, so no request waits on the engine's pool
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='storage')
+    server = await asyncio.start_server(make_handler(executor), host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Serving the movies API on http://{address[0]}:{address[1]}/ ({workers} storage threads)", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the movie store as a JSON API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=storage.POOL_SIZE, help='threads running storage calls')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare row throughput of single-call writes and batched writes (storage.batch()).
+
+Usage:
+    python benchmarks/batch_writes.py [--rows 2000] [--batch-sizes 1 10 100 1000] [--output batch_writes.json]
+
+A fresh database is created in a temporary directory. For each batch size
+the same number of movies is added, re-rated and deleted, either with the
+one-transaction-per-call functions or queued on a WriteBatch and flushed
+every `batch size` writes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_title
+
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def run_unbatched(storage, user_id, rows):
+    """Return {operation: seconds} for rows single-call adds, updates and deletes."""
+    timings = {}
+    titles = [synthetic_title(i) for i in range(rows)]
+    started = time.perf_counter()
+    for title in titles:
+        storage.add_movie(title, 2000, 5.0, None, user_id)
+    timings['add_movie'] = time.perf_counter() - started
+    started = time.perf_counter()
+    for title in titles:
+        storage.update_movie(title, 7.0, user_id)
+    timings['update_movie'] = time.perf_counter() - started
+    started = time.perf_counter()
+    for title in titles:
+        storage.delete_movie(title, user_id)
+    timings['delete_movie'] = time.perf_counter() - started
+    return timings
+
+
+def run_batched(storage, user_id, rows, batch_size):
+    """Return {operation: seconds} for the same writes queued on a WriteBatch, flushed every batch_size."""
+    timings = {}
+    titles = [synthetic_title(i) for i in range(rows)]
+    operations = {
+        'add_movie': lambda writes, title: writes.add_movie(title, 2000, 5.0, None, user_id),
+        'update_movie': lambda writes, title: writes.update_movie(title, 7.0, user_id),
+        'delete_movie': lambda writes, title: writes.delete_movie(title, user_id),
+    }
+    for name, queue in operations.items():
+        started = time.perf_counter()
+        writes = storage.begin_batch()
+        for title in titles:
+            queue(writes, title)
+            if len(writes) == batch_size:
+                writes.flush()
+        writes.flush()
+        timings[name] = time.perf_counter() - started
+        if not all(writes.results):
+            raise RuntimeError(f"batched {name} reported failures")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batched against single-call writes.')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='movies_batch_') as workdir:
+        os.environ['MOVIES_DB_URL'] = f"sqlite:///{os.path.join(workdir, 'movies.db')}"
+        from movie_storage import movie_storage_sql as storage
+        storage.add_user('bench')
+        user_id = storage.get_user_id('bench')
+
+        results = []
+        # the single-call functions print a line per movie
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs = [('unbatched', run_unbatched(storage, user_id, args.rows))]
+            runs += [(f"batch of {size}", run_batched(storage, user_id, args.rows, size)) for size in args.batch_sizes]
+        for mode, timings in runs:
+            for operation, seconds in timings.items():
+                results.append({'mode': mode, 'operation': operation, 'rows': args.rows,
+                                'seconds': seconds, 'rows_per_second': args.rows / seconds})
+        storage.dispose_engine()
+
+    for operation in ('add_movie', 'update_movie', 'delete_movie'):
+        print(f"{operation}:")
+        for result in results:
+            if result['operation'] == operation:
+                print(f"  {result['mode']:<15} {result['rows_per_second']:>10.0f} rows/s")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
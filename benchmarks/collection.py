@@ -0,0 +1,113 @@
+"""Compare memory per movie and stats latency: dict-of-dicts vs MovieCollection.
+
+Usage:
+    python benchmarks/collection.py [--sizes 1000 20000 200000] [--repeat 20] [--output collection.json]
+
+The dict layout is what list_movies returns ({title: {year, rating, poster,
+thumbnail}}), with stats computed the way the menu used to: lists of
+ratings, a full sort for the median and a scan per best/worst. Memory is
+measured with tracemalloc while building each layout from the same rows.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_title
+from movie_storage import collection as collection_module
+from movie_storage.collection import MovieCollection
+from movie_storage.fuzzy import normalize
+
+DEFAULT_SIZES = [1000, 20000, 200000]
+
+
+def make_rows(size, seed=0):
+    rng = random.Random(seed)
+    rows = [(normalize(synthetic_title(i)), synthetic_title(i), 1950 + i % 75, round(rng.uniform(1, 10), 1))
+            for i in range(size)]
+    rows.sort()
+    return rows
+
+
+def build_dicts(rows):
+    return {title: {"year": year, "rating": rating, "poster": None, "thumbnail": None}
+            for _, title, year, rating in rows}
+
+
+def dict_stats(movies):
+    ratings = [info["rating"] for info in movies.values()]
+    ordered = sorted(ratings)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    best, worst = max(ratings), min(ratings)
+    return {
+        "count": len(ratings),
+        "average": sum(ratings) / len(ratings),
+        "median": median,
+        "best": [title for title, info in movies.items() if info["rating"] == best],
+        "worst": [title for title, info in movies.items() if info["rating"] == worst],
+    }
+
+
+def measure_memory(build, rows):
+    """Return the bytes allocated by build(rows), not counting the rows themselves."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    layout = build(rows)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return layout, allocated
+
+
+def median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare collection layouts.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    numpy_available = bool(collection_module.load_numpy())
+    print(f"NumPy {'available' if numpy_available else 'not installed'}")
+    for size in args.sizes:
+        rows = make_rows(size)
+        movies, dict_bytes = measure_memory(build_dicts, rows)
+        columns, column_bytes = measure_memory(MovieCollection.from_rows, rows)
+        result = {
+            'movies': size,
+            'numpy': numpy_available,
+            'dict_bytes_per_movie': dict_bytes / size,
+            'collection_bytes_per_movie': column_bytes / size,
+            'dict_stats_ms': median_ms(lambda: dict_stats(movies), args.repeat),
+            'collection_stats_ms': median_ms(columns.stats, args.repeat),
+            'dict_sorted_by_rating_ms': median_ms(
+                lambda: sorted(movies.items(), key=lambda item: (-item[1]['rating'], item[0])), args.repeat),
+            'collection_sorted_by_rating_ms': median_ms(lambda: list(columns.by_rating()), args.repeat),
+        }
+        results.append(result)
+        print(f"{size:>8} movies: memory {result['dict_bytes_per_movie']:.0f} -> "
+              f"{result['collection_bytes_per_movie']:.0f} bytes/movie, stats {result['dict_stats_ms']:.2f} -> "
+              f"{result['collection_stats_ms']:.2f} ms, by rating {result['dict_sorted_by_rating_ms']:.2f} -> "
+              f"{result['collection_sorted_by_rating_ms']:.2f} ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
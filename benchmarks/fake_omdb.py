@@ -0,0 +1,91 @@
+"""A local stand-in for the OMDb API with configurable latency.
+
+Usage:
+    python benchmarks/fake_omdb.py [--port 8765] [--latency 0.05]
+    OMDB_URL=http://127.0.0.1:8765/ python movies.py
+
+Every title is "found" with a year, rating, poster and IMDb ID derived from
+the title, so repeated runs see the same data. Titles starting with
+"Unknown" get OMDb's "Movie not found!" answer, titles starting with
+"Unrated" an imdbRating of "N/A" and titles starting with "Limited" the
+401 "Request limit reached!" error.
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+NOT_FOUND_PREFIX = 'unknown'
+UNRATED_PREFIX = 'unrated'
+LIMITED_PREFIX = 'limited'
+
+
+def fake_movie(title):
+    """Return the OMDb JSON document served for a title."""
+    if title.strip().lower().startswith(NOT_FOUND_PREFIX):
+        return {'Response': 'False', 'Error': 'Movie not found!'}
+    if title.strip().lower().startswith(LIMITED_PREFIX):
+        return {'Response': 'False', 'Error': 'Request limit reached!'}
+    checksum = zlib.crc32(title.strip().lower().encode('utf-8'))
+    unrated = title.strip().lower().startswith(UNRATED_PREFIX)
+    return {
+        'Title': title.strip().title(),
+        'Year': str(1950 + checksum % 75),
+        'imdbRating': 'N/A' if unrated else f"{1 + checksum % 90 / 10:.1f}",
+        'Poster': f"http://posters.invalid/{checksum:08x}.jpg",
+        'imdbID': f"tt{checksum % 10 ** 8:08d}",
+        'Response': 'True',
+    }
+
+
+class FakeOMDbHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        title = parse_qs(urlparse(self.path).query).get('t', [''])[0]
+        if self.latency:
+            time.sleep(self.latency)
+        document = fake_movie(title)
+        body = json.dumps(document).encode('utf-8')
+        # OMDb answers "not found" with 200 but its other errors with 401
+        try:
+            self.send_response(200 if document.get('Error', 'Movie not found!') == 'Movie not found!' else 401)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out while we slept
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency=0.0, port=0):
+    """Serve on 127.0.0.1 in a background thread; return (server, url)."""
+    handler = type('Handler', (FakeOMDbHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake OMDb answers locally.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds to wait before each answer')
+    args = parser.parse_args()
+    server, url = start_server(args.latency, args.port)
+    print(f"Fake OMDb on {url} ({args.latency * 1000:.0f} ms latency), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Load-test api_server.py and report requests per second and latency percentiles.
+
+Usage:
+    python benchmarks/load_api.py [--concurrency 32] [--duration 10] [--users 5] [--movies-per-user 2000]
+                                  [--write-ratio 0.05] [--no-etag] [--url http://127.0.0.1:8000] [--output load.json]
+
+Without --url a synthetic database is generated in a temporary directory
+and a server is started on it. Each client keeps one keep-alive
+connection and mixes collection pages, stats, search and random picks;
+--write-ratio of the requests re-rate a movie, which bumps the collection
+version. Clients remember ETags and send If-None-Match like a caching
+consumer would (--no-etag turns that off), so the 304 share is reported
+too.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import synthetic
+
+READ_MIX = [
+    ('movies_page', 4),
+    ('movies_by_rating', 2),
+    ('stats', 2),
+    ('search', 2),
+    ('random', 1),
+]
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _request_for(kind, username, rng, known_titles):
+    """Return (method, path, body) for one request of the given kind."""
+    base = f"/users/{quote(username)}"
+    if kind == 'movies_page':
+        return 'GET', f"{base}/movies?limit=100", None
+    if kind == 'movies_by_rating':
+        return 'GET', f"{base}/movies?order=rating&limit=50", None
+    if kind == 'stats':
+        return 'GET', f"{base}/stats", None
+    if kind == 'search':
+        return 'GET', f"{base}/movies/search?q={rng.choice(synthetic.NOUNS)}&limit=20", None
+    if kind == 'random':
+        return 'GET', f"{base}/movies/random", None
+    # re-rate a title seen in an earlier page, so the write finds its movie
+    title = rng.choice(known_titles[username]) if known_titles.get(username) else synthetic.synthetic_title(0)
+    return 'PATCH', f"{base}/movies/{quote(title)}", json.dumps({'rating': round(rng.uniform(1, 10), 1)})
+
+
+async def _send(reader, writer, host, method, path, body, etag):
+    payload = body.encode('utf-8') if body else b''
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", f"Content-Length: {len(payload)}"]
+    if payload:
+        lines.append('Content-Type: application/json')
+    if etag:
+        lines.append(f"If-None-Match: {etag}")
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return status, headers.get('etag'), body
+
+
+async def _client(index, url, usernames, deadline, write_ratio, use_etag, samples):
+    rng = random.Random(index)
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    etags = {}
+    known_titles = {}
+    kinds, weights = zip(*READ_MIX)
+    try:
+        while time.monotonic() < deadline:
+            kind = 'rate' if rng.random() < write_ratio else rng.choices(kinds, weights)[0]
+            username = rng.choice(usernames)
+            method, path, body = _request_for(kind, username, rng, known_titles)
+            started = time.perf_counter()
+            status, etag, response = await _send(reader, writer, parts.netloc, method, path, body,
+                                                 etags.get(path) if use_etag else None)
+            samples.append((kind, status, time.perf_counter() - started))
+            if etag:
+                etags[path] = etag
+            if kind == 'movies_page' and status == 200:
+                known_titles[username] = [movie['title'] for movie in json.loads(response)['movies']]
+    finally:
+        writer.close()
+
+
+async def run_load(url, usernames, concurrency, duration, write_ratio, use_etag):
+    samples = []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(_client(i, url, usernames, deadline, write_ratio, use_etag, samples)
+                           for i in range(concurrency)))
+    return samples
+
+
+def summarize(samples, duration):
+    latencies = [latency for _, _, latency in samples]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    by_kind = {}
+    for kind in sorted({kind for kind, _, _ in samples}):
+        kind_latencies = [latency for sample_kind, _, latency in samples if sample_kind == kind]
+        by_kind[kind] = {'requests': len(kind_latencies), 'p50_ms': percentile(kind_latencies, 0.50) * 1000,
+                         'p99_ms': percentile(kind_latencies, 0.99) * 1000}
+    return {
+        'requests': len(samples),
+        'requests_per_second': len(samples) / duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        'statuses': statuses,
+        'not_modified_share': statuses.get('304', 0) / len(samples) if samples else 0.0,
+        'by_request': by_kind,
+    }
+
+
+@contextlib.contextmanager
+def local_server(users, movies_per_user, workers):
+    """Generate a synthetic database, start api_server.py on it and yield (url, usernames)."""
+    with tempfile.TemporaryDirectory(prefix='movies_api_') as workdir:
+        env = dict(os.environ, MOVIES_DB_URL=f"sqlite:///{os.path.join(workdir, 'movies.db')}",
+                   PYTHONPATH=REPO_ROOT, PYTHONUNBUFFERED='1')
+        subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'benchmarks', 'synthetic.py'), '--users', str(users),
+                        '--movies-per-user', str(movies_per_user), '--db', os.path.join(workdir, 'movies.db')],
+                       cwd=workdir, env=env, check=True)
+        command = [sys.executable, os.path.join(REPO_ROOT, 'api_server.py'), '--port', '0']
+        if workers:
+            command += ['--workers', str(workers)]
+        log_path = os.path.join(workdir, 'server.log')
+        with open(log_path, 'w', encoding='utf-8') as log:
+            server = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            url = _wait_for_url(server, log_path)
+            yield url, [f"user{i}" for i in range(users)]
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def _wait_for_url(server, log_path, timeout=30.0):
+    """Return the URL api_server.py prints once it is listening."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(log_path, 'r', encoding='utf-8') as log:
+            output = log.read()
+        if 'http://' in output:
+            return output[output.index('http://'):].split()[0].rstrip('/')
+        if server.poll() is not None:
+            break
+        time.sleep(0.05)
+    raise RuntimeError(f"api_server.py did not start: {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the movies JSON API.')
+    parser.add_argument('--url', help='an already running server (default: start one on synthetic data)')
+    parser.add_argument('--usernames', nargs='+', help='users to query on --url')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--movies-per-user', type=int, default=2000)
+    parser.add_argument('--workers', type=int, help='storage threads for the started server')
+    parser.add_argument('--write-ratio', type=float, default=0.05)
+    parser.add_argument('--no-etag', action='store_true', help='do not send If-None-Match')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.usernames:
+            parser.error('--usernames is required with --url')
+        server = contextlib.nullcontext((args.url.rstrip('/'), args.usernames))
+    else:
+        server = local_server(args.users, args.movies_per_user, args.workers)
+    with server as (url, usernames):
+        samples = asyncio.run(run_load(url, usernames, args.concurrency, args.duration, args.write_ratio,
+                                       not args.no_etag))
+    summary = summarize(samples, args.duration)
+    print(f"{summary['requests']} requests in {args.duration:.0f}s with {args.concurrency} connections: "
+          f"{summary['requests_per_second']:.0f} req/s, p50 {summary['p50_ms']:.2f} ms, "
+          f"p99 {summary['p99_ms']:.2f} ms, max {summary['max_ms']:.2f} ms")
+    print(f"statuses: {summary['statuses']} (304 share {summary['not_modified_share']:.0%})")
+    for kind, stats in summary['by_request'].items():
+        print(f"  {kind:<18} {stats['requests']:>7} requests  p50 {stats['p50_ms']:7.2f} ms  "
+              f"p99 {stats['p99_ms']:7.2f} ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
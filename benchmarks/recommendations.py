@@ -0,0 +1,130 @@
+"""Time the item-item recommendation cache: full build, incremental refresh and lookups.
+
+Usage:
+    python benchmarks/recommendations.py [--users 50] [--movies-per-user 1000] [--catalog-size 5000]
+                                         [--changes 20] [--repeat 20] [--output recommendations.json]
+
+A synthetic database is generated in a temporary directory. After the
+full build, --changes ratings are changed and refresh() is timed, then
+checked against a rebuild from scratch. recommend() is timed for every
+user and compared with computing the same user's similarities at request
+time, which is what the neighbor cache avoids.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import synthetic
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed_call(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def neighbor_lists(storage, text):
+    with storage.get_engine().connect() as connection:
+        rows = connection.execute(text("SELECT catalog_id, neighbor_id, similarity FROM item_neighbors")).fetchall()
+    lists = {}
+    for row in rows:
+        lists.setdefault(row.catalog_id, []).append((row.neighbor_id, round(row.similarity, 5)))
+    return {catalog_id: sorted(neighbors) for catalog_id, neighbors in lists.items()}
+
+
+def change_ratings(storage, user_ids, count, rng):
+    """Re-rate `count` random movies, the way users editing their lists would."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(count):
+            user_id = rng.choice(user_ids)
+            title, _ = storage.random_movie(user_id)
+            storage.update_movie(title, round(rng.uniform(1, 10), 1), user_id)
+
+
+def similarities_on_request(storage, recommendations, numpy, text, user_id):
+    """Compute one user's film similarities from scratch, as a request without the cache would."""
+    with storage.get_engine().connect() as connection:
+        catalog_ids, films, users = recommendations._load_matrix(connection, numpy)
+        mine = connection.execute(text("SELECT catalog_id FROM user_movies WHERE user_id = :user_id"),
+                                  {"user_id": user_id}).scalars().all()
+    rows = numpy.searchsorted(catalog_ids, mine)
+    for batch in recommendations._batches(numpy, films, users, rows):
+        recommendations._similarities(numpy, films, users, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the recommendation neighbor cache.')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--movies-per-user', type=int, default=1000)
+    parser.add_argument('--catalog-size', type=int, default=5000)
+    parser.add_argument('--changes', type=int, default=20, help='ratings changed before the incremental refresh')
+    parser.add_argument('--repeat', type=int, default=20, help='recommend() calls per user')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='movies_recommend_') as workdir:
+        os.environ['MOVIES_DB_URL'] = f"sqlite:///{os.path.join(workdir, 'movies.db')}"
+        from sqlalchemy import text
+        from movie_storage import movie_storage_sql as storage
+        from movie_storage import recommendations
+        from movie_storage.collection import load_numpy
+        numpy = load_numpy()
+        if not numpy:
+            sys.exit('NumPy is required to build recommendations')
+
+        user_ids = synthetic.generate(storage, args.users, args.movies_per_user, args.catalog_size, args.seed)
+        films, full_seconds = timed_call(recommendations.refresh)
+        rng = random.Random(args.seed)
+        change_ratings(storage, user_ids, args.changes, rng)
+        refreshed, incremental_seconds = timed_call(recommendations.refresh)
+        incremental = neighbor_lists(storage, text)
+        recommendations.rebuild()
+        matches_rebuild = incremental == neighbor_lists(storage, text)
+
+        latencies = []
+        for user_id in user_ids:
+            for _ in range(args.repeat):
+                latencies.append(timed_call(recommendations.recommend, user_id)[1])
+        on_request = [timed_call(similarities_on_request, storage, recommendations, numpy, text, user_id)[1]
+                      for user_id in user_ids[:5]]
+
+    result = {
+        'users': args.users,
+        'movies_per_user': args.movies_per_user,
+        'films': films,
+        'full_build_seconds': full_seconds,
+        'changes': args.changes,
+        'incremental_films': refreshed,
+        'incremental_refresh_seconds': incremental_seconds,
+        'incremental_matches_rebuild': matches_rebuild,
+        'recommend_p50_ms': percentile(latencies, 0.50) * 1000,
+        'recommend_p99_ms': percentile(latencies, 0.99) * 1000,
+        'similarities_on_request_ms': statistics.median(on_request) * 1000,
+    }
+    print(f"{args.users} users x {args.movies_per_user} movies, {films} films: full build {full_seconds:.2f}s")
+    print(f"{args.changes} rating changes: refresh rewrote {refreshed} neighbor lists in "
+          f"{incremental_seconds * 1000:.0f} ms (matches a rebuild: {matches_rebuild})")
+    print(f"recommend(): p50 {result['recommend_p50_ms']:.2f} ms, p99 {result['recommend_p99_ms']:.2f} ms; "
+          f"computing similarities per request instead: {result['similarities_on_request_ms']:.0f} ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Time storage operations, search, stats and site generation as the collection grows.
+
+Usage:
+    python benchmarks/scaling.py [--sizes 100 1000 10000] [--users 5] [--repeat 20]
+                                 [--omdb-latency 0.05] [--output scaling.json] [--compare old.json]
+
+For each size a fresh synthetic database with --users users of that many
+movies is built in a temporary directory, and every operation is timed
+--repeat times against it (site builds fewer times). OMDb lookups go to
+benchmarks/fake_omdb.py with the given latency. Each size runs in its own
+process so that module-level caches never leak between sizes.
+
+Results are written as JSON, one record per (size, operation), ready to
+plot or to diff against another commit with --compare.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import synthetic
+from benchmarks.fake_omdb import start_server
+
+DEFAULT_SIZES = [100, 1000, 10000]
+# A change in median time beyond this factor is flagged by --compare
+REGRESSION_FACTOR = 1.2
+
+
+def summarize(samples):
+    """Return timing statistics in milliseconds for a list of durations in seconds."""
+    ordered = sorted(sample * 1000 for sample in samples)
+    return {
+        'runs': len(ordered),
+        'mean_ms': statistics.mean(ordered),
+        'median_ms': statistics.median(ordered),
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        'min_ms': ordered[0],
+        'max_ms': ordered[-1],
+    }
+
+
+def time_operation(operation, repeat):
+    """Call operation(i) `repeat` times, with storage output silenced, and return the durations."""
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            started = time.perf_counter()
+            operation(i)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _operations(storage, user_id, username, titles, rng):
+    """Return {name: (operation, heavy)}; heavy operations run fewer times."""
+    from generate_website import generate_website
+    from movie_storage import analytics
+    from services.omdb_api import fetch_movie
+
+    def some_title():
+        return rng.choice(titles)
+
+    def typo(title):
+        position = rng.randrange(len(title))
+        return title[:position] + title[position + 1:]
+
+    return {
+        'add_movie': (lambda i: storage.add_movie(f"Bench Added {i}", 2000, 5.0, 'N/A', user_id), False),
+        'update_movie': (lambda i: storage.update_movie(some_title(), rng.uniform(1, 10), user_id), False),
+        'delete_movie': (lambda i: storage.delete_movie(f"Bench Added {i}", user_id), False),
+        'add_movies_batch_100': (lambda i: storage.add_movies(
+            [{'title': f"Bench Batch {i} {n}", 'year': 2000, 'rating': 5.0, 'poster': 'N/A'} for n in range(100)],
+            user_id), False),
+        'count_movies': (lambda i: storage.count_movies(user_id), False),
+        'get_stats': (lambda i: storage.get_stats(user_id), False),
+        'top_movies_10': (lambda i: storage.top_movies(user_id, 10), False),
+        'bottom_movies_10': (lambda i: storage.bottom_movies(user_id, 10), False),
+        'sorted_by_rating_page_50': (lambda i: storage.movie_page(user_id, 'rating', 50), False),
+        'random_movie': (lambda i: storage.random_movie(user_id), False),
+        'search_movies': (lambda i: storage.search_movies(user_id, rng.choice(synthetic.NOUNS)), False),
+        'suggest_titles': (lambda i: storage.suggest_titles(user_id, typo(some_title())), False),
+        'find_catalog_movie': (lambda i: storage.find_catalog_movie(some_title()), False),
+        'most_collected_10': (lambda i: analytics.most_collected(10), False),
+        'highest_rated_10': (lambda i: analytics.highest_rated(10), False),
+        'movies_by_decade': (lambda i: analytics.by_decade(), False),
+        'fetch_movie_uncached': (lambda i: fetch_movie(f"Bench Fetch {rng.random()}"), False),
+        'fetch_movie_cached': (lambda i: fetch_movie(titles[0]), False),
+        'list_movies': (lambda i: storage.list_movies(user_id), True),
+        'iter_movies_by_title': (lambda i: sum(1 for _ in storage.iter_movies(user_id)), True),
+        'iter_movies_by_rating': (lambda i: sum(1 for _ in storage.iter_movies(user_id, order_by='rating')), True),
+        'generate_website_full': (lambda i: generate_website(user_id, username, incremental=False), True),
+        'generate_website_incremental': (lambda i: generate_website(user_id, username), True),
+    }
+
+
+def run_size(workdir, users, movies_per_user, repeat, seed):
+    """Build a synthetic database in workdir and time every operation against it (runs in a child process)."""
+    os.chdir(workdir)
+    os.makedirs('_static', exist_ok=True)
+    for name in ('index_template.html', 'style.css', 'search.js'):
+        shutil.copy(os.path.join(REPO_ROOT, '_static', name), '_static')
+    os.environ['MOVIES_DB_URL'] = f"sqlite:///{os.path.join(workdir, 'data', 'movies.db')}"
+    from movie_storage import movie_storage_sql as storage
+
+    started = time.perf_counter()
+    user_ids = synthetic.generate(storage, users, movies_per_user, seed=seed)
+    generate_seconds = time.perf_counter() - started
+    records = [{'operation': 'generate_database', **summarize([generate_seconds]),
+                'rows_per_second': users * movies_per_user / generate_seconds}]
+
+    rng = random.Random(seed)
+    user_id = user_ids[0]
+    titles = [title for title, _ in storage.iter_movies(user_id)]
+    heavy_repeat = max(1, repeat // 5)
+    # the first cached fetch_movie has to go upstream
+    with contextlib.redirect_stdout(io.StringIO()):
+        from services.omdb_api import fetch_movie
+        fetch_movie(titles[0])
+    for name, (operation, heavy) in _operations(storage, user_id, 'user0', titles, rng).items():
+        samples = time_operation(operation, heavy_repeat if heavy else repeat)
+        records.append({'operation': name, **summarize(samples)})
+    database_bytes = sum(os.path.getsize(os.path.join('data', name)) for name in os.listdir('data'))
+    for record in records:
+        record.update(users=users, movies_per_user=movies_per_user, database_bytes=database_bytes)
+    return records
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print each operation's median against a previous results file and return the regressions."""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    before = {(record['movies_per_user'], record['operation']): record for record in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    for record in results:
+        old = before.get((record['movies_per_user'], record['operation']))
+        if old is None or not old['median_ms']:
+            continue
+        factor = record['median_ms'] / old['median_ms']
+        flag = ''
+        if factor > REGRESSION_FACTOR:
+            flag = '  SLOWER'
+            regressions.append(record)
+        elif factor < 1 / REGRESSION_FACTOR:
+            flag = '  faster'
+        print(f"  {record['movies_per_user']:>8} {record['operation']:<30} {old['median_ms']:9.2f} -> "
+              f"{record['median_ms']:9.2f} ms  x{factor:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time operations against growing synthetic collections.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='movies per user')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--omdb-latency', type=float, default=0.05, help='seconds the fake OMDb waits per request')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare against')
+    args = parser.parse_args()
+
+    server, url = start_server(args.omdb_latency)
+    os.environ['OMDB_URL'] = url
+    results = []
+    # spawn: every size starts from freshly imported modules
+    context = multiprocessing.get_context('spawn')
+    try:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory(prefix='movies_bench_') as workdir:
+                with context.Pool(1) as pool:
+                    records = pool.apply(run_size, (workdir, args.users, size, args.repeat, args.seed))
+            results.extend(records)
+            print(f"\n{args.users} users x {size} movies ({records[0]['database_bytes'] / 1e6:.1f} MB):")
+            for record in records:
+                print(f"  {record['operation']:<30} median {record['median_ms']:9.2f} ms  "
+                      f"p95 {record['p95_ms']:9.2f} ms  ({record['runs']} runs)")
+    finally:
+        server.shutdown()
+
+    output = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'users': args.users,
+            'repeat': args.repeat,
+            'omdb_latency': args.omdb_latency,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(output, file, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Measure CLI cold-start: import cost of movies.py and wall-clock time to the first prompt.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--workdir DIR] [--output startup.json] [--budget-ms 500]
+
+--workdir is the directory movies.py runs in (it reads data/movies.db from
+there). By default that is a new temporary directory holding a small
+synthetic database, never the app's own data/movies.db. With --budget-ms the script exits non-zero when the median time to
+first prompt is over budget, so it can guard cold-start latency in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+FIRST_PROMPT = b'Enter choice'
+# Size of the database in the default workdir
+SYNTHETIC_USERS = 3
+SYNTHETIC_MOVIES_PER_USER = 200
+
+
+def synthetic_workdir():
+    """Return a new temporary directory whose data/movies.db holds a small synthetic, fully migrated database."""
+    workdir = tempfile.mkdtemp(prefix='movies_startup_')
+    os.makedirs(os.path.join(workdir, 'data'))
+    # inherited by the movies.py processes started below
+    os.environ['MOVIES_DB_URL'] = f"sqlite:///{os.path.join(workdir, 'data', 'movies.db')}"
+    from benchmarks.synthetic import generate
+    from movie_storage import movie_storage_sql as storage
+    generate(storage, SYNTHETIC_USERS, SYNTHETIC_MOVIES_PER_USER, None, 0)
+    storage.dispose_engine()
+    return workdir
+
+
+def import_times(workdir, top=10):
+    """Run `python -X importtime -c "import movies"` and return the total and the slowest imports."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import movies'],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # nested imports are indented by two spaces per level after the column's own space
+        modules.append({'module': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us),
+                        'top_level': not name[1:].startswith(' ')})
+    total_us = sum(m['cumulative_us'] for m in modules if m['top_level'])
+    slowest = sorted(modules, key=lambda m: m['cumulative_us'], reverse=True)[:top]
+    return {'total_ms': total_us / 1000, 'slowest': slowest}
+
+
+def time_to_first_prompt(workdir):
+    """Start movies.py and return the seconds until it prints the first prompt."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, PYTHONUNBUFFERED='1')
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'movies.py')], cwd=workdir, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b''
+    try:
+        while FIRST_PROMPT not in output:
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError('movies.py exited before showing a prompt')
+            output += chunk
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure movies.py cold-start latency.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workdir', help='directory movies.py runs in (default: a new temporary directory '
+                                           'with a synthetic database)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--budget-ms', type=float, help='fail if the median time to first prompt exceeds this')
+    args = parser.parse_args()
+    if args.workdir is None:
+        args.workdir = synthetic_workdir()
+        print(f"Running in {args.workdir}")
+
+    imports = import_times(args.workdir)
+    samples = [time_to_first_prompt(args.workdir) * 1000 for _ in range(args.runs)]
+    results = {
+        'import_total_ms': imports['total_ms'],
+        'slowest_imports': imports['slowest'],
+        'first_prompt_ms': {
+            'min': min(samples),
+            'median': statistics.median(samples),
+            'max': max(samples),
+            'samples': samples,
+        },
+    }
+
+    print(f"import movies: {imports['total_ms']:.1f} ms")
+    for module in imports['slowest']:
+        print(f"  {module['cumulative_us'] / 1000:8.1f} ms  {module['module']}")
+    print(f"time to first prompt: median {results['first_prompt_ms']['median']:.1f} ms "
+          f"(min {results['first_prompt_ms']['min']:.1f}, max {results['first_prompt_ms']['max']:.1f}, {args.runs} runs)")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
+    if args.budget_ms is not None and results['first_prompt_ms']['median'] > args.budget_ms:
+        print(f"Over budget: {results['first_prompt_ms']['median']:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Run reader and writer processes against one SQLite file and report throughput and lock waits.
+
+Usage:
+    python benchmarks/stress_sqlite.py [--readers 4] [--writers 2] [--duration 10] [--db /tmp/movies_stress.db]
+
+Writers add, re-rate and delete movies; readers page, count, search and read
+stats. Each operation's latency includes any time spent waiting on locks,
+so the write percentiles are the lock-wait latency seen by the application.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEED_MOVIES = 2000
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _read_operation(storage, user_id):
+    operation = random.choice(['page', 'count', 'stats', 'search'])
+    if operation == 'page':
+        storage.movie_page(user_id, 'rating', 50)
+    elif operation == 'count':
+        storage.count_movies(user_id)
+    elif operation == 'stats':
+        storage.get_stats(user_id)
+    else:
+        storage.search_movies(user_id, f"Movie {random.randint(0, 99)}")
+
+
+def _write_operation(storage, user_id, worker, counter):
+    operation = random.choice(['add', 'update', 'delete'])
+    if operation == 'add':
+        storage.add_movie(f"Stress {worker} {counter}", 2000, random.uniform(1, 10), 'poster.jpg', user_id)
+    elif operation == 'update':
+        storage.update_movie(f"Movie {random.randint(0, SEED_MOVIES - 1)}", random.uniform(1, 10), user_id)
+    else:
+        storage.delete_movie(f"Stress {worker} {random.randint(0, max(counter, 1))}", user_id)
+
+
+def worker(role, index, user_id, duration, results):
+    """Run operations of one role until the deadline and report their latencies."""
+    from movie_storage import movie_storage_sql as storage
+    storage.dispose_engine()
+    latencies = []
+    output = io.StringIO()
+    deadline = time.monotonic() + duration
+    counter = 0
+    # storage prints a line per operation; keep it to count errors instead
+    with contextlib.redirect_stdout(output):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            if role == 'reader':
+                _read_operation(storage, user_id)
+            else:
+                _write_operation(storage, user_id, index, counter)
+            latencies.append(time.perf_counter() - started)
+            counter += 1
+    errors = sum('error' in line.lower() for line in output.getvalue().splitlines())
+    results.put({'role': role, 'latencies': latencies, 'errors': errors, **storage.write_stats()})
+
+
+def summarize(reports, role, duration):
+    reports = [report for report in reports if report['role'] == role]
+    latencies = [latency for report in reports for latency in report['latencies']]
+    return {
+        'processes': len(reports),
+        'operations': len(latencies),
+        'ops_per_second': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        'errors': sum(report['errors'] for report in reports),
+        'lock_retries': sum(report['retries'] for report in reports),
+        'backoff_seconds': sum(report['backoff_seconds'] for report in reports),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress the SQLite store with concurrent processes.')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'movies_stress.db'))
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    os.environ['MOVIES_DB_URL'] = f"sqlite:///{args.db}"
+    from movie_storage import movie_storage_sql as storage
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.add_user('stress')
+        user_id = storage.get_user_id('stress')
+        storage.add_movies([{'title': f"Movie {i}", 'year': 2000, 'rating': random.uniform(1, 10), 'poster': 'poster.jpg'}
+                            for i in range(SEED_MOVIES)], user_id)
+    storage.dispose_engine()
+
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=('reader', i, user_id, args.duration, results))
+                 for i in range(args.readers)]
+    processes += [multiprocessing.Process(target=worker, args=('writer', i, user_id, args.duration, results))
+                  for i in range(args.writers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = {role: summarize(reports, role, args.duration) for role in ('reader', 'writer')}
+    for role, stats in summary.items():
+        print(f"{role}s x{stats['processes']}: {stats['operations']} ops, {stats['ops_per_second']:.0f} ops/s, "
+              f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, max {stats['max_ms']:.2f} ms, "
+              f"errors {stats['errors']}, lock retries {stats['lock_retries']} "
+              f"({stats['backoff_seconds']:.2f}s backing off)")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
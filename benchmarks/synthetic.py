@@ -0,0 +1,91 @@
+"""Fill a movies database with synthetic users and movies.
+
+Usage:
+    python benchmarks/synthetic.py --users 10 --movies-per-user 1000 [--catalog-size 5000] [--db /tmp/movies.db]
+
+Titles are built from word lists, so search and suggestions have realistic
+overlap. Each user owns a random sample of a shared catalog of
+--catalog-size films (default: twice --movies-per-user), so ownership
+overlaps between users like it does for popular titles.
+
+Without --db the database goes to a new temporary directory (printed at
+the end), never over the app's data/movies.db.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADJECTIVES = ['Silent', 'Crimson', 'Lost', 'Broken', 'Golden', 'Hidden', 'Last', 'Midnight', 'Wild', 'Frozen',
+              'Secret', 'Dark', 'Electric', 'Empty', 'Burning', 'Distant']
+NOUNS = ['River', 'Empire', 'Garden', 'Station', 'Horizon', 'Kingdom', 'Letter', 'Island', 'Machine', 'Shadow',
+         'Winter', 'Harbor', 'Signal', 'Witness', 'Planet', 'Voyage']
+BATCH_SIZE = 1000
+
+
+def synthetic_title(index):
+    """Return the title of catalog film number `index` (unique per index)."""
+    adjective = ADJECTIVES[index % len(ADJECTIVES)]
+    noun = NOUNS[index // len(ADJECTIVES) % len(NOUNS)]
+    return f"The {adjective} {noun} {index}"
+
+
+def synthetic_movie(index, rng):
+    return {
+        'title': synthetic_title(index),
+        'year': 1950 + index % 75,
+        'rating': round(rng.uniform(1, 10), 1),
+        'poster': f"http://posters.invalid/{index}.jpg",
+        'imdb_id': f"tt{index:08d}",
+        'imdb_rating': 1 + index * 7 % 90 / 10,
+    }
+
+
+def generate(storage, users, movies_per_user, catalog_size=None, seed=0, prefix='user'):
+    """Create `users` users with `movies_per_user` movies each; return their ids."""
+    catalog_size = max(catalog_size or 2 * movies_per_user, movies_per_user)
+    rng = random.Random(seed)
+    user_ids = []
+    # storage prints a line per call; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for number in range(users):
+            username = f"{prefix}{number}"
+            storage.add_user(username)
+            user_id = storage.get_user_id(username)
+            indexes = rng.sample(range(catalog_size), movies_per_user)
+            for start in range(0, len(indexes), BATCH_SIZE):
+                storage.add_movies([synthetic_movie(index, rng) for index in indexes[start:start + BATCH_SIZE]],
+                                   user_id, chunk_size=BATCH_SIZE)
+            user_ids.append(user_id)
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic movies database.')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--movies-per-user', type=int, default=1000)
+    parser.add_argument('--catalog-size', type=int, help='distinct films to draw from (default: 2x movies per user)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help='database file to fill (default: movies.db in a new temporary directory)')
+    args = parser.parse_args()
+    if args.db is None:
+        args.db = os.path.join(tempfile.mkdtemp(prefix='movies_synthetic_'), 'movies.db')
+
+    os.environ['MOVIES_DB_URL'] = f"sqlite:///{args.db}"
+    from movie_storage import movie_storage_sql as storage
+    started = time.perf_counter()
+    generate(storage, args.users, args.movies_per_user, args.catalog_size, args.seed)
+    elapsed = time.perf_counter() - started
+    total = args.users * args.movies_per_user
+    print(f"Generated {args.users} users x {args.movies_per_user} movies in {args.db} "
+          f"in {elapsed:.1f}s ({total / elapsed:.0f} movies/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from movie_storage import movie_storage_sql as storage
+from services.omdb_api import RateLimiter, lookup_movie
+from services import omdb_cache
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 10  # OMDb requests per second
+
+
+def read_titles(file_path):
+    """Read titles from a text file (one per line) or a CSV file (a 'title' column, else the first one)."""
+    with open(file_path, 'r', encoding='utf-8', newline='') as file:
+        if file_path.lower().endswith('.csv'):
+            rows = list(csv.reader(file))
+            if not rows:
+                return []
+            header = [cell.strip().lower() for cell in rows[0]]
+            if 'title' in header:
+                column = header.index('title')
+                rows = rows[1:]
+            else:
+                column = 0
+            titles = [row[column] for row in rows if len(row) > column]
+        else:
+            titles = file.read().splitlines()
+    # drop blanks and repeats, keeping the file order
+    unique_titles = {}
+    for title in titles:
+        title = title.strip()
+        if title:
+            unique_titles.setdefault(title.casefold(), title)
+    return list(unique_titles.values())
+
+
+def resolve_titles(titles, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """Look titles up in the catalog, else on OMDb on a bounded thread pool; return (movies, not_found, failed).
+
+    A title whose lookup raised (a timed-out request or an OMDb error such
+    as a reached request limit) is reported in failed, not in not_found,
+    rather than stopping the import.
+    """
+    limiter = RateLimiter(rate)
+    failed = set()
+
+    def resolve(title):
+        try:
+            return storage.find_catalog_movie(title) or lookup_movie(title, limiter)
+        except Exception as e:
+            print(f"Looking up '{title}' failed: {e}")
+            failed.add(title)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(resolve, titles))
+    movies = [movie for movie in results if movie is not None]
+    not_found = [title for title, movie in zip(titles, results) if movie is None and title not in failed]
+    return movies, not_found, [title for title in titles if title in failed]
+
+
+def bulk_import(username, file_path, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """Import every title in a file into a user's collection and print a summary."""
+    user_id = storage.get_user_id(username)
+    if user_id is None:
+        storage.add_user(username)
+        user_id = storage.get_user_id(username)
+    titles = read_titles(file_path)
+    started = time.perf_counter()
+    movies, not_found, failed = resolve_titles(titles, workers, rate)
+    # the OMDb rating is both the film's IMDb rating and the user's starting rating
+    added, duplicates = storage.add_movies([dict(movie, imdb_rating=movie['rating']) for movie in movies], user_id)
+    elapsed = time.perf_counter() - started
+    print(f"\nImported {len(titles)} titles for {username} in {elapsed:.1f}s")
+    print(f"Added: {len(added)}")
+    print(f"Duplicates: {len(duplicates)}")
+    print(f"Not found: {len(not_found)}")
+    for title in not_found:
+        print(f"  - {title}")
+    print(f"Failed: {len(failed)}")
+    for title in failed:
+        print(f"  - {title}")
+    print(omdb_cache.format_cache_stats())
+    return added, duplicates, not_found, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import movie titles into a user's collection.")
+    parser.add_argument('username', help='profile to import into (created if missing)')
+    parser.add_argument('file', help='text file with one title per line, or a CSV file')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='concurrent OMDb requests')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='max OMDb requests per second')
+    args = parser.parse_args()
+    bulk_import(args.username, args.file, args.workers, args.rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,33 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from instrumentation import timed
+from movie_storage import analytics
 from movie_storage import movie_storage_sql as storage
+from movie_storage.fuzzy import normalize
 
 TEMPLATE_FILE_BATH = '_static/index_template.html'
 OUTPUT_HTML_FILE = '_static/index.html'
+LEADERBOARDS_HTML_FILE = '_static/leaderboards.html'
+# Movies per leaderboard on the generated page
+LEADERBOARD_SIZE = 20
+# Per-user manifest of the collection version, template hash and page title ranges used by incremental builds
+MANIFEST_DIR = '_static/.manifest'
+# Cards per generated page; larger collections are split into <username>-2.html, ...
+# Incremental builds keep each page's title range, so a page holds between
+# PAGE_SIZE // 4 and 2 * PAGE_SIZE cards before it is merged or split.
+PAGE_SIZE = 200
+# Bumped when the layout of the <username>-search.js index changes (read by _static/search.js)
+SEARCH_INDEX_VERSION = 2
+
+# (mtime, head, tail, hash) of the last template read, see load_template()
+_template_cache = None
+
 
 def save_file(file_path, content):
     """Save rendered content to a file."""
@@ -12,30 +38,318 @@ def load_html(file_path):
     with open(file_path, 'r',encoding='utf-8') as template:
         return template.read()
 
+
+def load_template():
+    """Return (head, tail, hash) of the template, split around the movie grid.
+
+    The template is only re-read from disk when its modification time changes.
+    """
+    global _template_cache
+    mtime = os.path.getmtime(TEMPLATE_FILE_BATH)
+    if _template_cache is None or _template_cache[0] != mtime:
+        html_template = load_html(TEMPLATE_FILE_BATH)
+        head, tail = html_template.split('__TEMPLATE_MOVIE_GRID__', 1)
+        template_hash = hashlib.sha256(html_template.encode('utf-8')).hexdigest()
+        _template_cache = (mtime, head, tail, template_hash)
+    return _template_cache[1:]
+
+
 def serialize_movie(title: str, movie_info: dict):
 
     """Return HTML block for a single movie using semantic tags."""
+    # prefer the locally mirrored thumbnail over hotlinking the remote poster
+    poster = movie_info.get('thumbnail') or movie_info['poster']
+    # films imported without OMDb data can lack a poster or a year
+    poster_html = f'<img src="{poster}" alt="Poster of {title}" class="movie-poster"/>' if poster else ''
+    year_html = f'<p class="movie-year">{movie_info["year"]}</p>' if movie_info['year'] is not None else ''
     return f"""
         <article class="movie-card">
-            <img src="{movie_info['poster']}" alt="Poster of {title}" class="movie-poster"/>
+            {poster_html}
             <h2 class="movie-title">{title}</h2>
-            <p class="movie-year">{movie_info['year']}</p>
+            {year_html}
         </article>
         """
 
-def generate_website(user_id, username):
-    """Generate website index.html from template and movie storage."""
-    html_template = load_html(TEMPLATE_FILE_BATH)
-    movies = storage.list_movies(user_id)
-    if not movies:
+
+def page_file_name(username, page):
+    """Return the output path of a page (page 1 is <username>.html)."""
+    suffix = username if page == 1 else f"{username}-{page}"
+    return OUTPUT_HTML_FILE.replace('index', suffix)
+
+
+def serialize_pagination(username, page, page_count):
+    """Return the links between pages, or an empty string for a single page."""
+    if page_count == 1:
+        return ''
+    links = []
+    for number in range(1, page_count + 1):
+        href = os.path.basename(page_file_name(username, number))
+        if number == page:
+            links.append(f'<span class="current-page">{number}</span>')
+        else:
+            links.append(f'<a href="{href}">{number}</a>')
+    return '<nav class="pagination">' + ' '.join(links) + '</nav>'
+
+
+def search_index_file_name(username):
+    """Return the path of the user's search index script, next to their pages."""
+    return OUTPUT_HTML_FILE.replace('index.html', f"{username}-search.js")
+
+
+def search_key(title):
+    """Lowercase a title and collapse its whitespace, the way search.js does in the browser."""
+    return ' '.join(title.lower().split())
+
+
+def serialize_search_index(username, movies, page_starts):
+    """Return the search index script for (title, year) pairs in page order.
+
+    Every 3-character substring of a title's search key maps to the
+    positions of the titles containing it, stored as gaps between
+    ascending positions to keep the file small. page_starts holds the
+    position of each page's first title. The data is assigned to a global
+    rather than fetched as .json, so search also works on pages opened from disk.
+    """
+    postings = {}
+    for position, (title, _) in enumerate(movies):
+        key = search_key(title)
+        for gram in {key[i:i + 3] for i in range(len(key) - 2)}:
+            postings.setdefault(gram, []).append(position)
+    index = {
+        'version': SEARCH_INDEX_VERSION,
+        'page_starts': page_starts,
+        'pages': [os.path.basename(page_file_name(username, page)) for page in range(1, len(page_starts) + 1)],
+        'titles': [title for title, _ in movies],
+        # an empty string for a missing year, which search.js leaves out of the label
+        'years': ['' if year is None else year for _, year in movies],
+        'trigrams': {gram: [positions[0]] + [b - a for a, b in zip(positions, positions[1:])]
+                     for gram, positions in postings.items()},
+    }
+    return 'window.MOVIE_SEARCH_INDEX = ' + json.dumps(index, ensure_ascii=False, separators=(',', ':')) + ';\n'
+
+
+def load_manifest(username):
+    try:
+        with open(os.path.join(MANIFEST_DIR, f"{username}.json"), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(username, manifest):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    save_file(os.path.join(MANIFEST_DIR, f"{username}.json"), json.dumps(manifest, indent=4))
+
+
+def write_page(file_path, head, cards, tail):
+    """Stream a page to a temporary file, then move it into place."""
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(head)
+        for card in cards:
+            file.write(card)
+        file.write(tail)
+    os.replace(temp_path, file_path)
+
+
+def layout_pages(keys, old_pages):
+    """Split title keys (in ascending order) into pages; return the (start, end) positions of each page.
+
+    Without old pages the keys are cut every PAGE_SIZE titles. Otherwise
+    every key goes to the old page whose first key is the last one not
+    after it, so adding or deleting a title only changes the page it is
+    on. Pages left empty are dropped, pages under PAGE_SIZE // 4 titles
+    join their predecessor and pages over 2 * PAGE_SIZE are split evenly.
+    """
+    if not old_pages or 'first' not in old_pages[0]:  # no manifest, or one from before pages had title ranges
+        return [(start, min(start + PAGE_SIZE, len(keys))) for start in range(0, len(keys), PAGE_SIZE)]
+    starts = [0] + [bisect.bisect_left(keys, page['first']) for page in old_pages[1:]] + [len(keys)]
+    ranges = []
+    for start, end in zip(starts, starts[1:]):
+        if start == end:
+            continue
+        if ranges and (end - start < PAGE_SIZE // 4 or ranges[-1][1] - ranges[-1][0] < PAGE_SIZE // 4):
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    pages = []
+    for start, end in ranges:
+        if end - start <= 2 * PAGE_SIZE:
+            pages.append((start, end))
+            continue
+        parts = (end - start + PAGE_SIZE - 1) // PAGE_SIZE
+        bounds = [start + (end - start) * part // parts for part in range(parts + 1)]
+        pages.extend(zip(bounds, bounds[1:]))
+    return pages
+
+
+@timed
+def generate_website(user_id, username, incremental=True):
+    """Generate the user's pages from the template and movie storage.
+
+    With `incremental`, nothing is read or written while the collection
+    version and template match the manifest. Otherwise pages keep the
+    title ranges recorded in the manifest, and a page is only written when
+    its hash (template, pagination and the hashes of its cards) changed.
+    """
+    head, tail, template_hash = load_template()
+    old_manifest = load_manifest(username) if incremental else {}
+    old_pages = old_manifest.get('pages', [])
+    index_path = search_index_file_name(username)
+    version = storage.get_version(user_id)
+    if (version is not None and old_manifest.get('version') == version
+            and old_manifest.get('template') == template_hash and os.path.exists(index_path)
+            and all(os.path.exists(page['file']) for page in old_pages)):
+        print("Website is up to date.")
+        return
+    # one streaming pass for what the layout and the search index need;
+    # the cards are read page by page below
+    keys = []
+    entries = []
+    for title, info in storage.iter_movies(user_id, chunk_size=PAGE_SIZE):
+        keys.append(normalize(title))
+        entries.append((title, info['year']))
+    if not entries:
         print(f"{username}, your movie collection is empty!")
         return
-    movie_grid = ''.join(serialize_movie(title, info) for title, info in movies.items())
-    rendered_html = html_template.replace('__TEMPLATE_TITLE__',f"__ {username}'s Movie database __")
-    rendered_html = rendered_html.replace(' __TEMPLATE_MOVIE_GRID__',movie_grid)
-    personalized_file_path = OUTPUT_HTML_FILE.replace('index',username)
-    save_file(personalized_file_path,rendered_html)
-    print("Website was generated successfully.")
+    pages = layout_pages(keys, old_pages)
+    page_count = len(pages)
+    head = head.replace('__TEMPLATE_TITLE__', f"__ {username}'s Movie database __")
+    head = head.replace('__TEMPLATE_SEARCH_INDEX__', os.path.basename(index_path))
+    manifest_pages = []
+    written = 0
+    for page, (start, end) in enumerate(pages, start=1):
+        after = (None, entries[start - 1][0]) if start else None
+        cards = [serialize_movie(title, info)
+                 for title, info in storage.movie_page(user_id, 'title', end - start, after)]
+        card_hashes = [hashlib.sha256(card.encode('utf-8')).hexdigest() for card in cards]
+        pagination = serialize_pagination(username, page, page_count)
+        page_hash = hashlib.sha256(
+            '\n'.join([template_hash, head, pagination] + card_hashes).encode('utf-8')).hexdigest()
+        file_path = page_file_name(username, page)
+        manifest_pages.append({'file': file_path, 'first': keys[start], 'last': keys[end - 1], 'hash': page_hash})
+        unchanged = (page <= len(old_pages) and old_pages[page - 1]['hash'] == page_hash
+                     and os.path.exists(file_path))
+        if unchanged:
+            continue
+        write_page(file_path, head, cards, tail.replace('__TEMPLATE_PAGINATION__', pagination))
+        written += 1
+    # remove pages left over from a larger collection
+    for old_page in old_pages[page_count:]:
+        if os.path.exists(old_page['file']):
+            os.remove(old_page['file'])
+    search_index = serialize_search_index(username, entries, [start for start, _ in pages])
+    search_index_hash = hashlib.sha256(search_index.encode('utf-8')).hexdigest()
+    if old_manifest.get('search_index') != search_index_hash or not os.path.exists(index_path):
+        save_file(index_path, search_index)
+    manifest = {'template': template_hash, 'version': version, 'pages': manifest_pages,
+                'search_index': search_index_hash}
+    if manifest != old_manifest:
+        save_manifest(username, manifest)
+    print(f"Website was generated successfully. ({written} of {page_count} pages rewritten)")
+
+
+def serialize_leaderboard(caption, movies):
+    """Return a table of ranked movies with their collection count and average rating."""
+    rows = ''.join(
+        f"<tr><td>{rank}</td><td>{movie['title']} ({movie['year']})</td><td>{movie['owners']}</td>"
+        f"<td>{movie['average']:.1f}</td></tr>"
+        for rank, movie in enumerate(movies, start=1))
+    return (f'<table class="leaderboard"><caption>{caption}</caption>'
+            f'<tr><th>#</th><th>Movie</th><th>Collections</th><th>Average</th></tr>{rows}</table>')
+
+
+def serialize_decades(decades):
+    """Return a table of movies and average rating per decade."""
+    rows = ''.join(
+        f"<tr><td>{f'{decade}s' if decade else 'unknown'}</td><td>{movies}</td><td>{average:.1f}</td></tr>"
+        for decade, movies, average in decades)
+    return (f'<table class="leaderboard"><caption>Movies per decade</caption>'
+            f'<tr><th>Decade</th><th>Movies</th><th>Average</th></tr>{rows}</table>')
+
+
+@timed
+def generate_leaderboards():
+    """Write the cross-user leaderboards page: a grid of the most collected movies, then the rankings."""
+    head, tail, _ = load_template()
+    head = head.replace('__TEMPLATE_TITLE__', "__ Leaderboards __")
+    head = head.replace('__TEMPLATE_SEARCH_INDEX__', '')  # no collection to search
+    collected = analytics.most_collected(LEADERBOARD_SIZE)
+    cards = [serialize_movie(movie['title'], movie) for movie in collected]
+    tables = '\n'.join([
+        serialize_leaderboard('Most collected', collected),
+        serialize_leaderboard(f"Highest rated (at least {analytics.MIN_RATINGS} ratings)",
+                              analytics.highest_rated(LEADERBOARD_SIZE)),
+        serialize_decades(analytics.by_decade()),
+    ])
+    write_page(LEADERBOARDS_HTML_FILE, head, cards,
+               tail.replace('__TEMPLATE_PAGINATION__', f'<section class="leaderboards">{tables}</section>'))
+    print(f"Leaderboards were written to {LEADERBOARDS_HTML_FILE}")
+
+
+def _init_worker():
+    """Give each worker process its own database connections."""
+    storage.dispose_engine()
+
+
+def _build_site(user_id, username):
+    """Build one user's site in a worker; return (username, seconds, error)."""
+    started = time.perf_counter()
+    try:
+        generate_website(user_id, username)
+        return username, time.perf_counter() - started, None
+    except Exception as e:
+        return username, time.perf_counter() - started, repr(e)
+
+
+def generate_all_websites(usernames=None, workers=None):
+    """Build the sites of every user (or only `usernames`) in parallel on a process pool.
+
+    Prints the render time of each user, the overall throughput and any
+    failures; one failing user does not stop the others. Returns the
+    usernames that failed.
+    """
+    users = storage.list_users()
+    if usernames:
+        wanted = set(usernames)
+        users = [user for user in users if user.username in wanted]
+    started = time.perf_counter()
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(_build_site, user.id, user.username): user.username for user in users}
+        for future in as_completed(futures):
+            try:
+                username, seconds, error = future.result()
+            except Exception as e:  # the worker process itself died
+                username, seconds, error = futures[future], 0.0, repr(e)
+            if error:
+                failures.append(username)
+                print(f"FAILED {username} after {seconds:.2f}s: {error}")
+            else:
+                print(f"Built {username} in {seconds:.2f}s")
+    elapsed = time.perf_counter() - started
+    built = len(users) - len(failures)
+    print(f"\n{built} of {len(users)} sites built in {elapsed:.2f}s "
+          f"({len(users) / elapsed if elapsed else 0:.1f} users/s)")
+    if failures:
+        print(f"Failed: {', '.join(failures)}")
+    generate_leaderboards()
+    return failures
+
 
+def main():
+    parser = argparse.ArgumentParser(description='Build the movie website of every user in parallel.')
+    parser.add_argument('usernames', nargs='*', help='only build these users (default: all)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--mirror-posters', action='store_true',
+                        help='download new posters to _static/posters/ before building')
+    args = parser.parse_args()
+    if args.mirror_posters:
+        from services.poster_mirror import mirror_posters
+        mirror_posters()
+    failures = generate_all_websites(args.usernames, args.workers)
+    raise SystemExit(1 if failures else 0)
 
 
+if __name__ == "__main__":
+    main()
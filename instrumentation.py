@@ -0,0 +1,156 @@
+"""Per-command counters for SQL queries, SQL time and wrapped hot functions.
+
+Set MOVIES_INSTRUMENT=1 to collect them and see them under "Performance
+report" in the menu. Set MOVIES_PROFILE=movies.prof to also run every
+command under cProfile and dump the stats to that file on exit (read them
+with `python -m pstats movies.prof`).
+
+Both are read once at import. When they are unset, timed() returns the
+function itself and command() is a shared no-op context, so the only cost
+left is one attribute lookup per menu command.
+"""
+import contextlib
+import functools
+import os
+import threading
+import time
+
+ENABLED = os.getenv('MOVIES_INSTRUMENT', '') not in ('', '0')
+PROFILE_PATH = os.getenv('MOVIES_PROFILE') or None
+
+# Queries and calls outside any menu command (e.g. choosing a user) are counted here
+OUTSIDE_COMMANDS = '(outside commands)'
+
+_lock = threading.Lock()
+_commands = {}
+_current = OUTSIDE_COMMANDS
+_profiler = None
+_disabled = contextlib.nullcontext()
+
+
+def _command_stats(name):
+    return _commands.setdefault(name, {'runs': 0, 'seconds': 0.0, 'queries': 0, 'sql_seconds': 0.0,
+                                       'functions': {}})
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _count_query(conn)
+
+
+def _handle_error(exception_context):
+    """Count a failed statement too, so its start time does not stay on the connection."""
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_started'):
+        _count_query(conn)
+
+
+def _count_query(conn):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    with _lock:
+        stats = _command_stats(_current)
+        stats['queries'] += 1
+        stats['sql_seconds'] += elapsed
+
+
+def _listen():
+    """Time every statement of every engine, including ones created later."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+
+
+def timed(function):
+    """Record calls and time of `function` under the running command; returns it unchanged when disabled."""
+    if not ENABLED:
+        return function
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with _lock:
+                calls = _command_stats(_current)['functions'].setdefault(name, [0, 0.0])
+                calls[0] += 1
+                calls[1] += elapsed
+    return wrapper
+
+
+@contextlib.contextmanager
+def _measure(name):
+    global _current
+    previous, _current = _current, name
+    if _profiler is not None:
+        _profiler.enable()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if _profiler is not None:
+            _profiler.disable()
+        with _lock:
+            stats = _command_stats(name)
+            stats['runs'] += 1
+            stats['seconds'] += elapsed
+        _current = previous
+
+
+def command(name):
+    """Context manager attributing everything that runs inside it to the menu command `name`."""
+    if not (ENABLED or _profiler):
+        return _disabled
+    return _measure(name)
+
+
+def report():
+    """Return {command: stats} collected so far (a copy)."""
+    with _lock:
+        return {name: dict(stats, functions=dict(stats['functions'])) for name, stats in _commands.items()}
+
+
+def print_report(top_functions=10):
+    """Print the OMDb cache counters, the per-command table and, when profiling, the most expensive functions."""
+    # the cache counts in every run, instrumented or not
+    from services.omdb_cache import format_cache_stats
+    print(format_cache_stats())
+    if not ENABLED and _profiler is None:
+        print("Instrumentation is off. Start the app with MOVIES_INSTRUMENT=1 (and optionally MOVIES_PROFILE=file.prof).")
+        return
+    if ENABLED:
+        print(f"{'Command':<28}{'runs':>6}{'total ms':>12}{'queries':>9}{'SQL ms':>10}{'other ms':>10}")
+        for name, stats in sorted(report().items(), key=lambda item: item[1]['seconds'], reverse=True):
+            other = max(stats['seconds'] - stats['sql_seconds'], 0.0)
+            print(f"{name:<28}{stats['runs']:>6}{stats['seconds'] * 1000:>12.1f}{stats['queries']:>9}"
+                  f"{stats['sql_seconds'] * 1000:>10.1f}{other * 1000:>10.1f}")
+            for function, (calls, seconds) in sorted(stats['functions'].items(), key=lambda item: -item[1][1]):
+                print(f"    {function:<40} {calls:>6} calls {seconds * 1000:>10.1f} ms")
+    if _profiler is not None:
+        import io
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(_profiler, stream=output).sort_stats('cumulative').print_stats(top_functions)
+        print(output.getvalue())
+        print(f"Full profile is written to {PROFILE_PATH} on exit.")
+
+
+def _dump_profile():
+    _profiler.dump_stats(PROFILE_PATH)
+
+
+if ENABLED:
+    _listen()
+if PROFILE_PATH:
+    import atexit
+    import cProfile
+    _profiler = cProfile.Profile()
+    atexit.register(_dump_profile)
@@ -0,0 +1,259 @@
+"""Move movie collections between the SQL store, legacy data.json, NDJSON and CSV.
+
+Usage:
+    python migrate.py SOURCE DESTINATION [--user NAME] [--batch-size 1000]
+
+SOURCE and DESTINATION are either `sql` (the SQLite store, for the profile
+given with --user) or a file path whose extension picks the format:
+.json (legacy {title: {rating, year}}), .ndjson or .csv. For example:
+
+    python migrate.py sql backups/waad.ndjson --user waad      # export
+    python migrate.py data/data.json sql --user waad           # import
+    python migrate.py backups/waad.ndjson backups/waad.csv     # convert
+
+Rows are streamed in batches of --batch-size, so no format ever holds a
+whole collection in memory; writes to SQL are one executemany transaction
+per batch.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+from movie_storage import movie_storage_sql as storage
+
+DEFAULT_BATCH_SIZE = 1000
+CSV_FIELDS = ['title', 'year', 'rating', 'poster']
+READ_CHUNK = 64 * 1024
+
+
+def _movie(title, info):
+    """Return a movie row; legacy data has no posters, which are stored as NULL."""
+    return {'title': title, 'year': info.get('year'), 'rating': info.get('rating'), 'poster': info.get('poster')}
+
+
+def _iter_json_object(file):
+    """Yield the (key, value) pairs of a top-level JSON object without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def refill():
+        nonlocal buffer, position, eof
+        chunk = file.read(READ_CHUNK)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            refill()
+
+    def decode():
+        nonlocal position
+        while True:
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+                return value
+            except ValueError:
+                if eof:
+                    raise
+                refill()
+
+    def expect(character):
+        nonlocal position
+        skip_whitespace()
+        if position >= len(buffer) or buffer[position] != character:
+            raise ValueError(f"Expected {character!r} in JSON data")
+        position += 1
+
+    refill()
+    expect('{')
+    skip_whitespace()
+    if buffer[position:position + 1] == '}':
+        return
+    while True:
+        skip_whitespace()
+        key = decode()
+        expect(':')
+        skip_whitespace()
+        value = decode()
+        yield key, value
+        skip_whitespace()
+        if buffer[position:position + 1] == ',':
+            position += 1
+            # drop what has been parsed so the buffer stays one chunk long
+            buffer = buffer[position:]
+            position = 0
+            continue
+        expect('}')
+        return
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        for title, info in _iter_json_object(file):
+            yield _movie(title, info)
+
+
+def read_ndjson(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                movie = json.loads(line)
+                yield _movie(movie['title'], movie)
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        for row in csv.DictReader(file):
+            # an unknown year is exported as an empty cell
+            year = int(row['year']) if row['year'] else None
+            yield _movie(row['title'], {'year': year, 'rating': float(row['rating']), 'poster': row.get('poster')})
+
+
+def read_sql(user_id, batch_size):
+    for title, info in storage.iter_movies(user_id, chunk_size=batch_size):
+        yield _movie(title, info)
+
+
+def write_json(path, batches):
+    """Write the legacy {title: {rating, year}} format, one entry at a time."""
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('{')
+        first = True
+        for batch in batches:
+            for movie in batch:
+                info = json.dumps({'rating': movie['rating'], 'year': movie['year']}, indent=4)
+                file.write(('\n' if first else ',\n') + f"    {json.dumps(movie['title'])}: "
+                           + info.replace('\n', '\n    '))
+                first = False
+            yield len(batch)
+        file.write('\n}\n')
+
+
+def write_ndjson(path, batches):
+    with open(path, 'w', encoding='utf-8') as file:
+        for batch in batches:
+            file.writelines(json.dumps(movie) + '\n' for movie in batch)
+            yield len(batch)
+
+
+def write_csv(path, batches):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for batch in batches:
+            writer.writerows(batch)
+            yield len(batch)
+
+
+def write_sql(user_id, batches, summary):
+    """Insert each batch with storage.add_movies (one transaction per batch).
+
+    A batch whose transaction failed adds nothing and reports no duplicates
+    either: it is counted as failed, not as moved.
+    """
+    for batch in batches:
+        added, duplicates = storage.add_movies(batch, user_id, chunk_size=len(batch))
+        if not added and not duplicates:
+            summary['failed'] += len(batch)
+            yield 0
+            continue
+        summary['added'] += len(added)
+        summary['duplicates'] += len(duplicates)
+        yield len(batch)
+
+
+READERS = {'.json': read_json, '.ndjson': read_ndjson, '.csv': read_csv}
+WRITERS = {'.json': write_json, '.ndjson': write_ndjson, '.csv': write_csv}
+
+
+def _format(location):
+    if location == 'sql':
+        return 'sql'
+    extension = os.path.splitext(location)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported format for {location}: use sql, .json, .ndjson or .csv")
+    return extension
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _user_id(username, create):
+    if not username:
+        raise ValueError("--user is required when reading from or writing to sql")
+    user_id = storage.get_user_id(username)
+    if user_id is None and create:
+        storage.add_user(username)
+        user_id = storage.get_user_id(username)
+    if user_id is None:
+        raise ValueError(f"No user named {username}")
+    return user_id
+
+
+def migrate(source, destination, username=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream movies from source to destination in batches and report the throughput."""
+    source_format, destination_format = _format(source), _format(destination)
+    if source_format == 'sql':
+        rows = read_sql(_user_id(username, create=False), batch_size)
+    else:
+        rows = READERS[source_format](source)
+    summary = {'rows': 0, 'added': 0, 'duplicates': 0, 'failed': 0}
+    batches = _batches(rows, batch_size)
+    # open and parse the source before a target profile is created for it
+    first = next(batches, None)
+    batches = itertools.chain([first] if first else [], batches)
+    if destination_format == 'sql':
+        written = write_sql(_user_id(username, create=True), batches, summary)
+    else:
+        written = WRITERS[destination_format](destination, batches)
+    started = time.perf_counter()
+    for count in written:
+        summary['rows'] += count
+        elapsed = time.perf_counter() - started
+        print(f"\r{summary['rows']} rows ({summary['rows'] / elapsed if elapsed else 0:.0f} rows/s)", end='')
+    elapsed = time.perf_counter() - started
+    summary['seconds'] = elapsed
+    summary['rows_per_second'] = summary['rows'] / elapsed if elapsed else 0.0
+    print(f"\rMoved {summary['rows']} rows from {source} to {destination} in {elapsed:.2f}s "
+          f"({summary['rows_per_second']:.0f} rows/s)")
+    if destination_format == 'sql':
+        print(f"Added: {summary['added']}, duplicates: {summary['duplicates']}, failed: {summary['failed']}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export, import or convert movie collections.')
+    parser.add_argument('source', help='sql, or a .json/.ndjson/.csv file')
+    parser.add_argument('destination', help='sql, or a .json/.ndjson/.csv file')
+    parser.add_argument('--user', help='profile to read from or write to when a side is sql')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    try:
+        summary = migrate(args.source, args.destination, args.user, args.batch_size)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Cross-user leaderboards and catalog statistics.
+
+Reads the aggregate tables that triggers on user_movies keep current
+(title_stats per catalog film, year_stats per release year, see
+migration 10 in movie_storage_sql), so every view here is a single
+indexed read however many users the database has. rebuild() recomputes
+the tables from scratch in one grouped pass each.
+"""
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from instrumentation import timed
+from movie_storage import movie_storage_sql as storage
+
+# A film needs this many ratings to appear among the highest rated
+MIN_RATINGS = 2
+
+
+def _film_rows(order_by, where, params):
+    with storage.get_engine().connect() as connection:
+        rows = connection.execute(text(f"""
+            SELECT c.title, c.year, c.poster, p.thumbnail_path, ts.owners, ts.average
+            FROM title_stats ts JOIN catalog c ON c.id = ts.catalog_id
+            LEFT JOIN poster_mirror p ON p.url = c.poster
+            WHERE {where}
+            ORDER BY {order_by}
+            LIMIT :limit
+        """), params).fetchall()
+    return [
+        {
+            "title": row.title,
+            "year": row.year,
+            "poster": row.poster,
+            "thumbnail": row.thumbnail_path,
+            "owners": row.owners,
+            "average": row.average,
+        }
+        for row in rows
+    ]
+
+
+@timed
+def most_collected(limit:int=10):
+    """Return the films in the most collections, as dicts with title, year, poster, owners and average rating."""
+    try:
+        return _film_rows("ts.owners DESC, ts.average DESC", "1", {"limit": limit})
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return []
+
+
+@timed
+def highest_rated(limit:int=10, min_ratings:int=MIN_RATINGS):
+    """Return the films with the best average rating across users, among those rated at least `min_ratings` times."""
+    try:
+        return _film_rows("ts.average DESC, ts.owners DESC", "ts.owners >= :min_ratings",
+                          {"limit": limit, "min_ratings": min_ratings})
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return []
+
+
+@timed
+def by_decade():
+    """Return [(decade, movies, average rating)] over every collection, oldest first; decade None is an unknown year."""
+    try:
+        with storage.get_engine().connect() as connection:
+            rows = connection.execute(text("""
+                SELECT year / 10 * 10 AS decade, SUM(movies) AS movies, SUM(rating_sum) / SUM(movies) AS average
+                FROM year_stats
+                GROUP BY decade
+                ORDER BY decade
+            """)).fetchall()
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return []
+    return [(row.decade or None, row.movies, row.average) for row in rows]
+
+
+def rebuild():
+    """Recompute the aggregate tables from user_movies; return True on success."""
+    try:
+        storage.rebuild_analytics()
+        return True
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return False
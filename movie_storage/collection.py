@@ -0,0 +1,163 @@
+"""A compact, column-oriented copy of one user's collection.
+
+Titles and their normalized keys are kept in lists sorted by key (the
+order storage.iter_movies uses); years and ratings live in typed arrays,
+so a movie costs two strings and 12 bytes instead of a dict per movie.
+Statistics run on the rating column: with NumPy installed they are
+vectorized over a zero-copy view of the array (np.partition for the
+median), otherwise plain Python does the same work.
+"""
+import bisect
+import math
+from array import array
+
+from movie_storage.fuzzy import normalize
+
+_numpy = None
+
+
+def load_numpy():
+    """Return the numpy module, or False when it is not installed (imported on first use only)."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+class MovieCollection:
+    """Titles, years and ratings of a collection as parallel columns in title order."""
+
+    __slots__ = ('titles', 'keys', 'years', 'ratings')
+
+    def __init__(self):
+        self.titles = []
+        self.keys = []
+        self.years = array('i')   # 0 when the year is unknown
+        self.ratings = array('d')
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a collection from (title_key, title, year, rating) rows already in title_key order."""
+        collection = cls()
+        for title_key, title, year, rating in rows:
+            collection.keys.append(title_key)
+            collection.titles.append(title)
+            collection.years.append(year or 0)
+            collection.ratings.append(rating)
+        return collection
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _position(self, title):
+        """Return the index of a title (matched like storage does), or None."""
+        key = normalize(title)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return None
+
+    def insert(self, title, year, rating):
+        """Insert a movie at its place in title order; return False if it is already there."""
+        key = normalize(title)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return False
+        self.keys.insert(index, key)
+        self.titles.insert(index, title)
+        self.years.insert(index, year or 0)
+        self.ratings.insert(index, rating)
+        return True
+
+    def remove(self, title):
+        """Remove a movie; return False if it is not in the collection."""
+        index = self._position(title)
+        if index is None:
+            return False
+        del self.keys[index], self.titles[index], self.years[index], self.ratings[index]
+        return True
+
+    def set_rating(self, title, rating):
+        """Change a movie's rating; return False if it is not in the collection."""
+        index = self._position(title)
+        if index is None:
+            return False
+        self.ratings[index] = rating
+        return True
+
+    def items(self):
+        """Yield (title, info) in title order, like storage.iter_movies."""
+        years, ratings = self.years, self.ratings
+        for index, title in enumerate(self.titles):
+            yield title, {"year": years[index] or None, "rating": ratings[index]}
+
+    def _rating_order(self):
+        """Return indexes best rating first; ties stay in title order (both sorts are stable)."""
+        numpy = load_numpy()
+        if numpy:
+            return numpy.argsort(-numpy.frombuffer(self.ratings), kind='stable').tolist()
+        return sorted(range(len(self.ratings)), key=self.ratings.__getitem__, reverse=True)
+
+    def by_rating(self):
+        """Yield (title, info) best rated first, like storage.iter_movies(order_by='rating')."""
+        titles, years, ratings = self.titles, self.years, self.ratings
+        for index in self._rating_order():
+            yield titles[index], {"year": years[index] or None, "rating": ratings[index]}
+
+    def mean(self):
+        numpy = load_numpy()
+        if numpy:
+            return float(numpy.frombuffer(self.ratings).mean())
+        return math.fsum(self.ratings) / len(self.ratings)
+
+    def median(self):
+        """Return the median rating, found by selection (np.partition) rather than a full sort when NumPy is available."""
+        count = len(self.ratings)
+        middle = count // 2
+        numpy = load_numpy()
+        if numpy:
+            wanted = [middle] if count % 2 else [middle - 1, middle]
+            selected = numpy.partition(numpy.frombuffer(self.ratings), wanted)[wanted]
+            return float(selected.mean())
+        ordered = sorted(self.ratings)
+        if count % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2
+
+    def _extreme(self, best):
+        """Return (rating, titles) of every movie with the highest (best=True) or lowest rating."""
+        numpy = load_numpy()
+        if numpy:
+            values = numpy.frombuffer(self.ratings)
+            rating = float(values.max() if best else values.min())
+            indexes = numpy.flatnonzero(values == rating).tolist()
+        else:
+            rating = max(self.ratings) if best else min(self.ratings)
+            indexes = [index for index, value in enumerate(self.ratings) if value == rating]
+        return rating, [self.titles[index] for index in indexes]
+
+    def best(self):
+        return self._extreme(True)
+
+    def worst(self):
+        return self._extreme(False)
+
+    def stats(self):
+        """Return the same dict as storage.get_stats(), or None if the collection is empty."""
+        if not self.titles:
+            return None
+        max_rating, best = self.best()
+        min_rating, worst = self.worst()
+        return {
+            "count": len(self.titles),
+            "average": self.mean(),
+            "median": self.median(),
+            "min": min_rating,
+            "max": max_rating,
+            "best": best,
+            "worst": worst,
+        }
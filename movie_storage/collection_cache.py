@@ -0,0 +1,93 @@
+"""Read-through cache of the active user's collection for one CLI session.
+
+Reads check the collection version stored in user_stats (one primary-key
+lookup) and only reload when another process has changed the collection.
+Mutations made through this module are written to the database and then
+applied to the cached copy, a columnar MovieCollection.
+"""
+from instrumentation import timed
+from movie_storage import movie_storage_sql as storage
+
+# Larger collections are streamed from storage instead of being held in memory
+MAX_CACHED_MOVIES = 20000
+
+_user_id = None
+_version = None
+_collection = None  # MovieCollection in title order, like storage.iter_movies()
+
+
+def invalidate():
+    """Forget the cached collection, e.g. when the active user changes."""
+    global _user_id, _version, _collection
+    _user_id = _version = _collection = None
+
+
+@timed
+def get_collection(user_id):
+    """Return the user's MovieCollection, or None if the collection is too large to cache."""
+    global _user_id, _version, _collection
+    version = storage.get_version(user_id)
+    if _collection is None or _user_id != user_id or _version != version:
+        if storage.count_movies(user_id) > MAX_CACHED_MOVIES:
+            invalidate()
+            return None
+        # the version is read before loading, so a concurrent change only causes another reload
+        _collection = storage.load_collection(user_id)
+        _user_id, _version = user_id, version
+    return _collection
+
+
+def get_stats(user_id):
+    """Return storage.get_stats()'s dict, computed from the cached columns when the collection is cached."""
+    collection = get_collection(user_id)
+    if collection is None:
+        return storage.get_stats(user_id)
+    return collection.stats()
+
+
+def _apply(user_id, change):
+    """Apply a successful write to the cache if it is the only change since the cache was loaded."""
+    global _version
+    if _collection is None or _user_id != user_id:
+        return
+    version = storage.get_version(user_id)
+    if version != _version + 1:
+        # someone else changed the collection too: reload on the next read
+        invalidate()
+        return
+    change()
+    _version = version
+
+
+def add_movie(title, year, rating, poster, user_id, imdb_id=None, imdb_rating=None):
+    """Add a movie through storage and write it through to the cache."""
+    if not storage.add_movie(title, year, rating, poster, user_id, imdb_id, imdb_rating):
+        return False
+    _apply(user_id, lambda: _insert_stored(title, user_id))
+    return True
+
+
+def _insert_stored(title, user_id):
+    """Cache a just added movie as storage holds it: a catalog film keeps the catalog's title and year."""
+    movie = storage.get_movie(title, user_id)
+    if movie is None:
+        invalidate()
+        return
+    stored_title, info = movie
+    _collection.insert(stored_title, info['year'], info['rating'])
+
+
+def delete_movie(title, user_id):
+    """Delete a movie through storage and drop it from the cache."""
+    if not storage.delete_movie(title, user_id):
+        return False
+    _apply(user_id, lambda: _collection.remove(title))
+    return True
+
+
+def update_movie(title, rating, user_id):
+    """Update a movie's rating through storage and in the cache."""
+    if not storage.update_movie(title, rating, user_id):
+        return False
+    _apply(user_id, lambda: _collection.set_rating(title, rating))
+    return True
@@ -0,0 +1,52 @@
+"""Helpers for fuzzy title matching: trigram keys and a bounded edit distance."""
+from instrumentation import timed
+
+
+def normalize(title: str) -> str:
+    """Casefold a title and collapse its whitespace."""
+    return ' '.join(title.casefold().split())
+
+
+def trigrams(title: str) -> set:
+    """Return the set of padded 3-character grams of a normalized title.
+
+    Padding with two leading spaces and one trailing space gives short titles
+    (and the first/last letters of longer ones) grams of their own.
+    """
+    padded = f"  {normalize(title)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@timed
+def bounded_distance(word1: str, word2: str, max_distance: int):
+    """Return the Levenshtein distance between two strings, or None if it exceeds max_distance.
+
+    Only the diagonal band of width 2 * max_distance + 1 is computed, and the
+    scan stops as soon as a whole row is above the limit.
+    """
+    m, n = len(word1), len(word2)
+    if abs(m - n) > max_distance:
+        return None
+    if m > n:
+        word1, word2, m, n = word2, word1, n, m
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(n + 1)]
+    for i in range(1, m + 1):
+        low = max(1, i - max_distance)
+        high = min(n, i + max_distance)
+        current = [too_far] * (n + 1)
+        current[0] = i if i <= max_distance else too_far
+        row_min = current[0]
+        char1 = word1[i - 1]
+        for j in range(low, high + 1):
+            if char1 == word2[j - 1]:
+                cost = previous[j - 1]
+            else:
+                cost = min(previous[j - 1], previous[j], current[j - 1]) + 1
+            current[j] = cost if cost < too_far else too_far
+            if current[j] < row_min:
+                row_min = current[j]
+        if row_min > max_distance:
+            return None
+        previous = current
+    return previous[n] if previous[n] <= max_distance else None
@@ -0,0 +1,213 @@
+"""Journaled file backend with the same API as movie_storage.py.
+
+The collection is kept in memory. Every add/delete/update appends one JSON
+line to DATA_FILE + '.log' instead of rewriting the whole data file, and
+the log is fsynced in batches. Loading replays the log over the last
+snapshot (DATA_FILE, in the legacy data.json format). Once the log grows
+past COMPACT_THRESHOLD bytes, a background thread writes a fresh snapshot
+and the log starts over.
+"""
+import atexit
+import json
+import os
+import threading
+import weakref
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'data.json')
+
+# fsync after this many mutations, or after FSYNC_INTERVAL seconds, whichever comes first
+FSYNC_BATCH = 64
+FSYNC_INTERVAL = 1.0
+# compact once the log is bigger than this many bytes
+COMPACT_THRESHOLD = 1024 * 1024
+
+# Journals still open, flushed by the single atexit handler below
+_open_journals = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_journals():
+    for journal in list(_open_journals):
+        journal.close()
+
+
+class MovieJournal:
+    """An in-memory {title: {rating, year}} dict backed by a snapshot and an append-only log."""
+
+    def __init__(self, data_file=DATA_FILE):
+        self.snapshot_path = data_file
+        self.log_path = data_file + '.log'
+        # log being folded into a new snapshot; still replayed if compaction was interrupted
+        self.old_log_path = data_file + '.log.old'
+        self.lock = threading.RLock()
+        self.pending = 0
+        self.compacting = None
+        self.movies = self._load()
+        if os.path.exists(self.old_log_path):
+            # an earlier compaction did not finish: its log is replayed above, so finish it now
+            self._write_snapshot({title: dict(info) for title, info in self.movies.items()})
+        self.log = open(self.log_path, 'a', encoding='utf-8')
+        self.timer = None
+        _open_journals.add(self)
+
+    def _load(self):
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as snapshot:
+                movies = json.load(snapshot)
+        except FileNotFoundError:
+            movies = {}
+        self._replay(self.old_log_path, movies)
+        valid_length = self._replay(self.log_path, movies)
+        if valid_length is not None and valid_length < os.path.getsize(self.log_path):
+            # drop a torn last line so new entries start on a line of their own
+            with open(self.log_path, 'r+b') as log:
+                log.truncate(valid_length)
+        return movies
+
+    @staticmethod
+    def _replay(path, movies):
+        """Apply the entries of a log file and return the length of its valid part.
+
+        A corrupt line is skipped; only a torn last line left by a crash
+        is outside the valid part. Returns None if the file does not exist.
+        """
+        valid_length = 0
+        try:
+            with open(path, 'rb') as log:
+                lines = log.readlines()
+        except FileNotFoundError:
+            return None
+        for number, line in enumerate(lines, start=1):
+            try:
+                entry = json.loads(line)
+                if not line.endswith(b'\n'):
+                    raise ValueError('no line end')
+                if entry['op'] == 'add':
+                    movies[entry['title']] = {'rating': entry['rating'], 'year': entry['year']}
+                elif entry['op'] == 'delete':
+                    movies.pop(entry['title'], None)
+                elif entry['op'] == 'update' and entry['title'] in movies:
+                    movies[entry['title']]['rating'] = entry['rating']
+            except (ValueError, KeyError, TypeError):
+                if number == len(lines):
+                    break
+                print(f"Skipping corrupt entry on line {number} of {path}")
+            valid_length += len(line)
+        return valid_length
+
+    def _append(self, entry):
+        """Write one entry to the log; fsync when the batch is full, otherwise soon after."""
+        self.log.write(json.dumps(entry) + '\n')
+        self.pending += 1
+        if self.pending >= FSYNC_BATCH:
+            self.flush()
+        elif self.timer is None:
+            self.timer = threading.Timer(FSYNC_INTERVAL, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+        if self.log.tell() > COMPACT_THRESHOLD and self.compacting is None:
+            self._start_compaction()
+
+    def flush(self):
+        """Make every logged mutation durable."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.pending and not self.log.closed:
+                self.log.flush()
+                os.fsync(self.log.fileno())
+                self.pending = 0
+
+    def _start_compaction(self):
+        """Switch to a fresh log and write a snapshot of the current state in the background."""
+        self.flush()
+        self.log.close()
+        os.replace(self.log_path, self.old_log_path)
+        self.log = open(self.log_path, 'a', encoding='utf-8')
+        state = {title: dict(info) for title, info in self.movies.items()}
+        self.compacting = threading.Thread(target=self._write_snapshot, args=(state,), daemon=True)
+        self.compacting.start()
+
+    def _write_snapshot(self, state):
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as snapshot:
+            json.dump(state, snapshot, indent=4)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        os.remove(self.old_log_path)
+        with self.lock:
+            self.compacting = None
+
+    def close(self):
+        """Flush the log and wait for a running compaction."""
+        compacting = self.compacting
+        if compacting is not None:
+            compacting.join()
+        with self.lock:
+            self.flush()
+            self.log.close()
+        _open_journals.discard(self)
+
+    def list_movies(self):
+        with self.lock:
+            return {title: dict(info) for title, info in self.movies.items()}
+
+    def add_movie(self, title, rating, year):
+        title = title.title()
+        with self.lock:
+            if title in self.movies:
+                return False
+            self.movies[title] = {'rating': rating, 'year': year}
+            self._append({'op': 'add', 'title': title, 'rating': rating, 'year': year})
+            return True
+
+    def delete_movie(self, title):
+        title = title.title()
+        with self.lock:
+            if title not in self.movies:
+                return False
+            del self.movies[title]
+            self._append({'op': 'delete', 'title': title})
+            return True
+
+    def update_movie(self, title, rating):
+        title = title.title()
+        with self.lock:
+            if title not in self.movies:
+                return False
+            self.movies[title]['rating'] = rating
+            self._append({'op': 'update', 'title': title, 'rating': rating})
+            return True
+
+
+# Opened on first use, like the module-level functions of movie_storage.py expect
+_journal = None
+
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        _journal = MovieJournal()
+    return _journal
+
+
+def list_movies():
+    """Return all movies as a dict {title: {rating, year}}."""
+    return get_journal().list_movies()
+
+
+def add_movie(title, rating, year):
+    """Add a movie with one log append; returns False if it already exists."""
+    return get_journal().add_movie(title, rating, year)
+
+
+def delete_movie(title):
+    """Delete a movie with one log append; returns False if it does not exist."""
+    return get_journal().delete_movie(title)
+
+
+def update_movie(title, rating):
+    """Update a movie's rating with one log append; returns False if it does not exist."""
+    return get_journal().update_movie(title, rating)
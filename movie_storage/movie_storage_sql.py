@@ -1,47 +1,624 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+import contextlib
+import heapq
+import itertools
 import os
+import random
+import time
 
-# Define the database URL
-DB_URL = "sqlite:///data/movies.db"
+from instrumentation import timed
+from movie_storage.collection import MovieCollection
+from movie_storage.fuzzy import bounded_distance, normalize, trigrams
 
-# Ensure data/ directory exists
-os.makedirs("data", exist_ok=True)
+# Define the database URL (MOVIES_DB_URL points benchmarks and batch jobs elsewhere)
+DB_URL = os.getenv('MOVIES_DB_URL', "sqlite:///data/movies.db")
+
+# Connection settings for several CLI sessions and batch jobs sharing one file
+BUSY_TIMEOUT_MS = 5000
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+# Retries of a write that still finds the database locked, with exponential backoff
+WRITE_RETRIES = 5
+RETRY_BASE_DELAY = 0.05
+
+# Counters for this process, see write_stats()
+_write_stats = {'retries': 0, 'backoff_seconds': 0.0}
+
+# Created by get_engine() on first use rather than at import time
+_engine = None
+
+# Ratings a user can give a movie (checked by the CLI prompt and the API server)
+RATING_MIN = 1
+RATING_MAX = 10
+
+# Bumped whenever a migration is appended to MIGRATIONS (stored in PRAGMA user_version)
+SCHEMA_VERSION = 11
+
+# Titles further than this edit distance are not offered as suggestions
+MAX_SUGGESTION_DISTANCE = 5
+# How many trigram candidates are checked with the edit distance
+SUGGESTION_CANDIDATES = 200
+# Trigrams in more catalog titles than this (such as "the") are too common to pick candidates by
+FREQUENT_TRIGRAM_TITLES = 2000
+# Trigram postings read per suggestion query
+SUGGESTION_POSTINGS = 10000
+# Collections up to this size are scanned for suggestions instead of reading postings
+SUGGESTION_SCAN_MOVIES = 1000
+# Collections up to this size are scanned by search_movies instead of searching the whole catalog_fts
+SEARCH_SCAN_MOVIES = 5000
+# random_movie draws this many ids per query, for up to RANDOM_PICK_ROUNDS queries
+RANDOM_PICK_DRAWS = 16
+RANDOM_PICK_ROUNDS = 4
+
+
+def get_engine():
+    """Return the engine, creating it and checking the schema on first use."""
+    global _engine
+    if _engine is None:
+        # Ensure data/ directory exists
+        os.makedirs("data", exist_ok=True)
+        _engine = create_engine(DB_URL, echo=False, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                                connect_args={"timeout": BUSY_TIMEOUT_MS / 1000})
+        event.listen(_engine, "connect", _configure_connection)
+        init_db()
+    return _engine
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    """Set up every new SQLite connection for concurrent readers and writers."""
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside a writer; NORMAL is durable enough in WAL mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _is_locked(error):
+    """Return True for SQLite's "database is locked"/"busy" errors."""
+    message = str(error.orig).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _write(operation):
+    """Run operation(connection) in one transaction and commit it, returning its result.
+
+    The transaction takes the write lock with BEGIN IMMEDIATE before
+    operation runs: pysqlite would only begin it at the first INSERT, UPDATE
+    or DELETE, so a row read before that (an old rating, say) could be
+    changed by another writer before this one updates user_stats from it.
+    If the database is still locked after busy_timeout, the whole
+    transaction is retried with exponential backoff and jitter.
+    """
+    delay = RETRY_BASE_DELAY
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            with get_engine().connect() as connection:
+                connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+                return _in_transaction(connection, operation)
+        except OperationalError as e:
+            if attempt == WRITE_RETRIES or not _is_locked(e):
+                raise
+            pause = delay + random.uniform(0, delay)
+            _write_stats['retries'] += 1
+            _write_stats['backoff_seconds'] += pause
+            time.sleep(pause)
+            delay *= 2
+
+
+def write_transaction(operation):
+    """Run operation(connection) in one committed transaction and return its result.
+
+    For modules that keep their own tables in this database; the write is
+    retried on lock errors like every write made here.
+    """
+    return _write(operation)
+
+
+def write_stats():
+    """Return how often writes in this process had to back off because of locks."""
+    return dict(_write_stats)
+
+
+def dispose_engine():
+    """Drop this process's engine, e.g. in a freshly forked worker, so it opens its own connections."""
+    global _engine
+    if _engine is not None:
+        _engine.dispose(close=False)
+        _engine = None
 
-# Create the engine
-engine = create_engine(DB_URL, echo=False)
 
 def init_db():
     """Initialize the database and create the movies table if it does not exist."""
-    # Create the movies table if it does not exist
-    with engine.connect() as connection:
-        # Users table
+    with get_engine().connect() as connection:
+        # pysqlite would commit on its own before DDL; transactions are begun explicitly instead
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        _in_transaction(connection, _create_schema)
+        migrate(connection)
+
+
+def _in_transaction(connection, operation):
+    """Run operation(connection) between an explicit BEGIN and COMMIT, rolling back if it fails."""
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        result = operation(connection)
+    except BaseException:
+        connection.exec_driver_sql("ROLLBACK")
+        raise
+    connection.exec_driver_sql("COMMIT")
+    return result
+
+
+def _create_schema(connection):
+    # Users table
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL
+        )
+    """))
+    # The original per-user movies table, which the migrations build on.
+    # Migration 8 splits it into catalog and user_movies and leaves a view in its place.
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            rating REAL NOT NULL,
+            poster TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+            UNIQUE(title, user_id)
+        )
+    """))
+    # Per-user summary kept up to date by add/delete/update
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            movie_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum REAL NOT NULL DEFAULT 0,
+            min_rating REAL,
+            max_rating REAL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """))
+    # Trigram inverted index used for "did you mean" suggestions (rebuilt on the catalog by migration 8)
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS title_trigrams (
+            user_id INTEGER NOT NULL,
+            trigram TEXT NOT NULL,
+            movie_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, trigram, movie_id)
+        ) WITHOUT ROWID
+    """))
+    # Local copies of poster images, see services/poster_mirror.py
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS poster_mirror (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            image_path TEXT NOT NULL,
+            thumbnail_path TEXT NOT NULL
+        )
+    """))
+
+
+def _migration_user_stats(connection):
+    """Index ratings per user and backfill the user_stats summary table."""
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_movies_user_rating ON movies(user_id, rating)"))
+    connection.execute(text("""
+        INSERT OR REPLACE INTO user_stats (user_id, movie_count, rating_sum, min_rating, max_rating)
+        SELECT user_id, COUNT(*), SUM(rating), MIN(rating), MAX(rating)
+        FROM movies GROUP BY user_id
+    """))
+
+
+def _migration_title_trigrams(connection):
+    """Build the trigram index for movies that predate it."""
+    movies = connection.execute(text("SELECT id, title, user_id FROM movies")).fetchall()
+    rows = [{"user_id": movie.user_id, "trigram": gram, "movie_id": movie.id}
+            for movie in movies for gram in trigrams(movie.title)]
+    if rows:
+        connection.execute(
+            text("INSERT OR IGNORE INTO title_trigrams (user_id, trigram, movie_id) VALUES (:user_id, :trigram, :movie_id)"),
+            rows)
+
+
+def _migration_movies_fts(connection):
+    """Mirror movie titles into an FTS5 trigram table kept in sync by triggers."""
+    try:
         connection.execute(text("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL
-            )
+            CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts
+            USING fts5(title, content='movies', content_rowid='id', tokenize='trigram')
         """))
+    except OperationalError as e:
+        # SQLite built without FTS5 or older than 3.34: search_movies falls back to a scan
+        print(f"Full-text search unavailable: {e}")
+        return
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN
+            INSERT INTO movies_fts (rowid, title) VALUES (new.id, new.title);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN
+            INSERT INTO movies_fts (movies_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF title ON movies BEGIN
+            INSERT INTO movies_fts (movies_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            INSERT INTO movies_fts (rowid, title) VALUES (new.id, new.title);
+        END
+    """))
+    connection.execute(text("INSERT INTO movies_fts (movies_fts) VALUES ('rebuild')"))
+
+
+def _migration_keyset_indexes(connection):
+    """Index the orders iter_movies pages through: by title and by rating."""
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_movies_user_title ON movies(user_id, title)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_movies_user_rating_title ON movies(user_id, rating DESC, title)"))
+    # superseded by idx_movies_user_rating_title, which serves the same lookups
+    connection.execute(text("DROP INDEX IF EXISTS idx_movies_user_rating"))
+
+
+def _migration_user_id_index(connection):
+    """Index movies by (user_id, id) for random_movie's seeks."""
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_movies_user_id ON movies(user_id)"))
+
+
+def _migration_title_key(connection):
+    """Store each title's normalized form and index it, so title lookups are index seeks.
+
+    A user's titles that differ only in case or spacing share a key: the
+    first one added is kept and later copies are merged into it. The step
+    can be re-run on a database where an earlier attempt added the column.
+    """
+    columns = {column.name for column in connection.execute(text("PRAGMA table_info(movies)"))}
+    if 'title_key' not in columns:
+        connection.execute(text("ALTER TABLE movies ADD COLUMN title_key TEXT"))
+    movies = connection.execute(text("SELECT id, title, user_id FROM movies ORDER BY id")).fetchall()
+    keys = {}
+    duplicates = []
+    for movie in movies:
+        key = (movie.user_id, normalize(movie.title))
+        if key in keys:
+            duplicates.append(movie)
+        else:
+            keys[key] = movie.id
+    if duplicates:
+        ids = [movie.id for movie in duplicates]
+        user_ids = sorted({movie.user_id for movie in duplicates})
+        connection.execute(text("DELETE FROM movies WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                           {"ids": ids})
+        connection.execute(text("DELETE FROM title_trigrams WHERE movie_id IN :ids")
+                           .bindparams(bindparam("ids", expanding=True)), {"ids": ids})
         connection.execute(text("""
-            CREATE TABLE IF NOT EXISTS movies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                year INTEGER NOT NULL,
-                rating REAL NOT NULL,
-                poster TEXT NOT NULL,
-                user_id INTEGER NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-                UNIQUE(title, user_id)
-            )
+            INSERT OR REPLACE INTO user_stats (user_id, movie_count, rating_sum, min_rating, max_rating)
+            SELECT user_id, COUNT(*), SUM(rating), MIN(rating), MAX(rating)
+            FROM movies WHERE user_id IN :user_ids GROUP BY user_id
+        """).bindparams(bindparam("user_ids", expanding=True)), {"user_ids": user_ids})
+        print(f"Merged {len(duplicates)} movies whose titles only differed in case or spacing: "
+              f"{', '.join(movie.title for movie in duplicates)}")
+    if keys:
+        connection.execute(text("UPDATE movies SET title_key = :title_key WHERE id = :id"),
+                           [{"id": movie_id, "title_key": title_key} for (_, title_key), movie_id in keys.items()])
+    connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_movies_user_title_key ON movies(user_id, title_key)"))
+
+
+def _migration_collection_version(connection):
+    """Count changes to each collection so caches can tell when they are stale."""
+    connection.execute(text("ALTER TABLE user_stats ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _create_catalog_fts(connection):
+    """Mirror catalog titles into an FTS5 trigram table kept in sync by triggers."""
+    try:
+        connection.execute(text("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts
+            USING fts5(title, content='catalog', content_rowid='id', tokenize='trigram')
         """))
-        connection.commit()
+    except OperationalError as e:
+        # SQLite built without FTS5 or older than 3.34: search_movies falls back to a scan
+        print(f"Full-text search unavailable: {e}")
+        return
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS catalog_fts_insert AFTER INSERT ON catalog BEGIN
+            INSERT INTO catalog_fts (rowid, title) VALUES (new.id, new.title);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS catalog_fts_delete AFTER DELETE ON catalog BEGIN
+            INSERT INTO catalog_fts (catalog_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS catalog_fts_update AFTER UPDATE OF title ON catalog BEGIN
+            INSERT INTO catalog_fts (catalog_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            INSERT INTO catalog_fts (rowid, title) VALUES (new.id, new.title);
+        END
+    """))
+    connection.execute(text("INSERT INTO catalog_fts (catalog_fts) VALUES ('rebuild')"))
+
+
+def _migration_catalog(connection):
+    """Split movies into a shared catalog and a per-user user_movies table.
+
+    Each distinct (title, year) becomes one catalog row; its IMDb ID and
+    rating are filled in the next time OMDb resolves it. user_movies keeps the old
+    movie ids, the user's rating and the title_key its indexes seek on.
+    A `movies` view with the old columns is left for other readers.
+    """
+    connection.execute(text("""
+        CREATE TABLE catalog (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            imdb_id TEXT UNIQUE,
+            title TEXT NOT NULL,
+            title_key TEXT NOT NULL,
+            year INTEGER,
+            imdb_rating REAL,
+            poster TEXT
+        )
+    """))
+    connection.execute(text("CREATE INDEX idx_catalog_title_key ON catalog(title_key, year)"))
+    # one row per distinct film: the first copy's title and any real poster URL. The old
+    # ratings are the users' own, so the IMDb rating waits for OMDb like the IMDb ID.
+    connection.execute(text("""
+        INSERT INTO catalog (title, title_key, year, poster)
+        SELECT m.title, m.title_key, m.year, first.poster
+        FROM (
+            SELECT MIN(id) AS id, MAX(NULLIF(NULLIF(poster, ''), 'N/A')) AS poster
+            FROM movies GROUP BY title_key, year
+        ) first JOIN movies m ON m.id = first.id
+        ORDER BY m.id
+    """))
+    connection.execute(text("""
+        CREATE TABLE user_movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            catalog_id INTEGER NOT NULL,
+            user_rating REAL NOT NULL,
+            title_key TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(catalog_id) REFERENCES catalog(id),
+            UNIQUE(user_id, catalog_id)
+        )
+    """))
+    connection.execute(text("""
+        INSERT INTO user_movies (id, user_id, catalog_id, user_rating, title_key)
+        SELECT m.id, m.user_id, c.id, m.rating, m.title_key
+        FROM movies m JOIN catalog c ON c.title_key = m.title_key AND c.year IS m.year
+    """))
+    connection.execute(text("DROP TABLE IF EXISTS movies_fts"))
+    connection.execute(text("DROP TABLE movies"))
+    connection.execute(text("DROP TABLE title_trigrams"))
+    # the lookups, keyset orders and random_movie seeks the old movies indexes served
+    connection.execute(text("CREATE UNIQUE INDEX idx_user_movies_title_key ON user_movies(user_id, title_key)"))
+    connection.execute(text("CREATE INDEX idx_user_movies_rating ON user_movies(user_id, user_rating DESC, title_key)"))
+    connection.execute(text("CREATE INDEX idx_user_movies_user_id ON user_movies(user_id)"))
+    connection.execute(text("""
+        CREATE VIEW movies AS
+        SELECT um.id, c.title, um.title_key, c.year, um.user_rating AS rating, c.poster, um.user_id, um.catalog_id
+        FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+    """))
+    connection.execute(text("""
+        CREATE TABLE title_trigrams (
+            trigram TEXT NOT NULL,
+            catalog_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, catalog_id)
+        ) WITHOUT ROWID
+    """))
+    _index_titles(connection, connection.execute(text("SELECT id, title FROM catalog")).fetchall())
+    _create_catalog_fts(connection)
+
+
+def _migration_item_neighbors(connection):
+    """Add the item-item neighbor cache and the log of ratings changed since it was last refreshed.
+
+    Triggers on user_movies log every rating change, so the recommendations
+    module only recomputes the films whose ratings moved. The log starts
+    with every rated film, which makes the first refresh a full build.
+    """
+    connection.execute(text("""
+        CREATE TABLE item_neighbors (
+            catalog_id INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL,
+            similarity REAL NOT NULL,
+            PRIMARY KEY (catalog_id, neighbor_id)
+        ) WITHOUT ROWID
+    """))
+    connection.execute(text("CREATE INDEX idx_item_neighbors_neighbor ON item_neighbors(neighbor_id)"))
+    connection.execute(text("""
+        CREATE TABLE changed_ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            catalog_id INTEGER NOT NULL
+        )
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER changed_ratings_insert AFTER INSERT ON user_movies BEGIN
+            INSERT INTO changed_ratings (catalog_id) VALUES (new.catalog_id);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER changed_ratings_delete AFTER DELETE ON user_movies BEGIN
+            INSERT INTO changed_ratings (catalog_id) VALUES (old.catalog_id);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER changed_ratings_update AFTER UPDATE OF user_rating ON user_movies BEGIN
+            INSERT INTO changed_ratings (catalog_id) VALUES (new.catalog_id);
+        END
+    """))
+    connection.execute(text("INSERT INTO changed_ratings (catalog_id) SELECT DISTINCT catalog_id FROM user_movies"))
+
+
+def _fill_analytics(connection):
+    """Recompute title_stats and year_stats from user_movies in one grouped pass each."""
+    connection.execute(text("DELETE FROM title_stats"))
+    connection.execute(text("DELETE FROM year_stats"))
+    connection.execute(text("""
+        INSERT INTO title_stats (catalog_id, owners, rating_sum, average)
+        SELECT catalog_id, COUNT(*), SUM(user_rating), AVG(user_rating) FROM user_movies GROUP BY catalog_id
+    """))
+    connection.execute(text("""
+        INSERT INTO year_stats (year, movies, rating_sum)
+        SELECT COALESCE(c.year, 0), COUNT(*), SUM(um.user_rating)
+        FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+        GROUP BY COALESCE(c.year, 0)
+    """))
+
+
+def _migration_analytics(connection):
+    """Add cross-user aggregates per film (title_stats) and per release year (year_stats).
+
+    Triggers on user_movies keep them current on every add, delete and
+    rating change, so global leaderboards are one indexed read however
+    many users there are. Year 0 stands for an unknown year.
+    """
+    connection.execute(text("""
+        CREATE TABLE title_stats (
+            catalog_id INTEGER PRIMARY KEY,
+            owners INTEGER NOT NULL,
+            rating_sum REAL NOT NULL,
+            average REAL NOT NULL,
+            FOREIGN KEY(catalog_id) REFERENCES catalog(id)
+        )
+    """))
+    connection.execute(text("CREATE INDEX idx_title_stats_owners ON title_stats(owners DESC, average DESC)"))
+    connection.execute(text("CREATE INDEX idx_title_stats_average ON title_stats(average DESC, owners DESC)"))
+    connection.execute(text("""
+        CREATE TABLE year_stats (
+            year INTEGER PRIMARY KEY,
+            movies INTEGER NOT NULL,
+            rating_sum REAL NOT NULL
+        )
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER analytics_insert AFTER INSERT ON user_movies BEGIN
+            INSERT INTO title_stats (catalog_id, owners, rating_sum, average)
+            VALUES (new.catalog_id, 1, new.user_rating, new.user_rating)
+            ON CONFLICT(catalog_id) DO UPDATE SET
+                owners = owners + 1,
+                rating_sum = rating_sum + excluded.rating_sum,
+                average = (rating_sum + excluded.rating_sum) / (owners + 1);
+            INSERT INTO year_stats (year, movies, rating_sum)
+            SELECT COALESCE(year, 0), 1, new.user_rating FROM catalog WHERE id = new.catalog_id
+            ON CONFLICT(year) DO UPDATE SET
+                movies = movies + 1,
+                rating_sum = rating_sum + excluded.rating_sum;
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER analytics_delete AFTER DELETE ON user_movies BEGIN
+            UPDATE title_stats SET
+                owners = owners - 1,
+                rating_sum = rating_sum - old.user_rating,
+                average = CASE WHEN owners > 1 THEN (rating_sum - old.user_rating) / (owners - 1) ELSE 0 END
+            WHERE catalog_id = old.catalog_id;
+            DELETE FROM title_stats WHERE catalog_id = old.catalog_id AND owners = 0;
+            UPDATE year_stats SET movies = movies - 1, rating_sum = rating_sum - old.user_rating
+            WHERE year = (SELECT COALESCE(year, 0) FROM catalog WHERE id = old.catalog_id);
+            DELETE FROM year_stats WHERE year = (SELECT COALESCE(year, 0) FROM catalog WHERE id = old.catalog_id)
+                AND movies = 0;
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER analytics_update AFTER UPDATE OF user_rating ON user_movies BEGIN
+            UPDATE title_stats SET
+                rating_sum = rating_sum + new.user_rating - old.user_rating,
+                average = (rating_sum + new.user_rating - old.user_rating) / owners
+            WHERE catalog_id = new.catalog_id;
+            UPDATE year_stats SET rating_sum = rating_sum + new.user_rating - old.user_rating
+            WHERE year = (SELECT COALESCE(year, 0) FROM catalog WHERE id = new.catalog_id);
+        END
+    """))
+    _fill_analytics(connection)
+
+
+def _migration_clear_imdb_ratings(connection):
+    """Forget the catalog's IMDb ratings, which earlier versions copied from users' own ratings.
+
+    They cannot be told apart from real OMDb ratings, so each film gets its
+    rating back from OMDb (or the OMDb cache) the next time it is added.
+    """
+    connection.execute(text("UPDATE catalog SET imdb_rating = NULL"))
+
+
+# Migration N brings a database from user_version N-1 to N
+MIGRATIONS = [_migration_user_stats, _migration_title_trigrams, _migration_movies_fts, _migration_keyset_indexes,
+              _migration_user_id_index, _migration_title_key, _migration_collection_version, _migration_catalog,
+              _migration_item_neighbors, _migration_analytics, _migration_clear_imdb_ratings]
+
+
+def migrate(connection):
+    """Apply any migrations the database has not seen yet.
+
+    Each migration and its user_version bump commit together, so a failed
+    step leaves the database at the previous version, ready to retry it.
+    `connection` must be in AUTOCOMMIT mode, see init_db().
+    """
+    def apply(step, version):
+        # another process may have applied it while this one waited for the lock
+        if connection.execute(text("PRAGMA user_version")).scalar() == version - 1:
+            step(connection)
+            connection.execute(text(f"PRAGMA user_version = {version}"))
 
+    current = connection.execute(text("PRAGMA user_version")).scalar()
+    for version, step in enumerate(MIGRATIONS[current:SCHEMA_VERSION], start=current + 1):
+        _in_transaction(connection, lambda _: apply(step, version))
 
+
+def _index_titles(connection, films):
+    """Add (catalog id, title) pairs to the trigram index in one executemany."""
+    rows = [{"trigram": gram, "catalog_id": catalog_id} for catalog_id, title in films for gram in trigrams(title)]
+    if rows:
+        connection.execute(
+            text("INSERT OR IGNORE INTO title_trigrams (trigram, catalog_id) VALUES (:trigram, :catalog_id)"), rows)
+
+
+# Statements of the write paths, built once and reused by every call and batch
+_UPSERT_USER_STATS = text("""
+    INSERT INTO user_stats (user_id, movie_count, rating_sum, version) VALUES (:user_id, :count, :rating_sum, 1)
+    ON CONFLICT(user_id) DO UPDATE SET
+        movie_count = movie_count + excluded.movie_count,
+        rating_sum = rating_sum + excluded.rating_sum,
+        version = version + 1
+""")
+# MIN/MAX on (user_id, user_rating) are single index seeks
+_REFRESH_RATING_RANGE = text("""
+    UPDATE user_stats SET
+        min_rating = (SELECT MIN(user_rating) FROM user_movies WHERE user_id = :user_id),
+        max_rating = (SELECT MAX(user_rating) FROM user_movies WHERE user_id = :user_id)
+    WHERE user_id = :user_id
+""")
+_FIND_USER_MOVIE = text("SELECT id, user_rating FROM user_movies WHERE user_id = :user_id AND title_key = :title_key")
+_DELETE_USER_MOVIE = text("DELETE FROM user_movies WHERE id = :id")
+_UPDATE_USER_RATING = text("UPDATE user_movies SET user_rating = :rating WHERE id = :id")
+_INSERT_USER = text("INSERT INTO users (username) VALUES (:username) ON CONFLICT(username) DO NOTHING")
+
+
+def _update_user_stats(connection, user_id, count_delta, rating_delta):
+    """Apply a count/sum change to user_stats, bump the collection version and refresh min/max.
+
+    The deltas come from rows read earlier in the same transaction, so they
+    are only exact because _write takes the write lock (BEGIN IMMEDIATE)
+    before those reads; call this only from inside _write.
+    """
+    connection.execute(_UPSERT_USER_STATS, {"user_id": user_id, "count": count_delta, "rating_sum": rating_delta})
+    connection.execute(_REFRESH_RATING_RANGE, {"user_id": user_id})
+
+
+@timed
 def list_movies(user_id):
     """Retrieve all movies from the database."""
     try:
-        with engine.connect() as connection:
-            result = connection.execute(text("SELECT title, year, rating, poster FROM movies WHERE user_id =:user_id"),{ "user_id": user_id})
+        with get_engine().connect() as connection:
+            result = connection.execute(text("""
+                SELECT c.title, c.year, um.user_rating AS rating, c.poster, p.thumbnail_path
+                FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+                LEFT JOIN poster_mirror p ON p.url = c.poster
+                WHERE um.user_id = :user_id
+            """),{ "user_id": user_id})
             movies = result.fetchall()
             if not movies:
                 print('No movies found in database')
@@ -51,6 +628,7 @@ def list_movies(user_id):
                 "year": row.year,
                 "rating": row.rating,
                 "poster": row.poster,
+                "thumbnail": row.thumbnail_path,
             }
             for row in movies
 
@@ -61,82 +639,849 @@ def list_movies(user_id):
 
 
 
-def add_movie(title:str, year:int, rating:float,poster:str, user_id:int):
-    """Add a new movie to the database."""
-    title = title.strip()            # remove leading/trailing spaces
-    title = title.casefold().title() # normalize casing
-    poster = None if poster == "N/A" else poster  # handle missing posters
-    with engine.connect() as connection:
+# Keyset queries: the first page, then every page after the last row seen
+_PAGE_QUERIES = {
+    'title': (
+        "um.user_id = :user_id",
+        "um.user_id = :user_id AND um.title_key > :title_key",
+        "um.title_key",
+    ),
+    'rating': (
+        "um.user_id = :user_id",
+        "um.user_id = :user_id AND (um.user_rating < :rating OR (um.user_rating = :rating AND um.title_key > :title_key))",
+        "um.user_rating DESC, um.title_key",
+    ),
+}
+
+_MOVIE_COLUMNS = """
+    SELECT c.title, c.year, um.user_rating AS rating, c.poster, p.thumbnail_path
+    FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+    LEFT JOIN poster_mirror p ON p.url = c.poster
+"""
+
+
+def _movie_info(row):
+    """Return the info dict of a movie row, as used by list_movies."""
+    return {
+        "year": row.year,
+        "rating": row.rating,
+        "poster": row.poster,
+        "thumbnail": row.thumbnail_path,
+    }
+
+
+def _movie_page(user_id, order_by, limit, after=None):
+    """Return one keyset page of (title, info) pairs, starting after the (rating, title) row `after`."""
+    first_where, next_where, order = _PAGE_QUERIES[order_by]
+    params = {"user_id": user_id, "limit": limit}
+    if after is None:
+        where = first_where
+    else:
+        where = next_where
+        rating, title = after
+        params["rating"], params["title_key"] = rating, normalize(title)
+    statement = text(f"{_MOVIE_COLUMNS} WHERE {where} ORDER BY {order} LIMIT :limit")
+    with get_engine().connect() as connection:
+        rows = connection.execute(statement, params).fetchall()
+    return [(row.title, _movie_info(row)) for row in rows]
+
+
+def iter_movies(user_id, order_by='title', chunk_size=500):
+    """Yield (title, info) for a user's movies, ordered by 'title' or by 'rating' (best first).
+
+    Rows are fetched `chunk_size` at a time with keyset pagination on the
+    (user_id, title_key) / (user_id, user_rating, title_key) indexes, so
+    memory use does not grow with the collection.
+    """
+    after = None
+    while True:
         try:
-            connection.execute(text("INSERT INTO movies (title, year, rating, poster,user_id) VALUES (:title, :year, :rating, :poster, :user_id)"),
-                                   {"title": title, "year": year, "rating": rating,"poster":poster,"user_id":user_id})
-            connection.commit()
-            print(f"Movie '{title}' added successfully.")
-            return True
-        except IntegrityError:
-            print(f" Movie '{title}' already exists.")
-            return False
+            page = _movie_page(user_id, order_by, chunk_size, after)
         except SQLAlchemyError as e:
-            print(f" Error adding movie: {e}")
-            return False
+            print(f"Database error {e}")
+            return
+        yield from page
+        if len(page) < chunk_size:
+            return
+        title, info = page[-1]
+        after = (info["rating"], title)
+
+
+@timed
+def load_collection(user_id):
+    """Return the user's titles, years and ratings as a MovieCollection, read in one pass in title order."""
+    try:
+        with get_engine().connect() as connection:
+            rows = connection.execute(text("""
+                SELECT um.title_key, c.title, c.year, um.user_rating
+                FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+                WHERE um.user_id = :user_id
+                ORDER BY um.title_key
+            """), {"user_id": user_id})
+            return MovieCollection.from_rows(rows)
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return MovieCollection()
+
+
+def movie_page(user_id, order_by, limit, after=None):
+    """Return up to `limit` (title, info) pairs ordered by 'title' or by 'rating' (best first).
+
+    Pass the (rating, title) of the last row received as `after` to get the
+    next page; each page is one seek on the matching keyset index.
+    """
+    try:
+        return _movie_page(user_id, order_by, limit, after)
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return []
+
+
+def top_movies(user_id, k):
+    """Return the k best rated movies as (title, info) pairs, best first.
+
+    The first page of movie_page(user_id, 'rating', k): one O(k) seek on the
+    (user_id, user_rating DESC, title_key) index.
+    """
+    return movie_page(user_id, 'rating', k)
+
+
+def bottom_movies(user_id, k):
+    """Return the k worst rated movies as (title, info) pairs, worst first.
+
+    Ties come in reverse title order: that is the index order read backwards,
+    which keeps this an O(k) scan with no sort.
+    """
+    try:
+        with get_engine().connect() as connection:
+            rows = connection.execute(
+                text(f"{_MOVIE_COLUMNS} WHERE um.user_id = :user_id ORDER BY um.user_rating, um.title_key DESC LIMIT :k"),
+                {"user_id": user_id, "k": k}).fetchall()
+        return [(row.title, _movie_info(row)) for row in rows]
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return []
+
+
+def get_movie(title, user_id):
+    """Return the user's (title, info) pair for a title, named and dated as in the catalog, or None."""
+    try:
+        with get_engine().connect() as connection:
+            row = connection.execute(text(f"{_MOVIE_COLUMNS} WHERE um.user_id = :user_id AND um.title_key = :title_key"),
+                                     {"user_id": user_id, "title_key": normalize(clean_title(title))}).fetchone()
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return None
+    if row is None:
+        return None
+    return row.title, _movie_info(row)
+
+
+@timed
+def random_movie(user_id):
+    """Return a random (title, info) pair from a user's collection, or None if it is empty.
+
+    Every movie is equally likely. Ids are drawn uniformly between the
+    user's lowest and highest user_movies id and looked up by primary key,
+    keeping the first draw that is one of the user's movies (rejection
+    sampling, O(log n) per draw). Ids are shared by all users, so a sparse
+    collection can miss every draw; it then falls back to skipping a random
+    count of entries on the (user_id) index, which is O(n) in the user's
+    movie count.
+    """
+    try:
+        with get_engine().connect() as connection:
+            low, high = connection.execute(text("""
+                SELECT (SELECT MIN(id) FROM user_movies WHERE user_id = :user_id),
+                       (SELECT MAX(id) FROM user_movies WHERE user_id = :user_id)
+            """), {"user_id": user_id}).fetchone()
+            if low is None:
+                return None
+            movie_id = None
+            for _ in range(RANDOM_PICK_ROUNDS):
+                ids = [random.randint(low, high) for _ in range(RANDOM_PICK_DRAWS)]
+                hits = set(connection.execute(
+                    text("SELECT id FROM user_movies WHERE id IN :ids AND user_id = :user_id")
+                    .bindparams(bindparam("ids", expanding=True)), {"ids": ids, "user_id": user_id}).scalars())
+                if hits:
+                    # the first hit in draw order is uniform over the user's movies
+                    movie_id = next(drawn for drawn in ids if drawn in hits)
+                    break
+            if movie_id is None:
+                count = connection.execute(text("SELECT movie_count FROM user_stats WHERE user_id = :user_id"),
+                                           {"user_id": user_id}).scalar()
+                if not count:
+                    return None
+                movie_id = connection.execute(text("""
+                    SELECT id FROM user_movies INDEXED BY idx_user_movies_user_id
+                    WHERE user_id = :user_id ORDER BY id LIMIT 1 OFFSET :offset
+                """), {"user_id": user_id, "offset": random.randrange(count)}).scalar()
+            row = connection.execute(text(f"{_MOVIE_COLUMNS} WHERE um.id = :id"), {"id": movie_id}).fetchone()
+        if row is None:  # the movie was deleted since its id was picked
+            return None
+        return row.title, _movie_info(row)
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return None
+
+
+def count_movies(user_id):
+    """Return how many movies a user has, from the user_stats summary row."""
+    try:
+        with get_engine().connect() as connection:
+            count = connection.execute(text("SELECT movie_count FROM user_stats WHERE user_id = :user_id"),
+                                       {"user_id": user_id}).scalar()
+        return count or 0
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return 0
+
+
+def get_version(user_id):
+    """Return the user's collection version, which every add/delete/update increments."""
+    try:
+        with get_engine().connect() as connection:
+            version = connection.execute(text("SELECT version FROM user_stats WHERE user_id = :user_id"),
+                                         {"user_id": user_id}).scalar()
+        return version or 0
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return None
+
+
+def clean_title(title:str):
+    """Return the title the way it is displayed.
+
+    Lookups match on normalize(title), stored in the indexed title_key
+    column, so every operation uses the same case/space-insensitive rule.
+    """
+    title = title.strip()            # remove leading/trailing spaces
+    return title.casefold().title()  # normalize casing
+
+
+def _clean_poster(poster):
+    """Return None for the ways a missing poster is spelled ('N/A' from OMDb, '' from legacy data)."""
+    return None if poster in (None, '', 'N/A') else poster
+
+
+_CATALOG_MATCHES = text("""
+    SELECT id, title, title_key, year, imdb_id, imdb_rating FROM catalog
+    WHERE title_key IN :title_keys OR imdb_id IN :imdb_ids
+    ORDER BY id
+""").bindparams(bindparam("title_keys", expanding=True), bindparam("imdb_ids", expanding=True))
+
+
+_INSERT_CATALOG = text("""
+    INSERT INTO catalog (imdb_id, title, title_key, year, imdb_rating, poster)
+    VALUES (:imdb_id, :title, :title_key, :year, :imdb_rating, :poster)
+""")
+
+
+def _add_to_catalog(connection, films):
+    """Insert new films into the catalog and the trigram index, setting each film's id.
+
+    The rows go in with one executemany. _write holds the write lock, so
+    they get ascending ids above the largest one before, in insert order.
+    """
+    before = connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM catalog")).scalar()
+    connection.execute(_INSERT_CATALOG, films)
+    ids = connection.execute(text("SELECT id FROM catalog WHERE id > :before ORDER BY id"),
+                             {"before": before}).scalars().all()
+    for film, catalog_id in zip(films, ids):
+        film["id"] = catalog_id
+    _index_titles(connection, [(film["id"], film["title"]) for film in films])
+
+
+def _resolve_catalog(connection, movies, chunk_size):
+    """Point each movie dict at its catalog row, adding the films the catalog does not have yet.
+
+    A film matches on its IMDb ID, else on title and year; a match without
+    an IMDb ID or rating adopts the movie's. Each movie gets the row's catalog_id,
+    title and title_key, so a user's copy is always named like the catalog.
+    The films a chunk adds are inserted together once the chunk is matched;
+    movies of the chunk naming the same new film share its row.
+    """
+    by_imdb_id = {}
+    by_title = {}  # (title_key, year) -> the oldest such row
+    for start in range(0, len(movies), chunk_size):
+        chunk = movies[start:start + chunk_size]
+        rows = connection.execute(_CATALOG_MATCHES, {
+            "title_keys": [movie["title_key"] for movie in chunk],
+            "imdb_ids": [movie["imdb_id"] for movie in chunk if movie["imdb_id"]],
+        })
+        for row in rows:
+            film = {"id": row.id, "title": row.title, "title_key": row.title_key, "imdb_id": row.imdb_id,
+                    "imdb_rating": row.imdb_rating}
+            if row.imdb_id:
+                by_imdb_id[row.imdb_id] = film
+            by_title.setdefault((row.title_key, row.year), film)
+        new_films = []
+        films = []
+        for movie in chunk:
+            imdb_id = movie["imdb_id"]
+            film = by_imdb_id.get(imdb_id) if imdb_id else None
+            if film is None:
+                film = by_title.get((movie["title_key"], movie["year"]))
+                if film is not None and imdb_id:
+                    if film["imdb_id"]:
+                        film = None  # same title and year, but a different film
+                    else:
+                        # a film this chunk adds is not inserted yet; it goes in with the ID
+                        if film["id"] is not None:
+                            connection.execute(text("UPDATE catalog SET imdb_id = :imdb_id WHERE id = :id"),
+                                               {"imdb_id": imdb_id, "id": film["id"]})
+                        film["imdb_id"] = imdb_id
+                        by_imdb_id[imdb_id] = film
+            if film is not None and film["imdb_rating"] is None and movie["imdb_rating"] is not None:
+                if film["id"] is not None:
+                    connection.execute(text("UPDATE catalog SET imdb_rating = :imdb_rating WHERE id = :id"),
+                                       {"imdb_rating": movie["imdb_rating"], "id": film["id"]})
+                film["imdb_rating"] = movie["imdb_rating"]
+            if film is None:
+                film = {"id": None, "title": movie["title"], "title_key": movie["title_key"], "year": movie["year"],
+                        "imdb_id": imdb_id, "imdb_rating": movie["imdb_rating"], "poster": movie["poster"]}
+                new_films.append(film)
+                if imdb_id:
+                    by_imdb_id[imdb_id] = film
+                by_title.setdefault((movie["title_key"], movie["year"]), film)
+            films.append(film)
+        if new_films:
+            _add_to_catalog(connection, new_films)
+        for movie, film in zip(chunk, films):
+            movie["catalog_id"], movie["title"], movie["title_key"] = film["id"], film["title"], film["title_key"]
+
+
+def _movie_row(title, year, rating, poster, imdb_id=None, imdb_rating=None):
+    """Return the dict the catalog and user_movies inserts take.
+
+    rating is the user's own; imdb_rating only ever comes from OMDb.
+    """
+    title = clean_title(title)
+    return {"title": title, "title_key": normalize(title), "year": year, "rating": rating,
+            "poster": _clean_poster(poster), "imdb_id": imdb_id or None, "imdb_rating": imdb_rating}
+
+
+_INSERT_USER_MOVIE = text("""
+    INSERT INTO user_movies (user_id, catalog_id, user_rating, title_key)
+    VALUES (:user_id, :catalog_id, :rating, :title_key)
+""")
+
+
+def _insert_movie(connection, title, year, rating, poster, user_id, imdb_id=None, imdb_rating=None):
+    movie = _movie_row(title, year, rating, poster, imdb_id, imdb_rating)
+    _resolve_catalog(connection, [movie], 1)
+    # a film the user already has violates idx_user_movies_title_key
+    connection.execute(_INSERT_USER_MOVIE, {**movie, "user_id": user_id})
+    _update_user_stats(connection, user_id, 1, rating)
+
+
+def add_movie(title:str, year:int, rating:float,poster:str, user_id:int, imdb_id:str=None, imdb_rating:float=None):
+    """Add a movie to a user's collection, and to the shared catalog if it is new there.
+
+    Pass the OMDb data as imdb_id and imdb_rating; `rating` is the user's own.
+    """
+    title = clean_title(title)
+    try:
+        _write(lambda connection: _insert_movie(connection, title, year, rating, poster, user_id, imdb_id, imdb_rating))
+        print(f"Movie '{title}' added successfully.")
+        return True
+    except IntegrityError:
+        print(f" Movie '{title}' already exists.")
+        return False
+    except SQLAlchemyError as e:
+        print(f" Error adding movie: {e}")
+        return False
+
+
+def _insert_movies(connection, movies, user_id, chunk_size):
+    """Insert the movies whose film the user does not have yet; return (added, duplicates)."""
+    _resolve_catalog(connection, movies, chunk_size)
+    new_movies = {}
+    duplicates = []
+    for movie in movies:
+        if movie["title_key"] in new_movies:
+            duplicates.append(movie["title"])
+        else:
+            new_movies[movie["title_key"]] = movie
+    existing_titles = text("SELECT title_key FROM user_movies WHERE user_id = :user_id AND title_key IN :title_keys") \
+        .bindparams(bindparam("title_keys", expanding=True))
+    title_keys = list(new_movies)
+    for start in range(0, len(title_keys), chunk_size):
+        chunk = title_keys[start:start + chunk_size]
+        for title_key in connection.execute(existing_titles, {"user_id": user_id, "title_keys": chunk}).scalars():
+            duplicates.append(new_movies.pop(title_key)["title"])
+    if new_movies:
+        rows = list(new_movies.values())
+        connection.execute(_INSERT_USER_MOVIE, [{**row, "user_id": user_id} for row in rows])
+        _update_user_stats(connection, user_id, len(rows), sum(row["rating"] for row in rows))
+    return [movie["title"] for movie in new_movies.values()], duplicates
+
+
+def add_movies(movies:list, user_id:int, chunk_size:int=500):
+    """Add many movies (dicts with title/year/rating/poster and optionally imdb_id/imdb_rating) in one transaction.
+
+    Returns (added, duplicates) as lists of titles. Titles already in the
+    collection, or repeated in `movies`, are reported as duplicates.
+    """
+    rows = [_movie_row(movie['title'], movie['year'], movie['rating'], movie['poster'], movie.get('imdb_id'),
+                       movie.get('imdb_rating'))
+            for movie in movies]
+    try:
+        # a retried transaction starts again from fresh rows
+        return _write(lambda connection: _insert_movies(connection, [dict(row) for row in rows], user_id, chunk_size))
+    except SQLAlchemyError as e:
+        print(f"Error adding movies: {e}")
+        return [], []
+
+
+@timed
+def find_catalog_movie(title:str):
+    """Return a film already in the shared catalog as fetch_movie() would, or None.
+
+    Lets callers skip the OMDb request for titles someone has added before.
+    Films the catalog has no OMDb rating for are a miss.
+    """
+    try:
+        with get_engine().connect() as connection:
+            row = connection.execute(text("""
+                SELECT title, year, imdb_rating, poster, imdb_id FROM catalog
+                WHERE title_key = :title_key AND imdb_rating IS NOT NULL
+                ORDER BY imdb_id IS NULL, id
+                LIMIT 1
+            """), {"title_key": normalize(clean_title(title))}).fetchone()
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return None
+    if row is None:
+        return None
+    return {'title': row.title, 'year': row.year, 'rating': row.imdb_rating,
+            'poster': row.poster or 'N/A', 'imdb_id': row.imdb_id}
+
+
+def _remove_user_movie(connection, title, user_id):
+    """Delete a user's movie row and return its rating, or None if the user has no such movie."""
+    movie = connection.execute(_FIND_USER_MOVIE, {"title_key": normalize(title), "user_id": user_id}).fetchone()
+    if movie is None:
+        return None
+    connection.execute(_DELETE_USER_MOVIE, {"id": movie.id})
+    return movie.user_rating
+
+
+def _delete_movie(connection, title, user_id):
+    """Remove a movie from a user's collection; return False if the user has no such movie.
+
+    The catalog row stays, for other users and for skipping OMDb next time.
+    """
+    rating = _remove_user_movie(connection, title, user_id)
+    if rating is None:
+        return False
+    _update_user_stats(connection, user_id, -1, -rating)
+    return True
 
 
 def delete_movie(title:str,user_id:int):
     """Delete a movie from the database."""
-    with engine.connect() as connection:
-        try:
-            result =connection.execute(
-                text("DELETE FROM movies WHERE lower(trim(title)) = lower(:title) AND user_id = :user_id"),{"title":title,'user_id':user_id})
-            connection.commit()
-            if result.rowcount == 0:
-                print(f"Movie '{title}' not found.")
-                return False
-            print(f"Movie '{title}' deleted successfully. ")
-            return True
-        except SQLAlchemyError as e:
-            print(f"Error deleting movie: {e}")
+    try:
+        if not _write(lambda connection: _delete_movie(connection, title, user_id)):
+            print(f"Movie '{title}' not found.")
             return False
+        print(f"Movie '{title}' deleted successfully. ")
+        return True
+    except SQLAlchemyError as e:
+        print(f"Error deleting movie: {e}")
+        return False
+
+
+def _set_user_rating(connection, title, rating, user_id):
+    """Change a user's rating of a movie and return the old one, or None if the user has no such movie."""
+    movie = connection.execute(_FIND_USER_MOVIE, {'title_key': normalize(title), 'user_id': user_id}).fetchone()
+    if movie is None:
+        return None
+    connection.execute(_UPDATE_USER_RATING, {'rating': rating, 'id': movie.id})
+    return movie.user_rating
+
+
+def _update_movie(connection, title, rating, user_id):
+    """Set a user's rating of a movie; return False if the user has no such movie."""
+    old_rating = _set_user_rating(connection, title, rating, user_id)
+    if old_rating is None:
+        return False
+    _update_user_stats(connection, user_id, 0, rating - old_rating)
+    return True
 
 
 def update_movie(title:str, rating:float, user_id:int):
     """Update a movie's rating in the database."""
     try:
-        with engine.connect() as connection:
-            result = connection.execute(text("UPDATE movies SET rating = :rating WHERE title = :title AND user_id = :user_id"),
-                                        {'rating': rating, 'title': title, 'user_id':user_id})
-            connection.commit()
-            if result.rowcount == 0:
-                print(f"Movie '{title}' not found")
-                return False
-            print(f"Movie '{title}' updated successfully.")
-            return True
+        if not _write(lambda connection: _update_movie(connection, title, rating, user_id)):
+            print(f"Movie '{title}' not found")
+            return False
+        print(f"Movie '{title}' updated successfully.")
+        return True
 
     except SQLAlchemyError as e :
         print(f"Error updating movie {e}")
         return False
 
+
+def _insert_user(connection, username):
+    """Add a user; return False if the username is taken."""
+    return connection.execute(_INSERT_USER, {"username": username}).rowcount == 1
+
+
+def _apply_batch(connection, items, chunk_size):
+    """Apply queued writes in order and return their results.
+
+    Consecutive additions to one user's collection go through _insert_movies
+    together; consecutive deletes or updates run row by row and then
+    update user_stats once for the whole run.
+    """
+    results = []
+    for (operation, user_id), run in itertools.groupby(items, key=lambda item: item[:2]):
+        run = [argument for _, _, argument in run]
+        if operation == 'add_movie':
+            rows = [dict(row) for row in run]  # a retried transaction starts again from fresh rows
+            added = {normalize(title) for title in _insert_movies(connection, rows, user_id, chunk_size)[0]}
+            for row in rows:
+                # the first of several rows for one film is the one that was added
+                results.append(row["title_key"] in added)
+                added.discard(row["title_key"])
+        elif operation == 'delete_movie':
+            removed = [_remove_user_movie(connection, title, user_id) for title in run]
+            results.extend(rating is not None for rating in removed)
+            removed = [rating for rating in removed if rating is not None]
+            if removed:
+                _update_user_stats(connection, user_id, -len(removed), -sum(removed))
+        elif operation == 'update_movie':
+            delta = 0.0
+            for title, rating in run:
+                old_rating = _set_user_rating(connection, title, rating, user_id)
+                results.append(old_rating is not None)
+                if old_rating is not None:
+                    delta += rating - old_rating
+            if any(results[-len(run):]):
+                _update_user_stats(connection, user_id, 0, delta)
+        else:
+            results.extend(_insert_user(connection, username) for username in run)
+    return results
+
+
+def _apply_each(connection, items, chunk_size):
+    """Apply queued writes one by one, each in a savepoint; return (results, errors).
+
+    A write the database rejects is rolled back alone: its result is None
+    and (its position, the error) is listed in errors. The savepoints nest
+    in the BEGIN IMMEDIATE transaction _write opened, so releasing one
+    commits nothing and a lock error retries the pass from a clean state.
+    """
+    results = []
+    errors = []
+    for position, item in enumerate(items):
+        try:
+            with connection.begin_nested():
+                results.extend(_apply_batch(connection, [item], chunk_size))
+        except SQLAlchemyError as e:
+            if isinstance(e, OperationalError) and _is_locked(e):
+                raise  # _write retries the whole pass
+            results.append(None)
+            errors.append((position, e))
+    return results, errors
+
+
+class WriteBatch:
+    """Writes queued in memory and committed together by flush().
+
+    One transaction covers the whole batch instead of one per call. Each
+    queued write gets the result the single-call function would return:
+    False for a movie the user already has (add_movie), a movie the user
+    does not have (delete_movie, update_movie) or a taken username (add_user).
+    A write the database rejects (a constraint error, say) gets None instead,
+    and its position in `results` and the error are added to `errors`.
+    """
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.results = []  # of every flush so far, in queue order
+        self.errors = []  # (position in results, error) of the writes that failed
+        self._items = []
+
+    def __len__(self):
+        return len(self._items)
+
+    def add_movie(self, title, year, rating, poster, user_id, imdb_id=None, imdb_rating=None):
+        self._items.append(('add_movie', user_id, _movie_row(title, year, rating, poster, imdb_id, imdb_rating)))
+
+    def delete_movie(self, title, user_id):
+        self._items.append(('delete_movie', user_id, title))
+
+    def update_movie(self, title, rating, user_id):
+        self._items.append(('update_movie', user_id, (title, rating)))
+
+    def add_user(self, username):
+        self._items.append(('add_user', None, username))
+
+    def flush(self):
+        """Commit the queued writes in one transaction and return their results.
+
+        If that transaction fails, the writes are applied again one by one in
+        savepoints, so the failing ones are found and the others still commit.
+        """
+        items, self._items = self._items, []
+        if not items:
+            return []
+        errors = []
+        try:
+            results = _write(lambda connection: _apply_batch(connection, items, self.chunk_size))
+        except SQLAlchemyError:
+            try:
+                results, errors = _write(lambda connection: _apply_each(connection, items, self.chunk_size))
+            except SQLAlchemyError as e:
+                results, errors = [None] * len(items), [(position, e) for position in range(len(items))]
+        for position, error in errors:
+            print(f"Error writing batch item {position}: {error}")
+        self.errors.extend((len(self.results) + position, error) for position, error in errors)
+        self.results.extend(results)
+        return results
+
+
+def begin_batch(chunk_size:int=500):
+    """Return an empty WriteBatch; queue writes on it and call flush() to commit them."""
+    return WriteBatch(chunk_size)
+
+
+@contextlib.contextmanager
+def batch(chunk_size:int=500):
+    """Queue writes on the yielded WriteBatch and commit them together when the block ends.
+
+    Writes still queued when the block raises are dropped; results are in
+    the batch's `results` afterwards.
+    """
+    writes = begin_batch(chunk_size)
+    yield writes
+    writes.flush()
+
+@timed
+def get_stats(user_id:int):
+    """Return rating statistics for a user's collection, or None if it is empty.
+
+    Average, min and max come from the user_stats summary row; the median and
+    the best/worst titles are read through the (user_id, user_rating) index, so the
+    cost does not depend on walking the whole collection in Python.
+    """
+    try:
+        with get_engine().connect() as connection:
+            summary = connection.execute(
+                text("SELECT movie_count, rating_sum, min_rating, max_rating FROM user_stats WHERE user_id = :user_id"),
+                {"user_id": user_id}).fetchone()
+            if summary is None or summary.movie_count == 0:
+                return None
+            count = summary.movie_count
+            # the middle one (odd) or two (even) ratings in index order
+            middle = connection.execute(
+                text("SELECT user_rating FROM user_movies WHERE user_id = :user_id ORDER BY user_rating LIMIT :limit OFFSET :offset"),
+                {"user_id": user_id, "limit": 2 - count % 2, "offset": (count - 1) // 2}).scalars().all()
+            titles_with_rating = text("""
+                SELECT c.title FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+                WHERE um.user_id = :user_id AND um.user_rating = :rating ORDER BY um.title_key
+            """)
+            best = connection.execute(titles_with_rating, {"user_id": user_id, "rating": summary.max_rating}).scalars().all()
+            worst = connection.execute(titles_with_rating, {"user_id": user_id, "rating": summary.min_rating}).scalars().all()
+        return {
+            "count": count,
+            "average": summary.rating_sum / count,
+            "median": sum(middle) / len(middle),
+            "min": summary.min_rating,
+            "max": summary.max_rating,
+            "best": best,
+            "worst": worst,
+        }
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return None
+
+
+def _has_fts(connection):
+    """Return True if the catalog_fts table exists in this database."""
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'catalog_fts'")).first() is not None
+
+
+@timed
+def search_movies(user_id:int, query:str, limit:int=50):
+    """Return up to `limit` movies whose title contains `query`, best match first.
+
+    Matching, ranking and the limit run inside SQLite on the catalog_fts
+    trigram index, so only the matching rows the user owns come back.
+    catalog_fts covers every user's films, so collections of up to
+    SEARCH_SCAN_MOVIES, and queries shorter than a trigram, scan the user's
+    own rows instead. They are ranked as bm25 ranks a single phrase: more
+    occurrences first, then shorter titles.
+    """
+    try:
+        with get_engine().connect() as connection:
+            movie_count = connection.execute(text("SELECT movie_count FROM user_stats WHERE user_id = :user_id"),
+                                             {"user_id": user_id}).scalar() or 0
+            if len(query) >= 3 and movie_count > SEARCH_SCAN_MOVIES and _has_fts(connection):
+                rows = connection.execute(text("""
+                    SELECT c.title, c.year, um.user_rating AS rating, c.poster
+                    FROM catalog_fts
+                    JOIN user_movies um ON um.catalog_id = catalog_fts.rowid AND um.user_id = :user_id
+                    JOIN catalog c ON c.id = um.catalog_id
+                    WHERE catalog_fts MATCH :query
+                    ORDER BY catalog_fts.rank
+                    LIMIT :limit
+                """), {"query": '"' + query.replace('"', '""') + '"', "user_id": user_id, "limit": limit}).fetchall()
+            else:
+                rows = connection.execute(text("""
+                    SELECT c.title, c.year, um.user_rating AS rating, c.poster
+                    FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+                    WHERE um.user_id = :user_id AND instr(lower(c.title), lower(:query)) > 0
+                    ORDER BY length(replace(lower(c.title), lower(:query), '')) - length(c.title), length(c.title),
+                             um.title_key
+                    LIMIT :limit
+                """), {"query": query, "user_id": user_id, "limit": limit}).fetchall()
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return {}
+    return {
+        row.title: {
+            "year": row.year,
+            "rating": row.rating,
+            "poster": row.poster,
+        }
+        for row in rows
+    }
+
+
+@timed
+def suggest_titles(user_id:int, query:str, limit:int=10):
+    """Return up to `limit` titles close to `query`, best match first.
+
+    Candidates are the user's titles sharing the most trigrams with the query,
+    which are then checked with a banded edit distance that gives up past
+    MAX_SUGGESTION_DISTANCE. Only titles whose length is within that
+    distance can match. A collection of up to SUGGESTION_SCAN_MOVIES is
+    scanned directly. Otherwise candidates come from the catalog-wide
+    title_trigrams: the query's rare trigrams only, and at most
+    SUGGESTION_POSTINGS postings of them.
+    """
+    wanted = normalize(query)
+    grams = trigrams(query)
+    lengths = {"shortest": len(wanted) - MAX_SUGGESTION_DISTANCE, "longest": len(wanted) + MAX_SUGGESTION_DISTANCE}
+    try:
+        with get_engine().connect() as connection:
+            movie_count = connection.execute(text("SELECT movie_count FROM user_stats WHERE user_id = :user_id"),
+                                             {"user_id": user_id}).scalar() or 0
+            if movie_count <= SUGGESTION_SCAN_MOVIES:
+                rows = connection.execute(_USER_TITLES_BY_LENGTH, {"user_id": user_id, **lengths}).fetchall()
+                scored = ((len(grams & trigrams(row.title_key)), row.title_key, row.title) for row in rows)
+                candidates = heapq.nlargest(SUGGESTION_CANDIDATES, (candidate for candidate in scored if candidate[0]),
+                                            key=lambda candidate: candidate[0])
+            else:
+                rare = _rare_trigrams(connection, grams)
+                rows = connection.execute(_TRIGRAM_CANDIDATES, {
+                    "user_id": user_id, "grams": rare, "postings": SUGGESTION_POSTINGS,
+                    "candidates": SUGGESTION_CANDIDATES, **lengths}).fetchall() if rare else []
+                candidates = [(row.shared, row.title_key, row.title) for row in rows]
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return []
+    ranked = []
+    for shared, title_key, title in candidates:
+        distance = bounded_distance(title_key, wanted, MAX_SUGGESTION_DISTANCE)
+        if distance is not None:
+            ranked.append((distance, -shared, title))
+    ranked.sort()
+    return [title for _, _, title in ranked[:limit]]
+
+
+_USER_TITLES_BY_LENGTH = text("""
+    SELECT c.title, um.title_key FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+    WHERE um.user_id = :user_id AND length(um.title_key) BETWEEN :shortest AND :longest
+""")
+
+_TRIGRAM_CANDIDATES = text("""
+    SELECT c.title, um.title_key, COUNT(*) AS shared
+    FROM (SELECT catalog_id FROM title_trigrams WHERE trigram IN :grams LIMIT :postings) t
+    JOIN user_movies um ON um.catalog_id = t.catalog_id AND um.user_id = :user_id
+    JOIN catalog c ON c.id = t.catalog_id
+    WHERE length(um.title_key) BETWEEN :shortest AND :longest
+    GROUP BY t.catalog_id
+    ORDER BY shared DESC
+    LIMIT :candidates
+""").bindparams(bindparam("grams", expanding=True))
+
+# how many titles have a trigram, counting no further than FREQUENT_TRIGRAM_TITLES
+_TRIGRAM_TITLES = text("""
+    SELECT COUNT(*) FROM (SELECT 1 FROM title_trigrams WHERE trigram = :gram LIMIT :cap)
+""")
+
+
+def _rare_trigrams(connection, grams):
+    """Return the grams in fewer than FREQUENT_TRIGRAM_TITLES catalog titles, else the least frequent one."""
+    counts = {gram: connection.execute(_TRIGRAM_TITLES, {"gram": gram, "cap": FREQUENT_TRIGRAM_TITLES}).scalar()
+              for gram in grams}
+    rare = [gram for gram, count in counts.items() if 0 < count < FREQUENT_TRIGRAM_TITLES]
+    if not rare and any(counts.values()):
+        rare = [min((gram for gram in counts if counts[gram]), key=counts.get)]
+    return rare
+
+
+def rebuild_analytics():
+    """Recompute the title_stats and year_stats aggregates from user_movies."""
+    _write(_fill_analytics)
+
+
+def list_unmirrored_posters():
+    """Return the distinct poster URLs that have no local copy yet (NULL and N/A excluded)."""
+    with get_engine().connect() as connection:
+        return connection.execute(text("""
+            SELECT DISTINCT c.poster FROM catalog c
+            LEFT JOIN poster_mirror p ON p.url = c.poster
+            WHERE c.poster IS NOT NULL AND c.poster NOT IN ('', 'N/A') AND p.url IS NULL
+        """)).scalars().all()
+
+
+_BUMP_POSTER_OWNERS = text("""
+    UPDATE user_stats SET version = version + 1
+    WHERE user_id IN (SELECT DISTINCT um.user_id FROM user_movies um JOIN catalog c ON c.id = um.catalog_id
+                      WHERE c.poster IN :urls)
+""").bindparams(bindparam("urls", expanding=True))
+
+
+def _save_mirrored_posters(connection, posters, chunk_size):
+    connection.execute(text("""
+        INSERT OR REPLACE INTO poster_mirror (url, content_hash, image_path, thumbnail_path)
+        VALUES (:url, :content_hash, :image_path, :thumbnail_path)
+    """), posters)
+    # the movies of these users now carry a thumbnail, so their cached copies and ETags are stale
+    for start in range(0, len(posters), chunk_size):
+        connection.execute(_BUMP_POSTER_OWNERS, {"urls": [poster["url"] for poster in posters[start:start + chunk_size]]})
+
+
+def save_mirrored_posters(posters:list, chunk_size:int=500):
+    """Record downloaded posters (dicts with url, content_hash, image_path, thumbnail_path).
+
+    Bumps the collection version of every user holding one of the films.
+    """
+    if not posters:
+        return
+    _write(lambda connection: _save_mirrored_posters(connection, posters, chunk_size))
+
+
 def add_user(username:str):
     """Add new user."""
-    with engine.connect() as connection:
-        try:
-            connection.execute(
-                text("INSERT INTO users (username) VALUES (:username)"),
-                {"username": username}
-            )
-            connection.commit()
-            return True
-        except IntegrityError:
-            return False
+    return _write(lambda connection: _insert_user(connection, username))
 
 def list_users():
     """RETURN a list of users"""
-    with engine.connect() as connection:
+    with get_engine().connect() as connection:
         result = connection.execute(text("SELECT id, username FROM users"))
         return result.fetchall()
 
 def get_user_id(username: str):
     """Return the user ID for a given username."""
-    with engine.connect() as conn:
+    with get_engine().connect() as conn:
         result = conn.execute(
             text("SELECT id FROM users WHERE username = :username"),
             {"username": username}
@@ -145,6 +1490,3 @@ def get_user_id(username: str):
         return result.id
     else:
         return None
-
-# Initialize the database when module is imported
-init_db()
@@ -0,0 +1,325 @@
+"""Item-item collaborative filtering over every user's ratings.
+
+Each rated catalog film is a vector of its users' ratings, centered on the
+film's own mean rating. Two films are similar when the same people rated
+both above or below average: the cosine of their vectors, shrunk towards
+zero when few users rated both. refresh() computes these similarities
+with NumPy from sparse (CSR) rating matrices, a batch of films at a time,
+and keeps each film's NEIGHBORS most similar films in the item_neighbors
+table; recommend() answers from that table with one aggregate query and
+never refreshes it. Run refresh_recommendations.py after writes, or as a
+background job with --interval.
+
+Triggers on user_movies log every rating change (changed_ratings). As a
+film's vector depends on its own ratings only, a refresh recomputes the
+logged films and merges their new scores into the other films' neighbor
+lists. A list is recomputed in full only when one of its neighbors got
+less similar, because the film that should replace it is not cached.
+Only this recomputation is incremental: every refresh still reads the
+whole user_movies table to build the rating matrices, an O(ratings) scan.
+"""
+import itertools
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from instrumentation import timed
+from movie_storage import movie_storage_sql as storage
+from movie_storage.collection import load_numpy
+
+# Most similar films cached per film
+NEIGHBORS = 20
+# Films need this many raters in common to be neighbors; more common raters weigh more
+MIN_COMMON_RATERS = 2
+SHRINKAGE = 3.0
+# Similarity cells (rows x films), and rating pairs multiplied, per batch: bounds the memory of a refresh
+BATCH_CELLS = 4_000_000
+# Ids per IN (...) list
+CHUNK_SIZE = 500
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+
+def _csr(numpy, rows, columns, values, row_count):
+    """Return (indptr, columns, values) of a sparse matrix in compressed row order."""
+    order = numpy.argsort(rows, kind='stable')
+    indptr = numpy.zeros(row_count + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(rows, minlength=row_count), out=indptr[1:])
+    return indptr, columns[order], values[order]
+
+
+def _ranges(numpy, starts, lengths):
+    """Return the concatenation of range(start, start + length) for each pair, as one array."""
+    offsets = numpy.cumsum(lengths) - lengths
+    return numpy.arange(int(lengths.sum()), dtype=numpy.int64) + numpy.repeat(starts - offsets, lengths)
+
+
+def _load_matrix(connection, numpy):
+    """Return (catalog_ids, films, users) for every film anybody rated.
+
+    films and users are the same sparse matrix of mean-centered ratings,
+    scaled to unit length per film, as (indptr, columns, values): films
+    has a row per film (CSR), users a row per user (its transpose). Every
+    rating is stored, with value 0 for films everyone rated alike, so the
+    structure also tells which users rated a film.
+
+    This reads every row of user_movies. Loading only the changed films
+    would not be enough: their similarities need every rating of the users
+    who rated them, centered on the means of all the films those users
+    rated, and stale lists need the ratings of unchanged films too.
+    """
+    rows = connection.execute(text("SELECT catalog_id, user_id, user_rating FROM user_movies")).fetchall()
+    table = numpy.fromiter(itertools.chain.from_iterable(rows), dtype=numpy.float64, count=3 * len(rows)).reshape(-1, 3)
+    catalog_ids, film = numpy.unique(table[:, 0].astype(numpy.int64), return_inverse=True)
+    user_ids, user = numpy.unique(table[:, 1].astype(numpy.int64), return_inverse=True)
+    ratings = table[:, 2]
+    values = numpy.zeros(len(rows))
+    if len(rows):
+        centered = ratings - (numpy.bincount(film, weights=ratings) / numpy.bincount(film))[film]
+        norms = numpy.sqrt(numpy.bincount(film, weights=centered * centered))[film]
+        varied = norms > 0  # a film everyone rated alike has no direction to compare
+        values[varied] = centered[varied] / norms[varied]
+    films = _csr(numpy, film, user, values, len(catalog_ids))
+    users = _csr(numpy, user, film, values, len(user_ids))
+    return catalog_ids, films, users
+
+
+def _similarities(numpy, films, users, rows):
+    """Return the similarity of each film in `rows` (matrix row indexes) to every film.
+
+    Only the ratings of the users who rated those films are visited: each
+    of their ratings is paired with every other rating of the same user.
+    """
+    film_ptr, film_users, film_values = films
+    user_ptr, user_films, user_values = users
+    film_count = len(film_ptr) - 1
+    entries = _ranges(numpy, film_ptr[rows], film_ptr[rows + 1] - film_ptr[rows])
+    row = numpy.repeat(numpy.arange(len(rows)), film_ptr[rows + 1] - film_ptr[rows])
+    raters = film_users[entries]
+    lengths = user_ptr[raters + 1] - user_ptr[raters]
+    others = _ranges(numpy, user_ptr[raters], lengths)
+    cells = numpy.repeat(row * film_count, lengths) + user_films[others]
+    size = len(rows) * film_count
+    scores = numpy.bincount(cells, weights=numpy.repeat(film_values[entries], lengths) * user_values[others],
+                            minlength=size).reshape(len(rows), film_count)
+    common = numpy.bincount(cells, minlength=size).reshape(len(rows), film_count)
+    scores *= common / (common + SHRINKAGE)
+    scores[common < MIN_COMMON_RATERS] = 0
+    scores[numpy.arange(len(rows)), rows] = 0  # a film is not its own neighbor
+    numpy.maximum(scores, 0, out=scores)
+    return scores
+
+
+def _by_rank(item):
+    """Sort key of (neighbor_id, similarity): most similar first, ties by id, like _top_neighbors."""
+    return -item[1], item[0]
+
+
+def _top_neighbors(numpy, catalog_ids, scores):
+    """Yield the best NEIGHBORS [(neighbor_id, similarity)] of each row of scores, best first."""
+    count = min(NEIGHBORS, scores.shape[1])
+    top = numpy.argpartition(-scores, count - 1, axis=1)[:, :count]
+    for row, columns in zip(scores, top):
+        # every film tied with the last one, so ties are cut by id (columns are in id order)
+        columns = numpy.flatnonzero((row >= row[columns].min()) & (row > 0))
+        columns = columns[numpy.argsort(-row[columns], kind='stable')][:NEIGHBORS]
+        yield [(int(catalog_ids[column]), float(row[column])) for column in columns]
+
+
+def _batches(numpy, films, users, rows):
+    """Split rows into batches of at most BATCH_CELLS score cells and about as many rating pairs."""
+    film_ptr, film_users, _ = films
+    user_ptr = users[0]
+    film_count = len(film_ptr) - 1
+    size = max(1, BATCH_CELLS // max(film_count, 1))
+    # rating pairs each film's row costs: the ratings of all its raters
+    raters = film_users[_ranges(numpy, film_ptr[rows], film_ptr[rows + 1] - film_ptr[rows])]
+    pairs = numpy.bincount(numpy.repeat(numpy.arange(len(rows)), film_ptr[rows + 1] - film_ptr[rows]),
+                           weights=user_ptr[raters + 1] - user_ptr[raters], minlength=len(rows))
+    start, cost = 0, 0
+    for end, row_pairs in enumerate(pairs.tolist()):
+        if end > start and (end - start == size or cost + row_pairs > BATCH_CELLS):
+            yield rows[start:end]
+            start, cost = end, 0
+        cost += row_pairs
+    if start < len(rows):
+        yield rows[start:]
+
+
+def _merge(cached, new_scores):
+    """Return a film's neighbor list with new scores merged in, or None if it must be recomputed.
+
+    cached maps neighbor_id -> similarity; new_scores holds the current
+    similarity (0 if none) of every changed film that is or may become a neighbor.
+    """
+    complete = len(cached) < NEIGHBORS  # a short list holds every positive neighbor
+    merged = dict(cached)
+    for neighbor, score in new_scores.items():
+        if not complete and neighbor in cached and score < cached[neighbor]:
+            return None
+        if score > 0:
+            merged[neighbor] = score
+        else:
+            merged.pop(neighbor, None)
+    return sorted(merged.items(), key=_by_rank)[:NEIGHBORS]
+
+
+def _cached_lists(connection, changed, candidates):
+    """Return {catalog_id: {neighbor_id: similarity}} for the candidates and every film listing a changed one."""
+    holders = set(candidates)
+    for chunk in _chunks(changed):
+        holders.update(connection.execute(
+            text("SELECT DISTINCT catalog_id FROM item_neighbors WHERE neighbor_id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)), {"ids": chunk}).scalars())
+    holders -= changed
+    lists = {catalog_id: {} for catalog_id in holders}
+    for chunk in _chunks(holders):
+        for row in connection.execute(
+                text("SELECT catalog_id, neighbor_id, similarity FROM item_neighbors WHERE catalog_id IN :ids")
+                .bindparams(bindparam("ids", expanding=True)), {"ids": chunk}):
+            lists[row.catalog_id][row.neighbor_id] = row.similarity
+    return lists
+
+
+def _save(connection, lists, last_change):
+    """Replace the cached neighbor lists of the given films and clear the processed log entries."""
+    for chunk in _chunks(lists):
+        connection.execute(text("DELETE FROM item_neighbors WHERE catalog_id IN :ids")
+                           .bindparams(bindparam("ids", expanding=True)), {"ids": chunk})
+    rows = [{"catalog_id": catalog_id, "neighbor_id": neighbor_id, "similarity": similarity}
+            for catalog_id, neighbors in lists.items() for neighbor_id, similarity in neighbors]
+    if rows:
+        connection.execute(text("""
+            INSERT INTO item_neighbors (catalog_id, neighbor_id, similarity)
+            VALUES (:catalog_id, :neighbor_id, :similarity)
+        """), rows)
+    connection.execute(text("DELETE FROM changed_ratings WHERE id <= :last"), {"last": last_change})
+
+
+@timed
+def refresh():
+    """Bring item_neighbors up to date with the logged rating changes.
+
+    The neighbor lists are recomputed for the changed films only, but the
+    rating matrices are loaded from all of user_movies, so a refresh that
+    has anything to do costs at least one O(ratings) read.
+
+    Returns how many films got a new neighbor list (0 when nothing changed),
+    or None when NumPy is not installed or the database failed; the cached
+    neighbors are then left as they are.
+    """
+    numpy = load_numpy()
+    if not numpy:
+        return None
+    try:
+        with storage.get_engine().connect() as connection:
+            last_change = connection.execute(text("SELECT MAX(id) FROM changed_ratings")).scalar()
+            if last_change is None:
+                return 0
+            # changes logged after this point stay in the log for the next refresh
+            changed = set(connection.execute(text("SELECT DISTINCT catalog_id FROM changed_ratings WHERE id <= :last"),
+                                             {"last": last_change}).scalars())
+            catalog_ids, films, users = _load_matrix(connection, numpy)
+            position = {catalog_id: index for index, catalog_id in enumerate(catalog_ids.tolist())}
+            changed_rows = numpy.array(sorted(position[catalog_id] for catalog_id in changed if catalog_id in position),
+                                       dtype=numpy.int64)
+            is_changed = numpy.zeros(len(catalog_ids), dtype=bool)
+            is_changed[changed_rows] = True
+
+            lists = {catalog_id: [] for catalog_id in changed}  # films nobody rates any more lose their list
+            new_scores = {}
+            for rows in _batches(numpy, films, users, changed_rows):
+                scores = _similarities(numpy, films, users, rows)
+                lists.update(zip(catalog_ids[rows].tolist(), _top_neighbors(numpy, catalog_ids, scores)))
+                # the same scores seen from the unchanged films, to merge into their lists
+                scores[:, is_changed] = 0
+                for row, column in zip(*numpy.nonzero(scores)):
+                    new_scores.setdefault(int(catalog_ids[column]), {})[int(catalog_ids[rows[row]])] = \
+                        float(scores[row, column])
+
+            stale = []
+            for catalog_id, cached in _cached_lists(connection, changed, new_scores).items():
+                if catalog_id not in position:  # lost its last rating after the log was read
+                    lists[catalog_id] = []
+                    continue
+                scores = new_scores.get(catalog_id, {})
+                for neighbor in changed.intersection(cached):
+                    scores.setdefault(neighbor, 0.0)
+                merged = _merge(cached, scores)
+                if merged is None:
+                    stale.append(position[catalog_id])
+                elif merged != sorted(cached.items(), key=_by_rank):
+                    lists[catalog_id] = merged
+            for rows in _batches(numpy, films, users, numpy.array(stale, dtype=numpy.int64)):
+                scores = _similarities(numpy, films, users, rows)
+                lists.update(zip(catalog_ids[rows].tolist(), _top_neighbors(numpy, catalog_ids, scores)))
+        storage.write_transaction(lambda connection: _save(connection, lists, last_change))
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return None
+    return len(lists)
+
+
+def rebuild():
+    """Drop the cached neighbors and recompute them for every rated film."""
+    def reset(connection):
+        connection.execute(text("DELETE FROM item_neighbors"))
+        connection.execute(text("DELETE FROM changed_ratings"))
+        connection.execute(text("INSERT INTO changed_ratings (catalog_id) SELECT DISTINCT catalog_id FROM user_movies"))
+    try:
+        storage.write_transaction(reset)
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return None
+    return refresh()
+
+
+@timed
+def recommend(user_id:int, limit:int=10):
+    """Return up to `limit` films the user has not rated, best match first.
+
+    A film scores by its similarity to each of the user's films times how
+    far the user's rating of that film is above their average; the
+    predicted rating is the similarity-weighted mean of those ratings.
+    Only cached neighbors are read, nothing is recomputed here.
+    """
+    try:
+        with storage.get_engine().connect() as connection:
+            rows = connection.execute(text("""
+                WITH mine AS (
+                    SELECT um.catalog_id, um.user_rating,
+                           um.user_rating - (SELECT rating_sum / movie_count FROM user_stats
+                                             WHERE user_id = :user_id) AS above_average
+                    FROM user_movies um WHERE um.user_id = :user_id
+                )
+                SELECT c.title, c.year, c.imdb_rating, c.poster, best.predicted
+                FROM (
+                    SELECT n.neighbor_id,
+                           SUM(n.similarity * mine.user_rating) / SUM(n.similarity) AS predicted,
+                           SUM(n.similarity * mine.above_average) AS score
+                    FROM mine JOIN item_neighbors n ON n.catalog_id = mine.catalog_id
+                    WHERE NOT EXISTS (SELECT 1 FROM user_movies own
+                                      WHERE own.user_id = :user_id AND own.catalog_id = n.neighbor_id)
+                    GROUP BY n.neighbor_id
+                    HAVING score > 0
+                    ORDER BY score DESC
+                    LIMIT :limit
+                ) best JOIN catalog c ON c.id = best.neighbor_id
+                ORDER BY best.score DESC
+            """), {"user_id": user_id, "limit": limit}).fetchall()
+    except SQLAlchemyError as e:
+        print(f"Database error {e}")
+        return {}
+    return {
+        row.title: {
+            "year": row.year,
+            "imdb_rating": row.imdb_rating,
+            "poster": row.poster,
+            "predicted_rating": row.predicted,
+        }
+        for row in rows
+    }
@@ -1,20 +1,22 @@
-import random
 import re
 
+import instrumentation
+from movie_storage import analytics
+from movie_storage import collection_cache
 from movie_storage import movie_storage_sql as storage
+from movie_storage.movie_storage_sql import RATING_MAX, RATING_MIN
+from movie_storage import recommendations
 from utils import err_msg, user_prompt, display_menu
 from services.omdb_api import fetch_movie
 from generate_website import generate_website
 active_user_id = None
 active_username = None
 
-RATING_MIN = 1
-RATING_MAX = 10
-
 def select_user():
     """Prompt the user to select or create a user profile."""
     global active_user_id, active_username
 
+    collection_cache.invalidate()
     users = storage.list_users()
     print("Welcome to the Movie App! 🎬\n")
     print('select a user:')
@@ -61,10 +63,15 @@ def prompt_user_to_choice(menu):
 # print total of movies in database , list all movies along with their rating
 def list_movies_and_display_total():
     """List all movies with their year and rating, and print the total number of movies."""
-    movies = storage.list_movies(active_user_id)
-    total_movies = len(movies)
+    movies = collection_cache.get_collection(active_user_id)
+    if movies is None:  # too large to cache: stream it
+        total_movies = storage.count_movies(active_user_id)
+        movies_in_order = storage.iter_movies(active_user_id)
+    else:
+        total_movies = len(movies)
+        movies_in_order = movies.items()
     print(f"{total_movies} movies in total")
-    for movie, info in movies.items():
+    for movie, info in movies_in_order:
         print(f"{movie} ({info['year']}): {info['rating']}")
     print_line()
 
@@ -104,7 +111,8 @@ def validate_name(name):
 def add_movie():
     """Prompt the user to add a new movie and store it."""
     movie_name = get_valid_input('Enter new movie name:',validate_name,'Please enter a valid, non-empty movie name that is not already in the list')
-    movie = fetch_movie(movie_name)
+    # films someone already added are in the shared catalog: no OMDb request needed
+    movie = storage.find_catalog_movie(movie_name) or fetch_movie(movie_name)
     if movie is None:
         print(f"Movie {movie_name} not found or API not available.")
         return
@@ -113,7 +121,7 @@ def add_movie():
     year = movie['year']
     poster = movie['poster']
     # save to database
-    if storage.add_movie(title, year, rating, poster,active_user_id):
+    if collection_cache.add_movie(title, year, rating, poster,active_user_id, movie.get('imdb_id'), rating):
         print('Movie added successfully!')
     else:
         err_msg('Movie already exist!')
@@ -124,7 +132,7 @@ def delete_movie():
     """Prompt the user to delete a movie by name."""
     movie_name = get_valid_input('please enter the name of the movie you want to delete:', validate_name,
                                  'Please enter a valid, non-empty movie name')
-    if storage.delete_movie(movie_name, active_user_id):
+    if collection_cache.delete_movie(movie_name, active_user_id):
         print(f"Movie {movie_name} successfully deleted")
     else:
         err_msg("Movie doesn't exist!")
@@ -138,108 +146,68 @@ def update_movie():
     movie_name = get_valid_input('please enter the name of the movie you want to update:', validate_name,
                                  'Please enter a valid, non-empty movie name')
     movie_rating = get_valid_input('Enter a new movie rating:',validate_rating,"Rating must be a number between 1 and 10.")
-    if storage.update_movie(movie_name,movie_rating, active_user_id):
+    if collection_cache.update_movie(movie_name,movie_rating, active_user_id):
         print('Movie updated successfully!')
     else:
         err_msg("Movie doesn't exist!")
         print_line()
 
 
-def get_median(ratings):
-    """Return the median value from a list of ratings."""
-    sorted_ratings = sorted(ratings)
-    count_of_ratings = len(sorted_ratings)
-    if count_of_ratings == 0:
-        return None
-    if count_of_ratings % 2 == 1:  # odd case
-        rating_median = sorted_ratings[count_of_ratings // 2]
-    else:
-        rating_median = (sorted_ratings[count_of_ratings // 2 - 1] + sorted_ratings[count_of_ratings // 2]) / 2
-    return rating_median
-
-
-def print_top_movies(movies):
+def print_top_movies(titles, max_rating):
     """Print the movie(s) with the highest rating."""
-    ratings = [details['rating'] for details in movies.values()]
-    max_rating = max(ratings)
-    top_movies = [name for name, details in movies.items() if details['rating'] == max_rating]
-    if len(top_movies) > 1:
-        names = ', '.join(top_movies)
+    if len(titles) > 1:
+        names = ', '.join(titles)
         print(f"Best movies:  ({names}),{max_rating}")
     else:
-        print(f"Best movie: {top_movies[0]}, {max_rating}")
+        print(f"Best movie: {titles[0]}, {max_rating}")
 
 
-def print_worst_rating_movies(movies):
+def print_worst_rating_movies(titles, min_rating):
     """Print the movie(s) with the lowest rating."""
-    ratings = [details['rating'] for details in movies.values()]
-    min_rating = min(ratings)
-    worst_movies = [name for name, details in movies.items() if details['rating'] == min_rating]
-    if len(worst_movies) > 1:
-        names = ', '.join(worst_movies)
+    if len(titles) > 1:
+        names = ', '.join(titles)
         print(f"Worst movies: ({names}),{min_rating}")
     else:
-        print(f"Worst movie: {worst_movies[0]},{min_rating}")
+        print(f"Worst movie: {titles[0]},{min_rating}")
 
 
 # print statistics about the movies in database
 def print_stats():
     """Print statistics about the movies: average, median, best and worst."""
-    movies = storage.list_movies(active_user_id)
-    # average ratings
-    ratings = [details['rating'] for details in movies.values() ]
-    total_rating = sum(ratings)
-    average_rating = total_rating / len(ratings)
-    rating_median = get_median(ratings)
-    print(f"Average rating: {average_rating:.2f}")
-    print(f"Median rating: {rating_median:.2f}")
+    stats = collection_cache.get_stats(active_user_id)
+    if stats is None:
+        print('No movies found in database')
+        return
+    print(f"Average rating: {stats['average']:.2f}")
+    print(f"Median rating: {stats['median']:.2f}")
     # The best and worst movies
-    print_top_movies(movies)
-    print_worst_rating_movies(movies)
+    print_top_movies(stats['best'], stats['max'])
+    print_worst_rating_movies(stats['worst'], stats['min'])
     print_line()
 
 
 def print_random_movie():
     """Print a randomly selected movie from the database."""
-    movies = storage.list_movies(active_user_id)
-    #functions like random.choice() need an indexable sequence (like a list or tuple),dict_keys is not indexable.
-    random_movie_name = random.choice(list(movies.keys()))
-    print(f"Your movie for tonight {random_movie_name} , it'S rated {movies[random_movie_name]['rating']}")
+    movie = storage.random_movie(active_user_id)
+    if movie is None:
+        print('No movies found in database')
+        return
+    random_movie_name, details = movie
+    print(f"Your movie for tonight {random_movie_name} , it'S rated {details['rating']}")
     print_line()
 
 
-def min_distance(word1, word2):
-    """Compute the Levenshtein distance between two strings."""
-    m, n = len(word1), len(word2)
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-    for i in range(m + 1):
-        for j in range(n + 1):
-            if i == 0:
-                dp[i][j] = j
-            elif j == 0:
-                dp[i][j] = i
-            elif word1[i - 1] == word2[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1]
-            else:
-                dp[i][j] = min(dp[i - 1][j - 1], dp[i][j - 1], dp[i - 1][j]) + 1
-    return dp[m][n]
-
-
 def search_movie():
     """Search for a movie by partial name; suggest close matches if none found."""
-    movies = storage.list_movies(active_user_id)
     user_search_query = user_prompt('Enter part of movie name: ')
 
-    results = [(movie , details['rating']) for movie , details in movies.items() if user_search_query.lower() in movie.lower()]
+    results = storage.search_movies(active_user_id, user_search_query)
     if results:
-        for movie, rating in results:
-            print(f"{movie}, {rating}")
+        for movie, details in results.items():
+            print(f"{movie}, {details['rating']}")
             print_line()
     else:
-        matching_movies = []
-        for movie in movies:
-            if min_distance(movie, user_search_query) <= 5:
-                matching_movies.append(movie)
+        matching_movies = storage.suggest_titles(active_user_id, user_search_query)
         if matching_movies:
             print(f"The movie {user_search_query} does not exist.Did you mean:")
             for movie in matching_movies:
@@ -252,23 +220,64 @@ def search_movie():
 
 def print_sorted_movies_by_ratings():
     """Print all movies sorted by rating in descending order."""
-    movies = storage.list_movies(active_user_id)
-    sorted_by_ratings = sorted(movies.items(), key=lambda item: item[1]['rating'], reverse=True)
+    movies = collection_cache.get_collection(active_user_id)
+    if movies is None:  # too large to cache: stream it in rating order
+        sorted_by_ratings = storage.iter_movies(active_user_id, order_by='rating')
+    else:
+        sorted_by_ratings = movies.by_rating()
     for movie, details in sorted_by_ratings:
         print(f"{movie}, {details['rating']}")
     print_line()
 
 
 
+def print_recommendations():
+    """Print movies that other users rated like the ones this user rated highly."""
+    # read from the precomputed similar-movie lists, which refresh_recommendations.py keeps current
+    results = recommendations.recommend(active_user_id)
+    if not results:
+        print('No recommendations yet: rate more movies that other users have rated too '
+              '(the lists are updated by refresh_recommendations.py).')
+        print_line()
+        return
+    for movie, details in results.items():
+        imdb_rating = details['imdb_rating'] if details['imdb_rating'] is not None else 'N/A'
+        print(f"{movie} ({details['year']}): predicted {details['predicted_rating']:.1f}, IMDb {imdb_rating}")
+    print_line()
+
+
+
+def print_leaderboards():
+    """Print the most collected and highest rated movies across all users, and movies per decade."""
+    print('Most collected movies:')
+    for rank, movie in enumerate(analytics.most_collected(), start=1):
+        print(f"{rank}. {movie['title']} ({movie['year']}): in {movie['owners']} collections, "
+              f"average rating {movie['average']:.1f}")
+    print_line()
+    print(f"Highest rated movies (rated by at least {analytics.MIN_RATINGS} users):")
+    for rank, movie in enumerate(analytics.highest_rated(), start=1):
+        print(f"{rank}. {movie['title']} ({movie['year']}): average rating {movie['average']:.1f} "
+              f"from {movie['owners']} users")
+    print_line()
+    decades = analytics.by_decade()
+    most = max((movies for _, movies, _ in decades), default=0)
+    print('Movies per decade:')
+    for decade, movies, average in decades:
+        label = f"{decade}s" if decade else 'unknown'
+        bar = '#' * max(1, round(30 * movies / most))
+        print(f"{label:>8} {bar} {movies} (average {average:.1f})")
+    print_line()
+
+
+
 def main():
     """Run the interactive movie database menu."""
-    global active_user_id, active_username
-
     # Step 1: select or create user
     select_user()
 
     menu = ["Exit", "List movies", "Add movie", "Delete movie", "Update movie", "Stats", "Random movie", "Search movie",
-            "Movies sorted by rating","Generate website","Switch user"]
+            "Movies sorted by rating","Generate website","Switch user", "Performance report",
+            "Recommend movies", "Leaderboards"]
     menu_commands = {
         0 :'Exit',
         1 : list_movies_and_display_total,
@@ -280,7 +289,10 @@ def main():
         7:search_movie,
         8:print_sorted_movies_by_ratings,
         9: lambda: generate_website(active_user_id, active_username),
-        10:select_user
+        10:select_user,
+        11:instrumentation.print_report,
+        12:print_recommendations,
+        13:print_leaderboards
     }
 
     print("********** My Movies Database **********")
@@ -295,7 +307,8 @@ def main():
                 break
             elif user_choice in menu_commands:
                 try:
-                    menu_commands[user_choice]()
+                    with instrumentation.command(menu[user_choice]):
+                        menu_commands[user_choice]()
                 except Exception as e:
                     print(f"Error: {e}")
             else:
@@ -0,0 +1,33 @@
+import argparse
+import time
+
+from movie_storage import recommendations
+
+
+def refresh(rebuild=False):
+    """Update the similar-movie cache once and print what changed; return False if it could not be updated."""
+    started = time.perf_counter()
+    films = recommendations.rebuild() if rebuild else recommendations.refresh()
+    if films is None:
+        print('Recommendations were not updated (NumPy missing or database error).')
+        return False
+    print(f"Updated the similar movies of {films} films in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Recompute the similar-movie lists that recommendations are read from (needs NumPy).')
+    parser.add_argument('--rebuild', action='store_true', help='recompute every film, not only changed ones')
+    parser.add_argument('--interval', type=float,
+                        help='keep running and refresh every INTERVAL seconds, as a background job')
+    args = parser.parse_args()
+    ok = refresh(args.rebuild)
+    while args.interval:
+        time.sleep(args.interval)
+        ok = refresh()
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
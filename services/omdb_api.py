@@ -1,30 +1,121 @@
-import requests
 import os
-from dotenv import load_dotenv
-from requests.exceptions import RequestException
+import threading
+import time
 
-load_dotenv()
-OMDB_URL ='http://www.omdbapi.com/'
-API_KEY = os.getenv('API_KEY')
+from instrumentation import timed
+from services import omdb_cache
 
-def fetch_movie(title:str):
-    """fetch movie by title from omdb api """
-    params = {'t':title,'apikey':API_KEY}
+# OMDB_URL points benchmarks at a local stand-in, see benchmarks/fake_omdb.py
+OMDB_URL = os.getenv('OMDB_URL', 'http://www.omdbapi.com/')
+# requests and dotenv are imported on the first OMDb call, not at startup
+_api_key = None
+
+# The only error answer that means the title does not exist; others (a reached
+# request limit, a bad API key) say nothing about the film and are not cached
+NOT_FOUND_ERROR = 'Movie not found!'
+
+# Seconds to wait for OMDb before the lookup counts as failed
+REQUEST_TIMEOUT = 10
+
+# Keep-alive connections shared by every request, sized for the bulk importer's pool
+POOL_SIZE = 16
+_session = None
+
+
+def get_api_key():
+    """Load .env on first use and return the OMDb API key."""
+    global _api_key
+    if _api_key is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _api_key = os.getenv('API_KEY')
+    return _api_key
+
+
+def get_session():
+    """Return the shared requests.Session, creating it on first use."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+class RateLimiter:
+    """Space out calls so that at most `rate` start per second, across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may make its next call."""
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class OMDbError(Exception):
+    """OMDb could not be asked: the request failed, or it answered with an error other than not found."""
+
+
+@timed
+def lookup_movie(title:str, rate_limiter=None):
+    """Look a movie up by title, from the local cache when possible, else from the OMDb API.
+
+    Returns None for a film OMDb does not know (or has no rating for) and
+    raises OMDbError when the answer says nothing about the film.
+    """
+    cached, movie = omdb_cache.lookup(title)
+    if cached:
+        if movie is None:
+            print(f"Movie '{title}' not found in the OMDB API.")
+        return movie
+    from requests.exceptions import RequestException
+    params = {'t':title,'apikey':get_api_key()}
     try:
-        response = requests.get(OMDB_URL, params)
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        started = time.perf_counter()
+        response = get_session().get(OMDB_URL, params=params, timeout=REQUEST_TIMEOUT)
+        omdb_cache.record_upstream_call(time.perf_counter() - started)
         data = response.json()
-        if data.get('Response') == 'False':
-            print(f"Movie '{title}' not found in the OMDB API.")
-            return None
-        return {'title': data['Title'],
-                'year': int(data['Year']),
-                'rating': float(data['imdbRating'] if data['imdbRating'] != 'N/A' else None),
-                'poster': data['Poster']}
     except RequestException as e:
-        print(f"API request has failed {e}.")
+        raise OMDbError(f"API request has failed {e}.")
     except ValueError:
-        print('Failed to parse API response as json.')
-
+        raise OMDbError('Failed to parse API response as json.')
+    if data.get('Response') == 'False':
+        if response.status_code == 200 and data.get('Error') == NOT_FOUND_ERROR:
+            print(f"Movie '{title}' not found in the OMDB API.")
+            omdb_cache.store(title, None)
+            return None
+        raise OMDbError(f"OMDB API error for '{title}': {data.get('Error', response.status_code)}")
+    if data.get('imdbRating', 'N/A') == 'N/A':
+        # a collection entry needs a rating, so an unrated film counts as not found
+        print(f"Movie '{title}' has no IMDb rating in the OMDB API.")
+        omdb_cache.store(title, None)
+        return None
+    movie = {'title': data['Title'],
+             'year': int(data['Year']),
+             'rating': float(data['imdbRating']),
+             'poster': data['Poster'],
+             'imdb_id': data.get('imdbID')}
+    omdb_cache.store(title, movie)
+    return movie
 
 
-print(fetch_movie('inception'))
\ No newline at end of file
+def fetch_movie(title:str, rate_limiter=None):
+    """fetch movie by title like lookup_movie(), printing a failed lookup and returning None for it"""
+    try:
+        return lookup_movie(title, rate_limiter)
+    except OMDbError as e:
+        print(e)
+        return None
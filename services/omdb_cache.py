@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from movie_storage.fuzzy import normalize
+
+# The cache lives next to the movies database (OMDB_CACHE_DB_URL points benchmarks and batch jobs elsewhere)
+CACHE_DB_URL = os.getenv('OMDB_CACHE_DB_URL', "sqlite:///data/omdb_cache.db")
+# Bulk imports look titles up and store answers from several threads at once
+BUSY_TIMEOUT_MS = 5000
+
+# Seconds a found movie / a "not found" answer stays fresh, and the LRU size bound
+CACHE_TTL = int(os.getenv('OMDB_CACHE_TTL', 7 * 24 * 3600))
+NEGATIVE_CACHE_TTL = int(os.getenv('OMDB_CACHE_NEGATIVE_TTL', 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv('OMDB_CACHE_MAX_ENTRIES', 10000))
+# A hit only records its time for LRU eviction when the entry was last used longer ago than this,
+# so most hits are plain reads
+LAST_USED_RESOLUTION = 3600
+
+_engine = None
+
+# Counters for this process, see cache_stats()
+_stats = {
+    'hits': 0,
+    'negative_hits': 0,
+    'misses': 0,
+    'upstream_calls': 0,
+    'upstream_seconds': 0.0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    """Let lookups read while another thread stores, and wait for a busy writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def get_engine():
+    """Create the cache engine and table on first use."""
+    global _engine
+    if _engine is None:
+        os.makedirs("data", exist_ok=True)
+        _engine = create_engine(CACHE_DB_URL, echo=False, connect_args={"timeout": BUSY_TIMEOUT_MS / 1000})
+        event.listen(_engine, "connect", _configure_connection)
+        with _engine.connect() as connection:
+            connection.execute(text("""
+                CREATE TABLE IF NOT EXISTS omdb_cache (
+                    title_key TEXT PRIMARY KEY,
+                    movie TEXT,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_omdb_cache_last_used ON omdb_cache(last_used)"))
+            connection.commit()
+    return _engine
+
+
+def lookup(title: str):
+    """Return (hit, movie) for a title; movie is None for a cached "not found"."""
+    now = time.time()
+    key = normalize(title)
+    try:
+        with get_engine().connect() as connection:
+            row = connection.execute(
+                text("SELECT movie, last_used FROM omdb_cache WHERE title_key = :key AND expires_at > :now"),
+                {"key": key, "now": now}).fetchone()
+            if row is None:
+                _count('misses')
+                return False, None
+            if now - row.last_used > LAST_USED_RESOLUTION:
+                connection.execute(text("UPDATE omdb_cache SET last_used = :now WHERE title_key = :key"),
+                                   {"key": key, "now": now})
+                connection.commit()
+    except SQLAlchemyError as e:
+        print(f"OMDb cache error {e}")
+        _count('misses')
+        return False, None
+    if row.movie is None:
+        _count('negative_hits')
+        return True, None
+    _count('hits')
+    return True, json.loads(row.movie)
+
+
+def store(title: str, movie):
+    """Cache an OMDb answer (None meaning "not found") and evict least recently used entries."""
+    now = time.time()
+    ttl = CACHE_TTL if movie is not None else NEGATIVE_CACHE_TTL
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("""
+                INSERT OR REPLACE INTO omdb_cache (title_key, movie, expires_at, last_used)
+                VALUES (:key, :movie, :expires_at, :now)
+            """), {"key": normalize(title), "movie": None if movie is None else json.dumps(movie),
+                   "expires_at": now + ttl, "now": now})
+            connection.execute(text("""
+                DELETE FROM omdb_cache WHERE title_key IN (
+                    SELECT title_key FROM omdb_cache ORDER BY last_used
+                    LIMIT max(0, (SELECT COUNT(*) FROM omdb_cache) - :max_entries)
+                )
+            """), {"max_entries": CACHE_MAX_ENTRIES})
+            connection.commit()
+    except SQLAlchemyError as e:
+        print(f"OMDb cache error {e}")
+
+
+def record_upstream_call(seconds: float):
+    """Count one request that went to OMDb and how long it took."""
+    with _stats_lock:
+        _stats['upstream_calls'] += 1
+        _stats['upstream_seconds'] += seconds
+
+
+def cache_stats():
+    """Return hit/miss counters and an estimate of the upstream time the cache saved."""
+    with _stats_lock:
+        stats = dict(_stats)
+    calls = stats['upstream_calls']
+    average_call = stats['upstream_seconds'] / calls if calls else 0.0
+    stats['estimated_seconds_saved'] = average_call * (stats['hits'] + stats['negative_hits'])
+    return stats
+
+
+def format_cache_stats():
+    """Return cache_stats() as one line for reports."""
+    stats = cache_stats()
+    return (f"OMDb cache: {stats['hits']} hits, {stats['negative_hits']} negative hits, {stats['misses']} misses, "
+            f"{stats['upstream_calls']} OMDb calls ({stats['upstream_seconds']:.1f}s), "
+            f"about {stats['estimated_seconds_saved']:.1f}s saved")
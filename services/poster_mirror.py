@@ -0,0 +1,174 @@
+import hashlib
+import io
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from movie_storage import movie_storage_sql as storage
+
+# Mirrored posters live next to the generated pages, which link to them relatively
+STATIC_DIR = '_static'
+POSTER_DIR = 'posters'
+THUMBNAIL_SIZE = (200, 300)
+DEFAULT_WORKERS = 8
+REQUEST_TIMEOUT = 10
+# Downloads larger than this are refused before they are hashed
+MAX_POSTER_BYTES = 10 * 1024 * 1024
+
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+}
+
+# Downloads with the same content write the same file, only once
+_write_lock = threading.Lock()
+# Unique temporary file names for threads encoding the same thumbnail
+_temp_names = itertools.count()
+
+
+def _extension(url, content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in EXTENSIONS:
+        return EXTENSIONS[content_type]
+    _, extension = os.path.splitext(url.split('?')[0])
+    return extension.lower() if extension.lower() in EXTENSIONS.values() else '.jpg'
+
+
+def _write_once(file_path, content):
+    """Write content to file_path unless it already exists; return whether this call wrote it."""
+    with _write_lock:
+        if os.path.exists(file_path):
+            return False
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(content)
+        os.replace(temp_path, file_path)
+        return True
+
+
+def _check_image(content, content_type):
+    """Raise OSError unless content decodes as an image (or, without Pillow, is served as one)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        if not (content_type or '').lower().startswith('image/'):
+            raise OSError(f"not an image ({content_type})")
+        return
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+    except (SyntaxError, Image.DecompressionBombError) as e:
+        raise OSError(f"not a valid image: {e}")
+
+
+def make_thumbnail(image_path, thumbnail_path):
+    """Write a small JPEG copy of an image; return False if Pillow is not installed.
+
+    The image is encoded to a temporary file outside the lock, so threads
+    make thumbnails in parallel and a failed encode leaves no partial file.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    with _write_lock:
+        if os.path.exists(thumbnail_path):
+            return True
+    temp_path = f"{thumbnail_path}.{next(_temp_names)}.tmp"
+    try:
+        with Image.open(image_path) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            image.convert('RGB').save(temp_path, 'JPEG', quality=80)
+    except BaseException as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if isinstance(e, Image.DecompressionBombError):
+            raise OSError(f"image too large: {e}")
+        raise
+    with _write_lock:
+        os.replace(temp_path, thumbnail_path)
+    return True
+
+
+def _download(session, url):
+    """Return (content, content type) of a URL, raising OSError past MAX_POSTER_BYTES."""
+    with session.get(url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > MAX_POSTER_BYTES:
+            raise OSError(f"larger than {MAX_POSTER_BYTES} bytes")
+        content = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            content += chunk
+            if len(content) > MAX_POSTER_BYTES:
+                raise OSError(f"larger than {MAX_POSTER_BYTES} bytes")
+        return bytes(content), response.headers.get('Content-Type')
+
+
+def mirror_poster(session, url, static_dir=STATIC_DIR):
+    """Download one poster and store it (and its thumbnail) under its content hash.
+
+    Returns a dict for storage.save_mirrored_posters(); paths are URL paths
+    relative to static_dir so pages can link to them directly.
+    """
+    content, content_type = _download(session, url)
+    content_hash = hashlib.sha256(content).hexdigest()
+    image_name = f"{POSTER_DIR}/{content_hash}{_extension(url, content_type)}"
+    thumbnail_name = f"{POSTER_DIR}/{content_hash}_thumb.jpg"
+    # an error page served with 200 must not end up under posters/
+    _check_image(content, content_type)
+    image_path = os.path.join(static_dir, image_name)
+    created = _write_once(image_path, content)
+    try:
+        has_thumbnail = make_thumbnail(image_path, os.path.join(static_dir, thumbnail_name))
+    except OSError:
+        # the header checked out but the image does not decode; a file another
+        # download wrote may already be recorded for its URL, so only remove our own
+        if created:
+            with _write_lock:
+                os.remove(image_path)
+        raise
+    if not has_thumbnail:
+        # without Pillow the full-size local copy stands in for the thumbnail
+        thumbnail_name = image_name
+    return {'url': url, 'content_hash': content_hash, 'image_path': image_name, 'thumbnail_path': thumbnail_name}
+
+
+def mirror_posters(urls=None, workers=DEFAULT_WORKERS, static_dir=STATIC_DIR):
+    """Download poster URLs (default: every one not mirrored yet) on a bounded thread pool.
+
+    Returns (mirrored, failed): the records saved to storage and the URLs
+    that could not be downloaded.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    if urls is None:
+        urls = storage.list_unmirrored_posters()
+    urls = sorted({url for url in urls if url and url != 'N/A'})
+    os.makedirs(os.path.join(static_dir, POSTER_DIR), exist_ok=True)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def download(url):
+        try:
+            return mirror_poster(session, url, static_dir)
+        except (requests.RequestException, OSError) as e:
+            print(f"Could not mirror poster {url}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(download, urls))
+    mirrored = [result for result in results if result is not None]
+    failed = [url for url, result in zip(urls, results) if result is None]
+    storage.save_mirrored_posters(mirrored)
+    distinct_images = len({poster['content_hash'] for poster in mirrored})
+    print(f"Mirrored {len(mirrored)} posters ({distinct_images} distinct images), {len(failed)} failed.")
+    return mirrored, failed
+
+
+if __name__ == "__main__":
+    mirror_posters()
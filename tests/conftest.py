@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movie_storage import movie_storage_sql
+from services import omdb_api, omdb_cache
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """The SQL store on a fresh database in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(movie_storage_sql, 'DB_URL', f"sqlite:///{tmp_path / 'movies.db'}")
+    movie_storage_sql.dispose_engine()
+    yield movie_storage_sql
+    movie_storage_sql.dispose_engine()
+
+
+@pytest.fixture
+def omdb(tmp_path, monkeypatch):
+    """omdb_api talking to benchmarks/fake_omdb.py, with an empty cache in a temporary directory."""
+    from benchmarks.fake_omdb import start_server
+    server, url = start_server()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(omdb_api, 'OMDB_URL', url)
+    monkeypatch.setattr(omdb_api, '_api_key', 'test')
+    monkeypatch.setattr(omdb_cache, 'CACHE_DB_URL', f"sqlite:///{tmp_path / 'omdb_cache.db'}")
+    monkeypatch.setattr(omdb_cache, '_engine', None)
+    monkeypatch.setattr(omdb_cache, '_stats', dict.fromkeys(omdb_cache._stats, 0))
+    yield omdb_api
+    server.shutdown()
+    server.server_close()
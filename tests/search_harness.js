@@ -0,0 +1,70 @@
+// Runs _static/search.js against a minimal DOM stand-in, for tests/test_search_js.py.
+//
+// Usage: node search_harness.js STATIC_DIR PAGE_FILE INDEX_FILE CARD_TITLES_JSON QUERIES_JSON
+//
+// Types each query into the search box of PAGE_FILE (whose cards have the
+// given titles) and prints, as JSON, what the page shows for it.
+'use strict';
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+
+const [staticDir, pageFile, indexFile, cardTitles, queries] = process.argv.slice(2);
+
+function element(extra) {
+    return Object.assign({
+        hidden: true,
+        textContent: '',
+        children: [],
+        appendChild(child) { this.children.push(child); },
+        addEventListener(type, listener) { this.listener = listener; },
+    }, extra);
+}
+
+const section = element({dataset: {index: indexFile}});
+const input = element({value: ''});
+const summary = element();
+const list = element();
+Object.defineProperty(list, 'textContent', {
+    // like the DOM, setting the text replaces the children
+    set: function () { this.children = []; },
+    get: function () { return ''; },
+});
+const cards = JSON.parse(cardTitles).map(function (title) {
+    const heading = element({textContent: title});
+    return element({hidden: false, title: title, querySelector: function () { return heading; }});
+});
+const context = {window: {}, location: {pathname: '/site/' + encodeURIComponent(pageFile)}};
+context.document = {
+    querySelector: function () { return section; },
+    querySelectorAll: function () { return cards; },
+    getElementById: function (id) {
+        return {'movie-search-input': input, 'movie-search-summary': summary, 'movie-search-results': list}[id];
+    },
+    createElement: function () { return element(); },
+    head: {
+        appendChild: function (script) {
+            vm.runInContext(fs.readFileSync(path.join(staticDir, script.src), 'utf8'), context);
+            script.onload();
+        },
+    },
+};
+context.window = context;
+vm.createContext(context);
+vm.runInContext(fs.readFileSync(path.join(staticDir, 'search.js'), 'utf8'), context);
+
+const results = JSON.parse(queries).map(function (query) {
+    input.value = query;
+    input.listener();
+    return {
+        query: query,
+        summary: summary.textContent,
+        results: list.children.map(function (item) {
+            const link = item.children[0];
+            return link ? {label: link.textContent, page: link.href} : {label: item.textContent, page: null};
+        }),
+        visible_cards: cards.filter(function (card) { return !card.hidden; }).map(function (card) { return card.title; }),
+    };
+});
+console.log(JSON.stringify({section_visible: !section.hidden, results: results}));
@@ -0,0 +1,43 @@
+import random
+
+from sqlalchemy import text
+
+
+def aggregates(storage):
+    with storage.get_engine().connect() as connection:
+        titles = connection.execute(text("SELECT catalog_id, owners, rating_sum, average FROM title_stats")).fetchall()
+        years = connection.execute(text("SELECT year, movies, rating_sum FROM year_stats")).fetchall()
+    # the triggers sum ratings in a different order than a rebuild does
+    return ({row.catalog_id: (row.owners, round(row.rating_sum, 6), round(row.average, 6)) for row in titles},
+            {row.year: (row.movies, round(row.rating_sum, 6)) for row in years})
+
+
+def test_triggers_match_a_rebuild(storage, capsys):
+    from movie_storage import analytics
+    rng = random.Random(0)
+    films = [(f"Film {number}", rng.choice([None, *range(1950, 2020)])) for number in range(40)]
+    user_ids = []
+    for name in ('ana', 'ben', 'cleo'):
+        storage.add_user(name)
+        user_ids.append(storage.get_user_id(name))
+    for _ in range(300):
+        user_id = rng.choice(user_ids)
+        title, year = rng.choice(films)
+        operation = rng.random()
+        if operation < 0.5:
+            storage.add_movie(title, year, round(rng.uniform(1, 10), 1), None, user_id)
+        elif operation < 0.8:
+            storage.update_movie(title, round(rng.uniform(1, 10), 1), user_id)
+        else:
+            storage.delete_movie(title, user_id)
+    with storage.batch() as writes:
+        for title, year in films[:10]:
+            writes.add_movie(title, year, 5.0, None, user_ids[0])
+            writes.update_movie(title, 7.5, user_ids[1])
+            writes.delete_movie(title, user_ids[2])
+    capsys.readouterr()
+
+    by_triggers = aggregates(storage)
+    assert by_triggers[0], "the random writes should leave some films rated"
+    assert analytics.rebuild()
+    assert aggregates(storage) == by_triggers
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import api_server
+
+
+def request(username, body, title=None):
+    params = {'username': username} if title is None else {'username': username, 'title': title}
+    return api_server.Request('POST', params, {}, {}, json.dumps(body).encode('utf-8'))
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'title': 'Alien', 'year': 'abc', 'rating': 8}, 'year must be an integer or null'),
+    ({'title': 'Alien', 'year': True, 'rating': 8}, 'year must be an integer or null'),
+    ({'title': 'Alien', 'year': 1979, 'rating': 80}, 'rating must be between 1 and 10'),
+    ({'title': 'Alien', 'year': 1979, 'rating': 'high'}, 'rating must be a number'),
+])
+def test_add_movie_rejects_bad_fields(storage, body, message):
+    storage.add_user('ana')
+    with pytest.raises(api_server.HTTPError) as error:
+        api_server.add_movie(request('ana', body), None)
+    assert (error.value.status, error.value.message) == (400, message)
+    assert storage.count_movies(storage.get_user_id('ana')) == 0
+
+
+def test_add_and_update_movie(storage):
+    storage.add_user('ana')
+    status, movie, _ = api_server.add_movie(request('ana', {'title': 'Alien', 'year': None, 'rating': 8}), None)
+    assert (status, movie) == (201, {'title': 'Alien', 'year': None, 'rating': 8.0})
+    with pytest.raises(api_server.HTTPError) as error:
+        api_server.add_movie(request('ana', {'title': 'Alien', 'year': None, 'rating': 8}), None)
+    assert error.value.status == 409
+    with pytest.raises(api_server.HTTPError) as error:
+        api_server.update_movie(request('ana', {'rating': 0}, 'Alien'), None)
+    assert error.value.status == 400
+    assert api_server.update_movie(request('ana', {'rating': 9.5}, 'Alien'), None)[0] == 200
+
+
+def test_mirrored_poster_changes_etag(storage):
+    storage.add_user('ana')
+    storage.add_movie('Alien', 1979, 8.0, 'http://example.com/alien.jpg', storage.get_user_id('ana'))
+    get = api_server.Request('GET', {'username': 'ana'}, {}, {}, b'')
+    status, movies, headers = api_server.get_movies(get, '/users/ana/movies')
+    assert status == 200 and movies['movies'][0]['thumbnail'] is None
+    cached = api_server.Request('GET', {'username': 'ana'}, {}, {'if-none-match': headers['ETag']}, b'')
+    assert api_server.get_movies(cached, '/users/ana/movies')[0] == 304
+    storage.save_mirrored_posters([{'url': 'http://example.com/alien.jpg', 'content_hash': 'abc',
+                                    'image_path': 'posters/abc.jpg', 'thumbnail_path': 'posters/abc_thumb.jpg'}])
+    status, movies, _ = api_server.get_movies(cached, '/users/ana/movies')
+    assert status == 200 and movies['movies'][0]['thumbnail'] == 'posters/abc_thumb.jpg'
@@ -0,0 +1,44 @@
+from sqlalchemy import text
+
+
+def catalog_rows(storage):
+    with storage.get_engine().connect() as connection:
+        return [tuple(row) for row in connection.execute(text("SELECT id, title, year, imdb_id FROM catalog ORDER BY id"))]
+
+
+def test_new_films_are_added_once_per_chunk(storage, monkeypatch, capsys):
+    storage.add_user('ana')
+    storage.add_user('ben')
+    add_to_catalog = storage._add_to_catalog
+    inserts = []
+    monkeypatch.setattr(storage, '_add_to_catalog',
+                        lambda connection, films: inserts.append(len(films)) or add_to_catalog(connection, films))
+    added, duplicates = storage.add_movies([
+        {'title': 'Alien', 'year': 1979, 'rating': 8.0, 'poster': None, 'imdb_id': 'tt1'},
+        {'title': 'Heat', 'year': 1995, 'rating': 7.0, 'poster': None},
+        # the same film as the one before, now with its IMDb ID
+        {'title': 'heat', 'year': 1995, 'rating': 6.0, 'poster': None, 'imdb_id': 'tt2'},
+        # same title and year, but a different film
+        {'title': 'Heat', 'year': 1995, 'rating': 5.0, 'poster': None, 'imdb_id': 'tt3'},
+        {'title': 'Brazil', 'year': 1985, 'rating': 9.0, 'poster': None},
+    ], storage.get_user_id('ana'), chunk_size=3)
+    assert added == ['Alien', 'Heat', 'Brazil']
+    assert duplicates == ['Heat', 'Heat']
+    assert inserts == [2, 2]
+    assert [row[1:] for row in catalog_rows(storage)] == [('Alien', 1979, 'tt1'), ('Heat', 1995, 'tt2'),
+                                                         ('Heat', 1995, 'tt3'), ('Brazil', 1985, None)]
+
+    # every new film is in the trigram index under its own id
+    with storage.get_engine().connect() as connection:
+        indexed = connection.execute(text("SELECT DISTINCT catalog_id FROM title_trigrams ORDER BY catalog_id"))
+        assert list(indexed.scalars()) == [row[0] for row in catalog_rows(storage)]
+
+    # a later add finds the rows instead of inserting them again
+    inserts.clear()
+    ben_id = storage.get_user_id('ben')
+    assert storage.add_movies([{'title': 'ALIEN', 'year': 1979, 'rating': 6.0, 'poster': None},
+                               {'title': 'Brazil', 'year': 1985, 'rating': 6.0, 'poster': None}], ben_id)[0] \
+        == ['Alien', 'Brazil']
+    assert inserts == []
+    assert len(catalog_rows(storage)) == 4
+    capsys.readouterr()
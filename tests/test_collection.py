@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from movie_storage import collection
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    """Run a test with the NumPy code paths and again with plain Python."""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(collection, '_numpy', None)
+    else:
+        monkeypatch.setattr(collection, '_numpy', False)
+    return request.param
+
+
+def assert_matches_storage(storage, user_id, movies):
+    stats, expected = movies.stats(), storage.get_stats(user_id)
+    assert stats['average'] == pytest.approx(expected.pop('average'))
+    assert stats['median'] == pytest.approx(expected.pop('median'))
+    assert {key: value for key, value in stats.items() if key not in ('average', 'median')} == expected
+    assert list(movies.items()) == [(title, {'year': info['year'], 'rating': info['rating']})
+                                    for title, info in storage.iter_movies(user_id)]
+    assert list(movies.by_rating()) == [(title, {'year': info['year'], 'rating': info['rating']})
+                                        for title, info in storage.iter_movies(user_id, order_by='rating')]
+
+
+def test_collection_matches_sql(storage, backend, capsys):
+    rng = random.Random(3)
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    # few distinct ratings, so best, worst and the rating order have ties
+    storage.add_movies([{'title': f"Film {number}", 'year': rng.choice([None, 1980, 1999, 2010]),
+                         'rating': rng.choice([2.0, 5.5, 7.0, 9.0]), 'poster': None} for number in range(41)], user_id)
+    movies = storage.load_collection(user_id)
+    assert len(movies) == 41
+    assert_matches_storage(storage, user_id, movies)
+
+    # an even count, then writes applied to both sides
+    storage.delete_movie('Film 7', user_id)
+    assert movies.remove('Film 7')
+    storage.add_movie('Aardvark', None, 1.0, None, user_id)
+    assert movies.insert('Aardvark', None, 1.0)
+    storage.update_movie('Film 12', 10.0, user_id)
+    assert movies.set_rating('film 12', 10.0)
+    capsys.readouterr()
+    assert not movies.insert('FILM 3', 2000, 5.0)
+    assert not movies.remove('Missing')
+    assert_matches_storage(storage, user_id, movies)
+
+
+def test_empty_collection(storage, backend):
+    storage.add_user('ana')
+    movies = storage.load_collection(storage.get_user_id('ana'))
+    assert len(movies) == 0 and movies.stats() is None
@@ -0,0 +1,75 @@
+import pytest
+
+from movie_storage import collection_cache
+
+
+@pytest.fixture
+def cache(storage, monkeypatch, capsys):
+    """collection_cache on a fresh database; returns (module, user id, list counting collection loads)."""
+    collection_cache.invalidate()
+    loads = []
+    load_collection = storage.load_collection
+    monkeypatch.setattr(storage, 'load_collection', lambda user_id: loads.append(user_id) or load_collection(user_id))
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': f"Film {number}", 'year': 2000, 'rating': float(number), 'poster': None}
+                        for number in range(1, 6)], user_id)
+    capsys.readouterr()
+    yield collection_cache, user_id, loads
+    collection_cache.invalidate()
+
+
+def titles(movies):
+    return [title for title, _ in movies.items()]
+
+
+def test_reads_are_served_from_the_cache(cache):
+    collection_cache, user_id, loads = cache
+    first = collection_cache.get_collection(user_id)
+    assert collection_cache.get_collection(user_id) is first
+    assert collection_cache.get_stats(user_id)['max'] == 5.0
+    assert loads == [user_id]
+
+
+def test_writes_through_the_cache_are_applied_without_reloading(cache, storage, capsys):
+    collection_cache, user_id, loads = cache
+    collection_cache.get_collection(user_id)
+    assert collection_cache.add_movie('film 0', 1999, 9.5, None, user_id)
+    assert collection_cache.update_movie('Film 1', 8.0, user_id)
+    assert collection_cache.delete_movie('Film 2', user_id)
+    assert not collection_cache.delete_movie('Film 2', user_id)
+    capsys.readouterr()
+    movies = collection_cache.get_collection(user_id)
+    assert loads == [user_id]
+    assert list(movies.items()) == [(title, {'year': info['year'], 'rating': info['rating']})
+                                    for title, info in storage.iter_movies(user_id)]
+
+
+def test_changes_from_elsewhere_reload(cache, storage, capsys):
+    collection_cache, user_id, loads = cache
+    collection_cache.get_collection(user_id)
+    # another process (or code bypassing the cache) changes the collection
+    storage.delete_movie('Film 3', user_id)
+    assert 'Film 3' not in titles(collection_cache.get_collection(user_id))
+    assert len(loads) == 2
+    # a write through the cache right after someone else's cannot be applied in place
+    storage.add_movie('Other', 2000, 5.0, None, user_id)
+    collection_cache.add_movie('Mine', 2000, 5.0, None, user_id)
+    capsys.readouterr()
+    assert {'Other', 'Mine'} <= set(titles(collection_cache.get_collection(user_id)))
+    assert len(loads) == 3
+
+
+def test_switching_users_and_large_collections(cache, storage, monkeypatch, capsys):
+    collection_cache, user_id, loads = cache
+    storage.add_user('ben')
+    ben = storage.get_user_id('ben')
+    storage.add_movie('Heat', 1995, 9.0, None, ben)
+    capsys.readouterr()
+    assert titles(collection_cache.get_collection(user_id))[0] == 'Film 1'
+    assert titles(collection_cache.get_collection(ben)) == ['Heat']
+    assert loads == [user_id, ben]
+    monkeypatch.setattr(collection_cache, 'MAX_CACHED_MOVIES', 3)
+    assert collection_cache.get_collection(user_id) is None
+    # stats then come from SQL
+    assert collection_cache.get_stats(user_id)['count'] == 5
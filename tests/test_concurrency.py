@@ -0,0 +1,91 @@
+import multiprocessing
+import random
+import sqlite3
+import threading
+
+from sqlalchemy import text
+
+
+def lock_database(storage, seconds):
+    """Hold the write lock from another connection; release it after `seconds` (None: keep it)."""
+    path = storage.DB_URL.removeprefix('sqlite:///')
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute('BEGIN IMMEDIATE')
+    if seconds is not None:
+        threading.Timer(seconds, connection.rollback).start()
+    return connection
+
+
+def test_connections_use_wal_and_a_busy_timeout(storage):
+    with storage.get_engine().connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == storage.BUSY_TIMEOUT_MS
+
+
+def test_a_locked_write_is_retried(storage, monkeypatch, capsys):
+    monkeypatch.setattr(storage, 'BUSY_TIMEOUT_MS', 20)
+    monkeypatch.setattr(storage, '_write_stats', {'retries': 0, 'backoff_seconds': 0.0})
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    locker = lock_database(storage, 0.3)
+    try:
+        assert storage.add_movie('Alien', 1979, 8.0, None, user_id)
+    finally:
+        locker.close()
+    assert storage.write_stats()['retries'] > 0
+    assert storage.count_movies(user_id) == 1
+    capsys.readouterr()
+
+
+def test_a_write_gives_up_after_the_retries(storage, monkeypatch, capsys):
+    monkeypatch.setattr(storage, 'BUSY_TIMEOUT_MS', 20)
+    monkeypatch.setattr(storage, 'WRITE_RETRIES', 2)
+    monkeypatch.setattr(storage, '_write_stats', {'retries': 0, 'backoff_seconds': 0.0})
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    locker = lock_database(storage, None)
+    try:
+        assert not storage.add_movie('Alien', 1979, 8.0, None, user_id)
+    finally:
+        locker.rollback()
+        locker.close()
+    assert 'database is locked' in capsys.readouterr().out
+    assert storage.write_stats()['retries'] == 2
+    assert storage.count_movies(user_id) == 0
+
+
+def write_randomly(user_id, seed, steps):
+    """Add, re-rate and delete a handful of shared titles; run in its own process."""
+    from movie_storage import movie_storage_sql as storage
+    rng = random.Random(seed)
+    for _ in range(steps):
+        title, rating = f"Film {rng.randrange(6)}", float(rng.randint(1, 10))
+        operation = rng.random()
+        if operation < 0.3:
+            storage.add_movie(title, 2000, rating, None, user_id)
+        elif operation < 0.8:
+            storage.update_movie(title, rating, user_id)
+        else:
+            storage.delete_movie(title, user_id)
+
+
+def test_concurrent_writers_keep_user_stats_exact(storage, monkeypatch):
+    # workers are spawned, so they import storage again and read the URL from the environment
+    monkeypatch.setenv('MOVIES_DB_URL', storage.DB_URL)
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    context = multiprocessing.get_context('spawn')
+    writers = [context.Process(target=write_randomly, args=(user_id, seed, 150)) for seed in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    assert [writer.exitcode for writer in writers] == [0] * 4
+
+    with storage.get_engine().connect() as connection:
+        stats = connection.execute(text("SELECT movie_count, rating_sum, min_rating, max_rating FROM user_stats "
+                                        "WHERE user_id = :user_id"), {"user_id": user_id}).one()
+        actual = connection.execute(text("SELECT COUNT(*), COALESCE(SUM(user_rating), 0), MIN(user_rating), "
+                                         "MAX(user_rating) FROM user_movies WHERE user_id = :user_id"),
+                                    {"user_id": user_id}).one()
+    assert tuple(stats) == tuple(actual)
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from movie_storage.fuzzy import bounded_distance
+
+
+def levenshtein(word1, word2):
+    previous = list(range(len(word2) + 1))
+    for i, char1 in enumerate(word1, start=1):
+        current = [i]
+        for j, char2 in enumerate(word2, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char1 != char2)))
+        previous = current
+    return previous[-1]
+
+
+def test_bounded_distance_matches_levenshtein():
+    rng = random.Random(7)
+    for _ in range(2000):
+        word1 = ''.join(rng.choice('abc ') for _ in range(rng.randrange(12)))
+        word2 = ''.join(rng.choice('abc ') for _ in range(rng.randrange(12)))
+        limit = rng.randrange(6)
+        distance = levenshtein(word1, word2)
+        assert bounded_distance(word1, word2, limit) == (distance if distance <= limit else None)
+
+
+TITLES = ['The Godfather', 'The Godfather Part Ii', 'Goodfellas', 'The Good, The Bad And The Ugly', 'Gladiator',
+          'Alien', 'Aliens', 'Heat', 'The Matrix', 'The Dark Knight', 'Interstellar', 'Inception']
+
+
+@pytest.mark.parametrize('scan_movies', [1000, 0], ids=['scan', 'trigram index'])
+def test_suggestions(storage, monkeypatch, capsys, scan_movies):
+    monkeypatch.setattr(storage, 'SUGGESTION_SCAN_MOVIES', scan_movies)
+    storage.add_user('ana')
+    storage.add_user('ben')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': title, 'year': 2000, 'rating': 7.0, 'poster': None} for title in TITLES], user_id)
+    # in the catalog, but not in ana's collection
+    storage.add_movie('The Godfathers', 2000, 7.0, None, storage.get_user_id('ben'))
+    capsys.readouterr()
+
+    assert storage.suggest_titles(user_id, 'the godfahter') == ['The Godfather']
+    assert storage.suggest_titles(user_id, 'Alein')[:2] == ['Alien', 'Aliens']
+    assert storage.suggest_titles(user_id, 'intersteller') == ['Interstellar']
+    assert storage.suggest_titles(user_id, 'Inceptoin', limit=1) == ['Inception']
+    assert storage.suggest_titles(user_id, 'zzzzzzzz') == []
@@ -0,0 +1,33 @@
+import json
+import os
+import shutil
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_sites_are_built_in_parallel_and_failures_isolated(storage, tmp_path, monkeypatch, capsys):
+    import generate_website
+    # workers started with spawn or forkserver import storage again and read the URL from the environment
+    monkeypatch.setenv('MOVIES_DB_URL', storage.DB_URL)
+    os.makedirs('_static')
+    shutil.copy(os.path.join(REPO, '_static', 'index_template.html'), '_static')
+    for username in ('ana', 'ben', 'no/such/dir'):
+        storage.add_user(username)
+        storage.add_movies([{'title': f"{username} film {number}", 'year': 2000 + number, 'rating': 6.0,
+                             'poster': None} for number in range(3)], storage.get_user_id(username))
+
+    failures = generate_website.generate_all_websites(workers=2)
+    output = capsys.readouterr().out
+    assert failures == ['no/such/dir']
+    assert 'FAILED no/such/dir' in output and '2 of 3 sites built' in output
+    for username in ('ana', 'ben'):
+        with open(generate_website.page_file_name(username, 1), encoding='utf-8') as page:
+            assert page.read().count('class="movie-card"') == 3
+        with open(os.path.join(generate_website.MANIFEST_DIR, f"{username}.json"), encoding='utf-8') as manifest:
+            assert json.load(manifest)['version'] == storage.get_version(storage.get_user_id(username))
+    assert os.path.exists(generate_website.LEADERBOARDS_HTML_FILE)
+
+    # only the named users are built, and their sites are up to date
+    assert generate_website.generate_all_websites(['ben'], workers=1) == []
+    output = capsys.readouterr().out
+    assert 'Built ben' in output and 'ana' not in output and '1 of 1 sites built' in output
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def site(storage, monkeypatch, capsys):
+    """A three-page site of 30 movies for one user; returns (generate_website module, user id, written paths)."""
+    import generate_website
+    os.makedirs('_static')
+    shutil.copy(os.path.join(REPO, '_static', 'index_template.html'), '_static')
+    monkeypatch.setattr(generate_website, 'PAGE_SIZE', 10)
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': f"Movie {number:02}", 'year': 1990 + number, 'rating': 5.0, 'poster': None}
+                        for number in range(30)], user_id)
+    generate_website.generate_website(user_id, 'ana')
+    written = []
+    for name in ('write_page', 'save_file'):
+        original = getattr(generate_website, name)
+        monkeypatch.setattr(generate_website, name,
+                            lambda path, *args, original=original: written.append(path) or original(path, *args))
+    capsys.readouterr()
+    return generate_website, user_id, written
+
+
+def manifest_file():
+    import generate_website
+    return os.path.join(generate_website.MANIFEST_DIR, 'ana.json')
+
+
+def page_titles(generate_website, page):
+    with open(generate_website.page_file_name('ana', page), encoding='utf-8') as file:
+        return file.read().count('class="movie-card"')
+
+
+def search_index(generate_website):
+    with open(generate_website.search_index_file_name('ana'), encoding='utf-8') as file:
+        return json.loads(file.read().removeprefix('window.MOVIE_SEARCH_INDEX = ').rstrip(';\n'))
+
+
+def test_unchanged_collection_writes_nothing(site, storage, monkeypatch):
+    generate_website, user_id, written = site
+    monkeypatch.setattr(storage, 'iter_movies', lambda *args, **kwargs: pytest.fail('rows were read'))
+    generate_website.generate_website(user_id, 'ana')
+    assert written == []
+
+
+def test_rating_change_only_rewrites_manifest(site, storage):
+    generate_website, user_id, written = site
+    storage.update_movie('Movie 05', 9.0, user_id)
+    generate_website.generate_website(user_id, 'ana')
+    # ratings are not shown on the pages; the manifest records the new version
+    assert written == [manifest_file()]
+    written.clear()
+    generate_website.generate_website(user_id, 'ana')
+    assert written == []
+
+
+def test_adding_an_early_title_rewrites_one_page(site, storage):
+    generate_website, user_id, written = site
+    storage.add_movie('Aaa First', 2000, 7.0, None, user_id)
+    generate_website.generate_website(user_id, 'ana')
+    assert sorted(written) == sorted([generate_website.page_file_name('ana', 1),
+                                      generate_website.search_index_file_name('ana'), manifest_file()])
+    assert [page_titles(generate_website, page) for page in (1, 2, 3)] == [11, 10, 10]
+    index = search_index(generate_website)
+    assert index['page_starts'] == [0, 11, 21] and index['titles'][11] == 'Movie 10'
+
+
+def test_deleting_a_title_rewrites_one_page(site, storage):
+    generate_website, user_id, written = site
+    storage.delete_movie('Movie 15', user_id)
+    generate_website.generate_website(user_id, 'ana')
+    assert sorted(written) == sorted([generate_website.page_file_name('ana', 2),
+                                      generate_website.search_index_file_name('ana'), manifest_file()])
+    assert [page_titles(generate_website, page) for page in (1, 2, 3)] == [10, 9, 10]
+
+
+def test_cards_are_read_one_page_at_a_time(site, storage, monkeypatch):
+    generate_website, user_id, written = site
+    movie_page = storage.movie_page
+    reads = []
+    monkeypatch.setattr(storage, 'movie_page', lambda user_id, order_by, limit, after=None:
+                        reads.append((limit, after)) or movie_page(user_id, order_by, limit, after))
+    generate_website.generate_website(user_id, 'ana', incremental=False)
+    assert reads == [(10, None), (10, (None, 'Movie 09')), (10, (None, 'Movie 19'))]
+    assert [page_titles(generate_website, page) for page in (1, 2, 3)] == [10, 10, 10]
+    with open(generate_website.page_file_name('ana', 2), encoding='utf-8') as file:
+        page = file.read()
+    assert 'Movie 10' in page and 'Movie 19' in page and 'Movie 09' not in page
+
+
+def test_layout_pages(monkeypatch):
+    import generate_website
+    monkeypatch.setattr(generate_website, 'PAGE_SIZE', 10)
+    keys = [f"{number:03}" for number in range(45)]
+    assert generate_website.layout_pages(keys, []) == [(0, 10), (10, 20), (20, 30), (30, 40), (40, 45)]
+    # an empty page is dropped, a page under PAGE_SIZE // 4 joins its predecessor,
+    # and a page over 2 * PAGE_SIZE is split evenly
+    old_pages = [{'first': first} for first in ('000', '010', '0100', '0101', '020', '044')]
+    assert generate_website.layout_pages(keys, old_pages) == [(0, 11), (11, 20), (20, 28), (28, 36), (36, 45)]
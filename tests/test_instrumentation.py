@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+import instrumentation
+
+
+def test_failed_statements_are_counted_and_popped(monkeypatch):
+    monkeypatch.setattr(instrumentation, '_commands', {})
+    engine = create_engine('sqlite://')
+    event.listen(engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+    event.listen(engine, 'handle_error', instrumentation._handle_error)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing_table"))
+        assert connection.info['query_started'] == []
+    assert instrumentation.report()[instrumentation.OUTSIDE_COMMANDS]['queries'] == 4
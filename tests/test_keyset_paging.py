@@ -0,0 +1,45 @@
+import random
+
+
+def test_pages_cover_the_collection_in_order(storage, capsys):
+    rng = random.Random(5)
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    # many rating ties, so page boundaries fall inside runs of equal ratings
+    storage.add_movies([{'title': f"{rng.choice(['The ', '', 'a '])}Film {number}", 'year': 2000,
+                         'rating': rng.choice([3.0, 6.5, 8.0]), 'poster': None} for number in range(57)], user_id)
+    capsys.readouterr()
+    movies = storage.list_movies(user_id)
+    by_title = sorted(movies, key=lambda title: ' '.join(title.casefold().split()))
+    by_rating = sorted(by_title, key=lambda title: -movies[title]['rating'])
+
+    for chunk_size in (1, 5, 19, 57, 100):
+        assert [title for title, _ in storage.iter_movies(user_id, chunk_size=chunk_size)] == by_title
+        assert [title for title, _ in storage.iter_movies(user_id, 'rating', chunk_size=chunk_size)] == by_rating
+    assert dict(storage.iter_movies(user_id)) == movies
+
+
+def test_movie_page_continues_after_a_row(storage, capsys):
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': title, 'year': 2000, 'rating': rating, 'poster': None}
+                        for title, rating in [('Alien', 8.0), ('Brazil', 8.0), ('Cube', 5.0), ('Dune', 9.0)]], user_id)
+    capsys.readouterr()
+    first = storage.movie_page(user_id, 'rating', 2)
+    assert [title for title, _ in first] == ['Dune', 'Alien']
+    title, info = first[-1]
+    assert [title for title, _ in storage.movie_page(user_id, 'rating', 2, (info['rating'], title))] == ['Brazil', 'Cube']
+    assert [title for title, _ in storage.movie_page(user_id, 'title', 10, (None, 'brazil'))] == ['Cube', 'Dune']
+    assert storage.movie_page(user_id, 'title', 10, (None, 'Dune')) == []
+
+
+def test_top_and_bottom_movies(storage, capsys):
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': title, 'year': 2000, 'rating': rating, 'poster': None}
+                        for title, rating in [('Alien', 8.0), ('Brazil', 3.0), ('Cube', 3.0), ('Dune', 9.0)]], user_id)
+    capsys.readouterr()
+    assert [title for title, _ in storage.top_movies(user_id, 2)] == ['Dune', 'Alien']
+    # worst first, ties in reverse title order
+    assert [title for title, _ in storage.bottom_movies(user_id, 3)] == ['Cube', 'Brazil', 'Alien']
+    assert storage.bottom_movies(user_id, 1)[0][1]['rating'] == 3.0
@@ -0,0 +1,51 @@
+import pytest
+
+import migrate
+
+MOVIES = [
+    {'title': 'Alien', 'year': 1979, 'rating': 8.5, 'poster': 'http://example.com/alien.jpg'},
+    {'title': 'Lost Reel', 'year': None, 'rating': 6.0, 'poster': None},
+    {'title': 'Amélie, "Le Fabuleux"', 'year': 2001, 'rating': 7.5, 'poster': None},
+    {'title': 'Heat', 'year': 1995, 'rating': 9.0, 'poster': 'http://example.com/heat.jpg'},
+    {'title': 'Zodiac', 'year': None, 'rating': 7.0, 'poster': 'http://example.com/zodiac.jpg'},
+]
+
+
+def collection(storage, username):
+    return [(title, info['year'], info['rating'], info['poster'])
+            for title, info in storage.iter_movies(storage.get_user_id(username))]
+
+
+@pytest.mark.parametrize('extension', ['.json', '.ndjson', '.csv'])
+def test_round_trip_through_a_file(storage, tmp_path, monkeypatch, capsys, extension):
+    # small reads and batches, so entries straddle chunk and batch boundaries
+    monkeypatch.setattr(migrate, 'READ_CHUNK', 16)
+    storage.add_user('ana')
+    storage.add_movies(MOVIES, storage.get_user_id('ana'))
+    path = str(tmp_path / f"ana{extension}")
+
+    exported = migrate.migrate('sql', path, 'ana', batch_size=2)
+    imported = migrate.migrate(path, 'sql', 'ben', batch_size=2)
+    capsys.readouterr()
+    assert exported['rows'] == imported['rows'] == imported['added'] == len(MOVIES)
+    # the films match ana's catalog rows, so even the legacy .json (which has no posters) keeps them
+    assert collection(storage, 'ben') == collection(storage, 'ana')
+
+
+def test_convert_between_files_and_skip_duplicates(storage, tmp_path, capsys):
+    storage.add_user('ana')
+    storage.add_movies(MOVIES, storage.get_user_id('ana'))
+    ndjson, csv = str(tmp_path / 'ana.ndjson'), str(tmp_path / 'ana.csv')
+    migrate.migrate('sql', ndjson, 'ana')
+    migrate.migrate(ndjson, csv)
+    summary = migrate.migrate(csv, 'sql', 'ana')
+    capsys.readouterr()
+    assert (summary['added'], summary['duplicates'], summary['failed']) == (0, len(MOVIES), 0)
+
+
+def test_unknown_source_creates_no_user(storage, tmp_path, capsys):
+    with pytest.raises(ValueError):
+        migrate.migrate(str(tmp_path / 'movies.xml'), 'sql', 'ana')
+    with pytest.raises(FileNotFoundError):
+        migrate.migrate(str(tmp_path / 'missing.csv'), 'sql', 'ana')
+    assert storage.get_user_id('ana') is None
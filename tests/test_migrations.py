@@ -0,0 +1,82 @@
+import sqlite3
+
+from sqlalchemy import text
+
+from movie_storage.fuzzy import trigrams
+
+POSTER = 'https://m.media-amazon.com/images/M/sherlock.jpg'
+
+
+def create_version_0_database(path):
+    """The schema and kind of rows of the original data/movies.db (PRAGMA user_version 0)."""
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL
+        );
+        CREATE TABLE movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            rating REAL NOT NULL,
+            poster TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+            UNIQUE(title, user_id)
+        );
+        INSERT INTO users (username) VALUES ('waad'), ('ghost'), ('john');
+    """)
+    connection.executemany("INSERT INTO movies (title, year, rating, poster, user_id) VALUES (?, ?, ?, ?, ?)", [
+        ('Sherlock Holmes', 2009, 7.5, 'N/A', 1),
+        ('Interstellar', 2014, 8.7, 'https://m.media-amazon.com/images/M/interstellar.jpg', 1),
+        # differs from waad's first title only in case and spacing, so it is merged into it
+        ('sherlock  holmes', 2009, 6.0, POSTER, 1),
+        # the same film in another collection shares its catalog row
+        ('Sherlock Holmes', 2009, 9.0, POSTER, 2),
+        ('Carry-On', 2024, 6.5, '', 2),
+    ])
+    connection.commit()
+    connection.close()
+
+
+def test_migrate_a_version_0_database(storage, tmp_path, monkeypatch, capsys):
+    create_version_0_database(tmp_path / 'movies.db')
+    waad = storage.get_user_id('waad')  # opening the engine runs every migration
+    assert 'Merged 1 movies' in capsys.readouterr().out
+    ghost, john = storage.get_user_id('ghost'), storage.get_user_id('john')
+    with storage.get_engine().connect() as connection:
+        assert connection.execute(text("PRAGMA user_version")).scalar() == storage.SCHEMA_VERSION
+        catalog = {row.title: row for row in connection.execute(text("SELECT * FROM catalog"))}
+        view = connection.execute(text("SELECT title, year, rating, poster, user_id FROM movies ORDER BY id")).fetchall()
+        stats = {row.user_id: tuple(row)[1:5] for row in connection.execute(text(
+            "SELECT user_id, movie_count, rating_sum, min_rating, max_rating FROM user_stats"))}
+        postings = {(row.trigram, row.catalog_id) for row in connection.execute(text("SELECT * FROM title_trigrams"))}
+        fts = connection.execute(text("SELECT rowid FROM catalog_fts WHERE catalog_fts MATCH 'lock'")).scalars().all()
+
+    assert sorted(catalog) == ['Carry-On', 'Interstellar', 'Sherlock Holmes']
+    sherlock = catalog['Sherlock Holmes']
+    # the real poster wins over N/A, and the users' ratings are not IMDb ratings
+    assert (sherlock.year, sherlock.poster, sherlock.imdb_rating, sherlock.imdb_id) == (2009, POSTER, None, None)
+    assert catalog['Carry-On'].poster is None
+    assert view == [('Sherlock Holmes', 2009, 7.5, POSTER, waad),
+                    ('Interstellar', 2014, 8.7, 'https://m.media-amazon.com/images/M/interstellar.jpg', waad),
+                    ('Sherlock Holmes', 2009, 9.0, POSTER, ghost),
+                    ('Carry-On', 2024, 6.5, None, ghost)]
+    assert storage.get_movie('SHERLOCK holmes', waad)[1]['rating'] == 7.5
+    assert storage.get_movie('Sherlock Holmes', ghost)[1]['rating'] == 9.0
+    assert stats[waad] == (2, 16.2, 7.5, 8.7)
+    assert stats[ghost] == (2, 15.5, 6.5, 9.0)
+    assert storage.count_movies(john) == 0
+    assert postings == {(gram, film.id) for film in catalog.values() for gram in trigrams(film.title)}
+    assert fts == [sherlock.id]
+
+    # search and suggestions read catalog_fts and title_trigrams rather than scanning the collection
+    monkeypatch.setattr(storage, 'SEARCH_SCAN_MOVIES', 0)
+    monkeypatch.setattr(storage, 'SUGGESTION_SCAN_MOVIES', 0)
+    assert list(storage.search_movies(ghost, 'lock')) == ['Sherlock Holmes']
+    assert storage.suggest_titles(waad, 'Intersteller') == ['Interstellar']
+    # the migrated collections keep working
+    assert storage.add_movie('Sherlock Holmes', 2009, 8.0, None, john)
+    assert storage.count_movies(john) == 1
+    assert not storage.add_movie('sherlock holmes', 2009, 8.0, None, waad)
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+from movie_storage import movie_storage_journal
+from movie_storage.movie_storage_journal import MovieJournal
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / 'data.json')
+
+
+def fill(journal, count):
+    """Add, update and delete films; returns the state the journal should be in."""
+    expected = {}
+    for number in range(count):
+        title = f"Film {number}"
+        journal.add_movie(title, 5.0, 2000 + number % 20)
+        expected[title] = {'rating': 5.0, 'year': 2000 + number % 20}
+        if number % 3 == 0:
+            journal.update_movie(title, 8.5)
+            expected[title]['rating'] = 8.5
+        if number % 7 == 0:
+            journal.delete_movie(title)
+            del expected[title]
+    return expected
+
+
+def test_a_torn_last_line_is_dropped(data_file):
+    journal = MovieJournal(data_file)
+    expected = fill(journal, 20)
+    journal.close()
+    with open(data_file + '.log', 'a', encoding='utf-8') as log:
+        log.write('{"op": "add", "title": "Half Wri')
+
+    journal = MovieJournal(data_file)
+    assert journal.list_movies() == expected
+    # the next entry starts on a line of its own
+    journal.add_movie('After Crash', 7.0, 2024)
+    journal.close()
+    expected['After Crash'] = {'rating': 7.0, 'year': 2024}
+    assert MovieJournal(data_file).list_movies() == expected
+
+
+def test_an_interrupted_compaction_is_replayed_and_finished(data_file, monkeypatch):
+    monkeypatch.setattr(movie_storage_journal, 'COMPACT_THRESHOLD', 2000)
+    # the snapshot is never written, as if the process died during compaction
+    write_snapshot = MovieJournal._write_snapshot
+    monkeypatch.setattr(MovieJournal, '_write_snapshot', lambda self, state: None)
+    journal = MovieJournal(data_file)
+    expected = fill(journal, 60)
+    journal.close()
+    assert os.path.exists(data_file + '.log.old')
+    assert not os.path.exists(data_file)
+
+    monkeypatch.setattr(MovieJournal, '_write_snapshot', write_snapshot)
+    journal = MovieJournal(data_file)
+    assert journal.list_movies() == expected
+    assert not os.path.exists(data_file + '.log.old')
+    with open(data_file, encoding='utf-8') as snapshot:
+        assert json.load(snapshot) == expected
+    journal.close()
+    assert MovieJournal(data_file).list_movies() == expected
+
+
+def test_reload_after_background_compaction(data_file, monkeypatch):
+    monkeypatch.setattr(movie_storage_journal, 'COMPACT_THRESHOLD', 2000)
+    journal = MovieJournal(data_file)
+    expected = fill(journal, 300)
+    journal.close()
+    assert os.path.exists(data_file)
+    assert not os.path.exists(data_file + '.log.old')
+    assert MovieJournal(data_file).list_movies() == expected
+
+
+def test_a_corrupt_line_in_the_middle_is_skipped(data_file, capsys):
+    journal = MovieJournal(data_file)
+    journal.add_movie('Before', 6.0, 1999)
+    journal.close()
+    with open(data_file + '.log', 'a', encoding='utf-8') as log:
+        log.write('{"op": "add", "title": \x00garbage\n')
+        log.write('{"op": "add", "title": "After", "rating": 7.0, "year": 2001}\n')
+    journal = MovieJournal(data_file)
+    assert journal.list_movies() == {'Before': {'rating': 6.0, 'year': 1999}, 'After': {'rating': 7.0, 'year': 2001}}
+    assert 'Skipping corrupt entry on line 2' in capsys.readouterr().out
+    # the log is kept as it is, and new entries still replay after the corrupt line
+    journal.update_movie('Before', 9.0)
+    journal.close()
+    assert MovieJournal(data_file).list_movies() == \
+        {'Before': {'rating': 9.0, 'year': 1999}, 'After': {'rating': 7.0, 'year': 2001}}
+
+
+def test_closed_journals_are_not_kept_alive(data_file):
+    import gc
+    import weakref
+    journal = MovieJournal(data_file)
+    journal.add_movie('Alien', 8.0, 1979)
+    journal.close()
+    reference = weakref.ref(journal)
+    del journal
+    gc.collect()
+    assert reference() is None
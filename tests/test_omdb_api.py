@@ -0,0 +1,93 @@
+import pytest
+
+from benchmarks.fake_omdb import fake_movie
+from services import omdb_cache
+
+
+def test_fetch_movie_parses_the_omdb_answer(omdb):
+    expected = fake_movie('Alien')
+    movie = omdb.fetch_movie('Alien')
+    assert movie == {'title': expected['Title'], 'year': int(expected['Year']),
+                     'rating': float(expected['imdbRating']), 'poster': expected['Poster'],
+                     'imdb_id': expected['imdbID']}
+
+
+def test_fetch_movie_answers_repeats_from_the_cache(omdb):
+    first = omdb.fetch_movie('Alien')
+    assert omdb.fetch_movie('  alien ') == first
+    assert omdb_cache.cache_stats()['upstream_calls'] == 1
+    assert omdb_cache.cache_stats()['hits'] == 1
+
+
+def test_fetch_movie_not_found(omdb):
+    assert omdb.fetch_movie('Unknown Film') is None
+    assert omdb.fetch_movie('Unknown Film') is None
+    assert omdb_cache.cache_stats()['upstream_calls'] == 1
+    assert omdb_cache.cache_stats()['negative_hits'] == 1
+
+
+def test_fetch_movie_does_not_cache_other_errors(omdb, capsys):
+    assert omdb.fetch_movie('Limited Edition') is None
+    assert "OMDB API error for 'Limited Edition': Request limit reached!" in capsys.readouterr().out
+    assert omdb.fetch_movie('Limited Edition') is None
+    assert omdb_cache.cache_stats()['upstream_calls'] == 2
+    assert omdb_cache.cache_stats()['negative_hits'] == 0
+
+
+def test_a_slow_answer_fails_the_lookup(omdb, monkeypatch, capsys):
+    from benchmarks.fake_omdb import start_server
+    server, url = start_server(latency=0.5)
+    monkeypatch.setattr(omdb, 'OMDB_URL', url)
+    monkeypatch.setattr(omdb, 'REQUEST_TIMEOUT', 0.05)
+    try:
+        with pytest.raises(omdb.OMDbError):
+            omdb.lookup_movie('Alien')
+        assert omdb.fetch_movie('Alien') is None
+        assert 'API request has failed' in capsys.readouterr().out
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert omdb_cache.cache_stats()['negative_hits'] == 0
+
+
+def test_fetch_movie_without_imdb_rating_is_not_found(omdb):
+    assert omdb.fetch_movie('Unrated Short') is None
+
+
+def test_bulk_import_reports_failed_lookups(omdb, storage, tmp_path, monkeypatch, capsys):
+    import bulk_import
+    find_catalog_movie = storage.find_catalog_movie
+
+    def flaky(title):
+        if title == 'Boom':
+            raise RuntimeError('lookup failed')
+        return find_catalog_movie(title)
+
+    monkeypatch.setattr(storage, 'find_catalog_movie', flaky)
+    titles = tmp_path / 'titles.txt'
+    titles.write_text('Alien\nUnrated Short\nUnknown Film\nBoom\nLimited Edition\nalien\n', encoding='utf-8')
+    added, duplicates, not_found, failed = bulk_import.bulk_import('ripley', str(titles), rate=1000)
+    assert added == [fake_movie('Alien')['Title']]
+    assert duplicates == []
+    assert not_found == ['Unrated Short', 'Unknown Film']
+    # an OMDb error is a failed lookup, not a film OMDb does not know
+    assert failed == ['Boom', 'Limited Edition']
+    # 'alien' repeats 'Alien', so only four titles are looked up
+    assert 'OMDb cache: 0 hits, 0 negative hits, 4 misses, 4 OMDb calls' in capsys.readouterr().out
+    assert storage.find_catalog_movie('alien')['rating'] == float(fake_movie('Alien')['imdbRating'])
+
+
+def test_cache_hits_only_touch_stale_last_used(omdb):
+    omdb.fetch_movie('Alien')
+    with omdb_cache.get_engine().connect() as connection:
+        connection.exec_driver_sql("UPDATE omdb_cache SET last_used = 0")
+        connection.commit()
+    last_used = "SELECT last_used FROM omdb_cache"
+    omdb.fetch_movie('Alien')
+    with omdb_cache.get_engine().connect() as connection:
+        touched = connection.exec_driver_sql(last_used).scalar()
+    assert touched > 0
+    omdb.fetch_movie('Alien')
+    with omdb_cache.get_engine().connect() as connection:
+        assert connection.exec_driver_sql(last_used).scalar() == touched
+    assert omdb_cache.cache_stats()['hits'] == 2
@@ -0,0 +1,104 @@
+import io
+import os
+import struct
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services import poster_mirror
+
+
+def png(color):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 600), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def poster_server():
+    """Serve images on 127.0.0.1; returns (url, paths to (status, content type, body))."""
+    pytest.importorskip('PIL')
+    routes = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, content_type, body = routes.get(self.path, (404, 'text/plain', b'not found'))
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", routes
+    server.shutdown()
+    server.server_close()
+
+
+def test_mirror_posters(storage, poster_server, capsys):
+    url, routes = poster_server
+    red, blue = png('red'), png('blue')
+    routes.update({'/alien.png': (200, 'image/png', red), '/alien-copy.png': (200, 'image/png', red),
+                   '/heat.png': (200, 'image/png', blue), '/error.png': (200, 'text/html', b'<h1>Oops</h1>'),
+                   '/cut.png': (200, 'image/png', blue[:len(blue) // 2])})
+    urls = [f"{url}/alien.png", f"{url}/alien-copy.png", f"{url}/heat.png", f"{url}/gone.png", None, 'N/A',
+            f"{url}/error.png", f"{url}/cut.png"]
+
+    mirrored, failed = poster_mirror.mirror_posters(urls, workers=4)
+    capsys.readouterr()
+    assert sorted(failed) == sorted([f"{url}/gone.png", f"{url}/error.png", f"{url}/cut.png"])
+    by_url = {poster['url']: poster for poster in mirrored}
+    assert sorted(by_url) == sorted(urls[:3])
+    # the two copies of the same image share one file
+    assert by_url[urls[0]]['image_path'] == by_url[urls[1]]['image_path'] != by_url[urls[2]]['image_path']
+    assert sorted(os.listdir(os.path.join('_static', 'posters'))) == sorted(
+        {os.path.basename(path) for poster in mirrored for path in (poster['image_path'], poster['thumbnail_path'])})
+    assert len(os.listdir(os.path.join('_static', 'posters'))) == 4
+    from PIL import Image
+    with Image.open(os.path.join('_static', by_url[urls[2]]['thumbnail_path'])) as thumbnail:
+        assert thumbnail.format == 'JPEG'
+        assert thumbnail.size[0] <= poster_mirror.THUMBNAIL_SIZE[0]
+        assert thumbnail.size[1] <= poster_mirror.THUMBNAIL_SIZE[1]
+
+
+def undecodable_png():
+    """A PNG whose chunks all check out (so Image.verify() passes) but whose pixel data does not decompress."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return png('blue')[:33] + chunk(b'IDAT', b'not zlib data') + chunk(b'IEND', b'')
+
+
+def test_failed_poster_keeps_files_it_did_not_write(storage, poster_server, capsys):
+    import hashlib
+    url, routes = poster_server
+    broken = undecodable_png()
+    routes['/broken.png'] = (200, 'image/png', broken)
+    posters = os.path.join('_static', 'posters')
+    os.makedirs(posters)
+    existing = os.path.join(posters, f"{hashlib.sha256(broken).hexdigest()}.png")
+    with open(existing, 'wb') as file:
+        file.write(broken)
+
+    mirrored, failed = poster_mirror.mirror_posters([f"{url}/broken.png"], workers=1)
+    capsys.readouterr()
+    assert (mirrored, failed) == ([], [f"{url}/broken.png"])
+    # the file was there before, and no partial thumbnail is left behind
+    assert os.listdir(posters) == [os.path.basename(existing)]
+
+
+def test_oversized_poster_is_refused(storage, poster_server, monkeypatch, capsys):
+    url, routes = poster_server
+    routes['/big.png'] = (200, 'image/png', png('red'))
+    monkeypatch.setattr(poster_mirror, 'MAX_POSTER_BYTES', 100)
+    mirrored, failed = poster_mirror.mirror_posters([f"{url}/big.png"], workers=1)
+    assert 'larger than 100 bytes' in capsys.readouterr().out
+    assert (mirrored, failed) == ([], [f"{url}/big.png"])
+    assert os.listdir(os.path.join('_static', 'posters')) == []
@@ -0,0 +1,25 @@
+import collections
+
+
+def test_random_movie_is_uniform_over_a_sparse_collection(storage, monkeypatch):
+    # ana's ids are spread out between ben's, so most draws miss
+    for name in ('ana', 'ben'):
+        storage.add_user(name)
+    ana, ben = storage.get_user_id('ana'), storage.get_user_id('ben')
+    for number in range(40):
+        storage.add_movies([{'title': f"Film {number}-{copy}", 'year': 2000, 'rating': 5.0, 'poster': None}
+                            for copy in range(1 if number % 4 == 0 else 0, 10)], ben)
+        if number % 4 == 0:
+            storage.add_movie(f"Film {number}", 2000, 5.0, None, ana)
+    counts = collections.Counter(storage.random_movie(ana)[0] for _ in range(2000))
+    assert sorted(counts) == sorted(f"Film {number}" for number in range(0, 40, 4))
+    assert min(counts.values()) > 120
+
+    # with no draws left the (user_id) index walk still picks every movie
+    monkeypatch.setattr(storage, 'RANDOM_PICK_ROUNDS', 0)
+    assert {storage.random_movie(ana)[0] for _ in range(300)} == set(counts)
+
+
+def test_random_movie_of_an_empty_collection(storage):
+    storage.add_user('ana')
+    assert storage.random_movie(storage.get_user_id('ana')) is None
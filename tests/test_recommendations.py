@@ -0,0 +1,47 @@
+import random
+
+import pytest
+from sqlalchemy import text
+
+
+def neighbor_lists(storage):
+    with storage.get_engine().connect() as connection:
+        rows = connection.execute(text("SELECT catalog_id, neighbor_id, similarity FROM item_neighbors")).fetchall()
+    lists = {}
+    for row in rows:
+        lists.setdefault(row.catalog_id, []).append((row.neighbor_id, round(row.similarity, 9)))
+    return {catalog_id: sorted(neighbors) for catalog_id, neighbors in lists.items()}
+
+
+def test_refresh_matches_a_rebuild(storage, monkeypatch, capsys):
+    pytest.importorskip('numpy')
+    from movie_storage import recommendations
+    # short lists, so changes push neighbors out and force full recomputes
+    monkeypatch.setattr(recommendations, 'NEIGHBORS', 3)
+    rng = random.Random(1)
+    films = [f"Film {number}" for number in range(25)]
+    user_ids = []
+    for number in range(8):
+        storage.add_user(f"user{number}")
+        user_ids.append(storage.get_user_id(f"user{number}"))
+    for user_id in user_ids:
+        storage.add_movies([{'title': title, 'year': 2000, 'rating': round(rng.uniform(1, 10), 1), 'poster': None}
+                            for title in rng.sample(films, 15)], user_id)
+    assert recommendations.refresh()
+    for _ in range(5):
+        for _ in range(20):
+            user_id, title = rng.choice(user_ids), rng.choice(films)
+            operation = rng.random()
+            if operation < 0.3:
+                storage.add_movie(title, 2000, round(rng.uniform(1, 10), 1), None, user_id)
+            elif operation < 0.8:
+                storage.update_movie(title, round(rng.uniform(1, 10), 1), user_id)
+            else:
+                storage.delete_movie(title, user_id)
+        assert recommendations.refresh() is not None
+    capsys.readouterr()
+
+    incremental = neighbor_lists(storage)
+    assert incremental, "the ratings should leave some films with neighbors"
+    assert recommendations.rebuild()
+    assert neighbor_lists(storage) == incremental
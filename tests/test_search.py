@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import text
+
+TITLES = ['The Dark Knight', 'The Dark Knight Rises', 'Dark City', 'Darkman', 'The Darkest Hour', 'Dancer In The Dark',
+          'Alien', 'Aliens', 'Heat', 'Say "Anything"', 'The Thin Red Line', 'Theater Camp']
+QUERIES = ['dark', 'DARK KN', 'the', 'alien', 'ien', '"any', 'Red Line', 'zzz', 'he']
+
+
+@pytest.fixture
+def collection(storage, capsys):
+    storage.add_user('ana')
+    storage.add_user('ben')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': title, 'year': 2000, 'rating': 7.0, 'poster': None} for title in TITLES], user_id)
+    # matches several queries, but is not ana's
+    storage.add_movie('The Dark Crystal', 1982, 7.0, None, storage.get_user_id('ben'))
+    capsys.readouterr()
+    with storage.get_engine().connect() as connection:
+        if not storage._has_fts(connection):
+            pytest.skip('this SQLite has no FTS5 trigram tokenizer')
+    return user_id
+
+
+def test_fts_search_matches_the_scan(storage, monkeypatch, collection):
+    scanned = {query: storage.search_movies(collection, query) for query in QUERIES}
+    monkeypatch.setattr(storage, 'SEARCH_SCAN_MOVIES', 0)
+    for query in QUERIES:
+        expected = {title for title in TITLES if query.lower() in title.lower()}
+        assert set(scanned[query]) == expected
+        assert set(storage.search_movies(collection, query)) == expected
+
+
+def test_fts_search_ranks_and_limits_like_the_scan(storage, monkeypatch, collection):
+    scanned = list(storage.search_movies(collection, 'dark', limit=3))
+    assert scanned == ['Darkman', 'Dark City', 'The Dark Knight']
+    monkeypatch.setattr(storage, 'SEARCH_SCAN_MOVIES', 0)
+    assert list(storage.search_movies(collection, 'dark', limit=3)) == scanned
+
+
+def test_fts_index_follows_the_catalog(storage, collection):
+    with storage.get_engine().connect() as connection:
+        indexed = connection.execute(text("SELECT COUNT(*) FROM catalog_fts")).scalar()
+        catalog = connection.execute(text("SELECT COUNT(*) FROM catalog")).scalar()
+    assert indexed == catalog == len(TITLES) + 1
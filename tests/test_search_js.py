@@ -0,0 +1,85 @@
+import html
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HARNESS = os.path.join(REPO, 'tests', 'search_harness.js')
+
+
+@pytest.fixture
+def site(storage, tmp_path, monkeypatch, capsys):
+    """A three-page generated site for one user; returns (generate_website module, titles in page order)."""
+    import generate_website
+    os.makedirs('_static')
+    for name in ('index_template.html', 'search.js'):
+        shutil.copy(os.path.join(REPO, '_static', name), os.path.join('_static', name))
+    monkeypatch.setattr(generate_website, 'PAGE_SIZE', 10)
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': f"{adjective}  {noun} {number}", 'year': 1990 + number, 'rating': 5.0,
+                         'poster': None}
+                        for number, (adjective, noun) in enumerate(
+                            (adjective, noun) for adjective in ('Dark', 'Lost', 'Golden')
+                            for noun in ('River', 'Empire', 'Garden', 'Station', 'Island', 'Ga'))], user_id)
+    generate_website.generate_website(user_id, 'ana')
+    capsys.readouterr()
+    return generate_website, [title for title, _ in storage.iter_movies(user_id)]
+
+
+def run_search(generate_website, page, queries):
+    page_file = generate_website.page_file_name('ana', page)
+    with open(page_file, encoding='utf-8') as file:
+        card_titles = [html.unescape(title) for title in re.findall(r'<h2 class="movie-title">(.*?)</h2>', file.read())]
+    output = subprocess.run(
+        ['node', HARNESS, '_static', os.path.basename(page_file),
+         os.path.basename(generate_website.search_index_file_name('ana')), json.dumps(card_titles), json.dumps(queries)],
+        capture_output=True, text=True, check=True).stdout
+    return card_titles, json.loads(output)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs Node.js to run _static/search.js')
+def test_search_box_finds_titles_on_every_page(site):
+    generate_website, titles = site
+    queries = ['dark riv', 'EMPIRE', 'ga', 'island 1', 'zzz']
+    card_titles, output = run_search(generate_website, 2, queries)
+    assert output['section_visible']
+    for query, result in zip(queries, output['results']):
+        key = generate_website.search_key(query)
+        expected = [position for position, title in enumerate(titles) if key in generate_website.search_key(title)]
+        word = 'movie matches' if len(expected) == 1 else 'movies match'
+        assert result['summary'] == f"{len(expected)} {word}"
+        assert [item['label'] for item in result['results']] == \
+            [f"{titles[position]} ({1990 + int(titles[position].split()[-1])})" for position in expected]
+        # matches on the current page are plain text, the others link to their page
+        assert [item['page'] for item in result['results']] == \
+            [None if position // 10 == 1 else os.path.basename(generate_website.page_file_name('ana', position // 10 + 1))
+             for position in expected]
+        assert result['visible_cards'] == [title for title in card_titles if key in generate_website.search_key(title)]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs Node.js to run _static/search.js')
+def test_films_without_poster_or_year(storage, tmp_path, capsys):
+    import generate_website
+    os.makedirs('_static')
+    for name in ('index_template.html', 'search.js'):
+        shutil.copy(os.path.join(REPO, '_static', name), os.path.join('_static', name))
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    storage.add_movies([{'title': 'Lost Reel', 'year': None, 'rating': 5.0, 'poster': None},
+                        {'title': 'Lost River', 'year': 1999, 'rating': 6.0, 'poster': 'http://example.com/p.jpg'}],
+                       user_id)
+    generate_website.generate_website(user_id, 'ana')
+    capsys.readouterr()
+    with open(generate_website.page_file_name('ana', 1), encoding='utf-8') as file:
+        page = file.read()
+    with open(generate_website.search_index_file_name('ana'), encoding='utf-8') as file:
+        index = file.read()
+    assert 'None' not in page and 'null' not in index
+    assert page.count('<img ') == 1 and page.count('class="movie-year"') == 1
+    _, output = run_search(generate_website, 1, ['lost'])
+    assert sorted(item['label'] for item in output['results'][0]['results']) == ['Lost Reel', 'Lost River (1999)']
@@ -0,0 +1,31 @@
+from sqlalchemy import text
+
+from movie_storage import movie_storage_sql
+
+
+def query_plan(storage, statement, params):
+    with storage.get_engine().connect() as connection:
+        return ' '.join(row.detail for row in connection.execute(text(f"EXPLAIN QUERY PLAN {statement.text}"), params))
+
+
+def test_lookups_ignore_case_and_spacing(storage, capsys):
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    assert storage.add_movie('  the dark KNIGHT ', 2008, 9.0, None, user_id)
+    assert not storage.add_movie('The Dark Knight', 2008, 5.0, None, user_id)
+    assert storage.get_movie('THE DARK   knight', user_id)[0] == 'The Dark Knight'
+    assert storage.update_movie('the dark knight', 7.5, user_id)
+    assert storage.get_movie('The Dark Knight', user_id)[1]['rating'] == 7.5
+    assert not storage.update_movie('The Dark', 7.5, user_id)
+    assert storage.delete_movie(' The Dark  Knight', user_id)
+    assert storage.count_movies(user_id) == 0
+    assert not storage.delete_movie('The Dark Knight', user_id)
+    capsys.readouterr()
+
+
+def test_lookups_seek_the_title_key_index(storage):
+    storage.add_user('ana')
+    params = {'user_id': storage.get_user_id('ana'), 'title_key': 'alien'}
+    plan = query_plan(storage, movie_storage_sql._FIND_USER_MOVIE, params)
+    assert 'USING INDEX idx_user_movies_title_key (user_id=? AND title_key=?)' in plan
+    assert 'SCAN' not in plan
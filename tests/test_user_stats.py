@@ -0,0 +1,101 @@
+import multiprocessing
+import random
+import statistics
+
+import pytest
+
+
+def recomputed(storage, user_id):
+    """get_stats() worked out from the user's rows."""
+    movies = list(storage.iter_movies(user_id))
+    if not movies:
+        return None
+    ratings = [info['rating'] for _, info in movies]
+    return {'count': len(ratings), 'average': statistics.fmean(ratings), 'median': statistics.median(ratings),
+            'min': min(ratings), 'max': max(ratings),
+            'best': [title for title, info in movies if info['rating'] == max(ratings)],
+            'worst': [title for title, info in movies if info['rating'] == min(ratings)]}
+
+
+def assert_stats(storage, user_id):
+    expected, stats = recomputed(storage, user_id), storage.get_stats(user_id)
+    if expected is None:
+        assert stats is None and storage.count_movies(user_id) == 0
+        return
+    assert stats.pop('average') == pytest.approx(expected.pop('average'))
+    assert stats == expected
+    assert storage.count_movies(user_id) == expected['count']
+
+
+def test_stats_follow_every_write(storage, capsys):
+    rng = random.Random(11)
+    storage.add_user('ana')
+    storage.add_user('ben')
+    user_ids = [storage.get_user_id('ana'), storage.get_user_id('ben')]
+    films = [f"Film {number}" for number in range(15)]
+    for step in range(200):
+        user_id, title = rng.choice(user_ids), rng.choice(films)
+        # few distinct ratings, so best and worst have ties
+        rating = rng.choice([1.0, 4.5, 7.0, 10.0])
+        operation = rng.random()
+        if operation < 0.4:
+            storage.add_movie(title, 2000, rating, None, user_id)
+        elif operation < 0.6:
+            storage.add_movies([{'title': title, 'year': 2000, 'rating': rating, 'poster': None}
+                                for title in rng.sample(films, 3)], user_id)
+        elif operation < 0.8:
+            storage.update_movie(title, rating, user_id)
+        else:
+            storage.delete_movie(title, user_id)
+        if step % 20 == 0:
+            for user_id in user_ids:
+                assert_stats(storage, user_id)
+
+    # down to an empty collection
+    for title, _ in list(storage.iter_movies(user_ids[0])):
+        storage.delete_movie(title, user_ids[0])
+    capsys.readouterr()
+    assert_stats(storage, user_ids[0])
+    assert_stats(storage, user_ids[1])
+
+
+def write_randomly(user_ids, seed, steps):
+    """Mixed single and batched writes on a few shared titles; run in its own process."""
+    from movie_storage import movie_storage_sql as storage
+    rng = random.Random(seed)
+    films = [f"Film {number}" for number in range(8)]
+    for _ in range(steps):
+        user_id, title, rating = rng.choice(user_ids), rng.choice(films), float(rng.randint(1, 10))
+        operation = rng.random()
+        if operation < 0.2:
+            storage.add_movie(title, 2000, rating, None, user_id)
+        elif operation < 0.3:
+            storage.add_movies([{'title': title, 'year': 2000, 'rating': rating, 'poster': None}
+                                for title in rng.sample(films, 3)], user_id)
+        elif operation < 0.45:
+            with storage.batch() as writes:
+                writes.update_movie(title, rating, user_id)
+                writes.update_movie(rng.choice(films), float(rng.randint(1, 10)), user_id)
+                writes.delete_movie(rng.choice(films), user_id)
+        elif operation < 0.85:
+            storage.update_movie(title, rating, user_id)
+        else:
+            storage.delete_movie(title, user_id)
+
+
+def test_stats_stay_exact_with_concurrent_writers(storage, monkeypatch, capsys):
+    # workers are spawned, so they import storage again and read the URL from the environment
+    monkeypatch.setenv('MOVIES_DB_URL', storage.DB_URL)
+    storage.add_user('ana')
+    storage.add_user('ben')
+    user_ids = [storage.get_user_id('ana'), storage.get_user_id('ben')]
+    context = multiprocessing.get_context('spawn')
+    writers = [context.Process(target=write_randomly, args=(user_ids, seed, 120)) for seed in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    assert [writer.exitcode for writer in writers] == [0] * 4
+    capsys.readouterr()
+    for user_id in user_ids:
+        assert_stats(storage, user_id)
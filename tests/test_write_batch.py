@@ -0,0 +1,81 @@
+import sqlite3
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+
+def test_a_failing_write_is_rolled_back_alone(storage, capsys):
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    writes = storage.begin_batch()
+    writes.add_movie('Alien', 1979, 8.0, None, user_id)
+    writes.add_movie('Heat', 1995, 7.0, None, user_id)
+    writes.add_movie('alien', 1979, 3.0, None, user_id)
+    writes.update_movie('Alien', None, user_id)  # user_rating is NOT NULL
+    writes.delete_movie('Heat', user_id)
+    writes.update_movie('Missing', 5.0, user_id)
+    writes.add_user('ben')
+    assert len(writes) == 7
+    assert writes.flush() == [True, True, False, None, True, False, True]
+    assert [position for position, _ in writes.errors] == [3]
+    assert isinstance(writes.errors[0][1], IntegrityError)
+    assert 'Error writing batch item 3' in capsys.readouterr().out
+
+    assert [(title, info['rating']) for title, info in storage.iter_movies(user_id)] == [('Alien', 8.0)]
+    stats = storage.get_stats(user_id)
+    assert (stats['count'], stats['average']) == (1, 8.0)
+    assert storage.get_user_id('ben') is not None
+
+    # positions in errors count across flushes
+    writes.update_movie('Alien', None, user_id)
+    writes.update_movie('Alien', 9.0, user_id)
+    assert writes.flush() == [None, True]
+    assert [position for position, _ in writes.errors] == [3, 7]
+    assert storage.get_stats(user_id)['average'] == 9.0
+    capsys.readouterr()
+
+
+def test_batch_context_applies_writes_in_order(storage, capsys):
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    with storage.batch() as writes:
+        for number in range(10):
+            writes.add_movie(f"Film {number}", 2000, float(number % 10 + 1), None, user_id)
+        writes.update_movie('Film 0', 10.0, user_id)
+        writes.delete_movie('Film 9', user_id)
+    assert writes.results == [True] * 12 and writes.errors == []
+    stats = storage.get_stats(user_id)
+    assert (stats['count'], stats['max'], stats['best']) == (9, 10.0, ['Film 0'])
+    assert storage.count_movies(user_id) == 9
+
+
+def test_a_lock_while_retrying_one_by_one_repeats_nothing(storage, monkeypatch, capsys):
+    storage.add_user('ana')
+    user_id = storage.get_user_id('ana')
+    storage.add_movie('Old', 1990, 5.0, None, user_id)
+    monkeypatch.setattr(storage, 'RETRY_BASE_DELAY', 0.001)
+    apply_batch = storage._apply_batch
+    calls = []
+
+    def flaky_apply_batch(connection, items, chunk_size):
+        calls.append(len(items))
+        if len(calls) == 1:
+            # the whole batch fails, so flush() falls back to one savepoint per write
+            raise OperationalError('batch', {}, sqlite3.OperationalError('disk I/O error'))
+        if len(calls) == 4:
+            # the third write hits a lock: the pass is retried, and the first two
+            # must not have been committed by their savepoints in the meantime
+            raise OperationalError('update', {}, sqlite3.OperationalError('database is locked'))
+        return apply_batch(connection, items, chunk_size)
+
+    monkeypatch.setattr(storage, '_apply_batch', flaky_apply_batch)
+    writes = storage.begin_batch()
+    writes.add_movie('New', 2000, 6.0, None, user_id)
+    writes.delete_movie('Old', user_id)
+    writes.update_movie('New', 9.0, user_id)
+    assert writes.flush() == [True, True, True]
+    assert calls == [3, 1, 1, 1, 1, 1, 1]
+    assert writes.errors == []
+    monkeypatch.setattr(storage, '_apply_batch', apply_batch)
+    assert [(title, info['rating']) for title, info in storage.iter_movies(user_id)] == [('New', 9.0)]
+    assert storage.get_stats(user_id)['count'] == 1
+    capsys.readouterr()